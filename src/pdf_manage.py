@@ -19,20 +19,21 @@ from src.utils.compress import select_pdf, preview_pdf, print_pdf, compress_pdf
 from src.utils.convert import update_conversion_ui, save_conversion_settings, load_conversion_settings
 from src.utils.drag_drop import setupDragDrop, dragEnterEvent, dropEvent
 from src.utils.magick import find_imagick, run_imagemagick
-from src.utils.split import extract_pages, parse_page_range, extract_single_page_with_pypdf2, select_pdf_to_split, count_pages, extract_pages_with_pypdf2, set_page_range
-from src.utils.cleanup import force_cleanup_temp_files
+from src.utils.split import extract_pages, parse_page_range, extract_single_page_with_pypdf2, select_pdf_to_split, count_pages, extract_pages_with_pypdf2, set_page_range, add_page_to_range
+from src.utils.cleanup import force_cleanup_temp_files, start_stale_session_cleanup
 
 # Import tab setup functions
 from src.tabs.main_tab import setup_main_tab
 from src.tabs.convert_tab import setup_convert_tab
 from src.tabs.compress_tab import setup_tools_tab
 from src.tabs.merge_tab import setup_merge_tab
-from src.tabs.split_tab import setup_split_tab, load_pdf_in_split_preview, update_split_page_navigation, split_prev_page, split_next_page, zoom_split_preview, apply_split_zoom
+from src.tabs.split_tab import setup_split_tab, load_pdf_in_split_preview, update_split_page_navigation, split_prev_page, split_next_page, split_go_to_page, zoom_split_preview, apply_split_zoom
 from src.tabs.preview_tab import setup_preview_tab, select_pdf_for_preview, load_pdf_in_preview, update_page_navigation
-from src.tabs.preview_tab import prev_page_preview, next_page_preview, zoom_in_preview, zoom_out_preview, apply_zoom_preview, print_current_pdf, open_in_system_viewer
+from src.tabs.preview_tab import prev_page_preview, next_page_preview, go_to_page_preview, zoom_in_preview, zoom_out_preview, apply_zoom_preview, print_current_pdf, open_in_system_viewer
 
 # Import utility functions
 from src.utils.developer import add_developer_credit
+from src.utils.stats_panel import add_stats_shortcut
 from src.utils.check_dependencies import check_dependencies
 from src.utils.image_tool import select_images, prev_image, next_image, update_picture_box, rotate_image
 from src.utils.image_tool import on_listbox_select, move_up, move_down, delete_image, reset_inputs, wheelEvent
@@ -44,13 +45,8 @@ class PdfManager(QMainWindow):
         # Call parent constructor
         super().__init__()
 
-        # Clean up any leftover temporary files from previous runs
-        try:
-            cleanup_count = force_cleanup_temp_files()
-            if cleanup_count > 0:
-                logging.info(f"Cleaned up {cleanup_count} leftover temporary files at startup")
-        except Exception as e:
-            logging.error(f"Error during startup cleanup: {str(e)}")
+        # Clean up temp folders left by previous runs without holding up the window
+        start_stale_session_cleanup()
 
         # Initialize UI
         self.setWindowTitle("PDF Manager | by mohammedhank91")
@@ -223,6 +219,7 @@ class PdfManager(QMainWindow):
         self.select_pdf_to_split = types.MethodType(select_pdf_to_split, self)
         self.count_pages = types.MethodType(count_pages, self)
         self.set_page_range = types.MethodType(set_page_range, self)
+        self.add_page_to_range = types.MethodType(add_page_to_range, self)
 
         # PDF compression
         self.select_pdf = types.MethodType(select_pdf, self)
@@ -237,6 +234,7 @@ class PdfManager(QMainWindow):
         self.update_page_navigation = types.MethodType(update_page_navigation, self)
         self.prev_page_preview = types.MethodType(prev_page_preview, self)
         self.next_page_preview = types.MethodType(next_page_preview, self)
+        self.go_to_page_preview = types.MethodType(go_to_page_preview, self)
         self.zoom_in_preview = types.MethodType(zoom_in_preview, self)
         self.zoom_out_preview = types.MethodType(zoom_out_preview, self)
         self.apply_zoom_preview = types.MethodType(apply_zoom_preview, self)
@@ -248,23 +246,37 @@ class PdfManager(QMainWindow):
         self.update_split_page_navigation = types.MethodType(update_split_page_navigation, self)
         self.split_prev_page = types.MethodType(split_prev_page, self)
         self.split_next_page = types.MethodType(split_next_page, self)
+        self.split_go_to_page = types.MethodType(split_go_to_page, self)
         self.zoom_split_preview = types.MethodType(zoom_split_preview, self)
         self.apply_split_zoom = types.MethodType(apply_split_zoom, self)
 
-        # Set up each tab with widgets
+        # Set up the Main tab now; the other tabs are built the first time they are shown
         setup_main_tab(self)
-        setup_convert_tab(self)
-        setup_tools_tab(self)
-        setup_merge_tab(self)
-        setup_split_tab(self)
-        setup_preview_tab(self)  # Setup the new preview tab
+        self._tab_setups = {
+            self.convert_tab: setup_convert_tab,
+            self.tools_tab: setup_tools_tab,
+            self.merge_tab: setup_merge_tab,
+            self.split_tab: setup_split_tab,
+            self.preview_tab: setup_preview_tab,
+        }
+        self.tab_widget.currentChanged.connect(
+            lambda index: self.ensure_tab_built(self.tab_widget.widget(index)))
 
         # Add developer credit
         add_developer_credit(self)
 
+        # Performance statistics panel, recording starts when it is first opened
+        add_stats_shortcut(self)
+
         # Check dependencies on startup
         check_dependencies(self)
 
+    def ensure_tab_built(self, tab):
+        """Build the widgets of a tab that has not been shown yet"""
+        setup = self._tab_setups.pop(tab, None)
+        if setup is not None:
+            setup(self)
+
     def _app_base(self):
         """Return the base directory of the application."""
         return self.base_path
@@ -288,8 +300,6 @@ class PdfManager(QMainWindow):
             self.btn_print_preview.setEnabled(True)
         if hasattr(self, 'btn_open_system'):
             self.btn_open_system.setEnabled(True)
-        if hasattr(self, 'big_system_btn'):
-            self.big_system_btn.setEnabled(True)
 
         # Update PDF info
         file_size = os.path.getsize(pdf_path) / 1024  # KB
@@ -5,6 +5,7 @@ from PyQt6.QtWidgets import (
     QTabWidget, QScrollArea, QListWidgetItem, QGridLayout, QGroupBox, QLineEdit, QRadioButton, QInputDialog
 )
 from PyQt6.QtCore import Qt
+from src.utils.check_dependencies import warn_missing_imagemagick
 def setup_convert_tab(self):
     # Convert Tab - PDF conversion settings and actions
     
@@ -232,6 +233,21 @@ def setup_convert_tab(self):
         
     compression_layout.addWidget(self.compression)
     quality_layout.addLayout(compression_layout)
+
+    # Image engine
+    engine_layout = QHBoxLayout()
+    engine_layout.addWidget(QLabel("Image engine:"))
+    self.image_engine = QComboBox()
+    # Same order as IMAGE_ENGINES in src/utils/pillow_ops.py
+    self.image_engine.addItems(["Automatic", "Built-in (Pillow)", "ImageMagick"])
+    self.image_engine.setToolTip("Automatic converts every image Pillow can read without starting ImageMagick")
+    self.image_engine.setStyleSheet(self.resolution.styleSheet())
+    self.image_engine.setCurrentIndex(0)  # Default to automatic
+    self.image_engine.currentTextChanged.connect(
+        lambda text: warn_missing_imagemagick(self) if text == "ImageMagick" else None)
+
+    engine_layout.addWidget(self.image_engine)
+    quality_layout.addLayout(engine_layout)
     
     settings_layout.addWidget(quality_group)
     
@@ -2,10 +2,11 @@ from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QCheckBox, 
     QSpinBox, QComboBox, QFileDialog, QMessageBox, QProgressBar, 
     QListWidget, QFrame, QVBoxLayout, QHBoxLayout, QWidget, 
-    QTabWidget, QScrollArea, QListWidgetItem, QGridLayout
+    QTabWidget, QScrollArea, QListWidgetItem, QGridLayout, QSizePolicy
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QPixmap
+from src.utils.thumbnails import ThumbnailListLoader
 
 def setup_main_tab(self):
     """Setup the Main Tab - Image selection, preview, and management"""
@@ -37,7 +38,7 @@ def setup_main_tab(self):
     self.btn_select.clicked.connect(self.select_images)
     self.btn_select.setFixedSize(130, 25)  # Smaller button
     self.btn_select.setStyleSheet("padding: 2px;")
-    self.btn_select.setToolTip("Click to browse and select image files (JPG, PNG, BMP, TIFF)")
+    self.btn_select.setToolTip("Click to browse and select image files (JPG, PNG, BMP, TIFF, GIF, WebP)")
     select_button_layout.addWidget(self.btn_select)
     select_button_layout.addStretch()
     self.main_tab_layout.addLayout(select_button_layout)
@@ -67,6 +68,8 @@ def setup_main_tab(self):
     self.preview_label = QLabel()
     self.preview_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
     self.preview_label.setStyleSheet("border: none; background-color: white;")
+    # Let the layout size the preview; the image is decoded to fit it, not the other way round
+    self.preview_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
     self.preview_layout.addWidget(self.preview_label)
     
     preview_group.addWidget(self.preview_frame)
@@ -134,6 +137,12 @@ def setup_main_tab(self):
         }
     """)
     right_panel.addWidget(self.listbox)
+
+    # Thumbnails are loaded in the background, only for the rows in view
+    self.listbox_thumbnails = ThumbnailListLoader(
+        self.listbox,
+        lambda row: self.selected_files[row] if 0 <= row < len(self.selected_files) else None
+    )
     
     # Image control buttons - More compact
     img_controls = QVBoxLayout()
@@ -6,18 +6,10 @@ from PyQt6.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QFileDialog, QMessageBox, QSpinBox, QComboBox, QDialog
 )
-from PyQt6.QtCore import QUrl, Qt
 from PyQt6.QtGui import QIcon
 from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
-
-# Try to import QWebEngineView, but have a fallback if not available
-HAS_WEBENGINE = False
-try:
-    from PyQt6.QtWebEngineWidgets import QWebEngineView
-    from PyQt6.QtWebEngineCore import QWebEngineSettings
-    HAS_WEBENGINE = True
-except ImportError:
-    logging.warning("QtWebEngine not available - using fallback for PDF viewer")
+from src.utils.pdf_viewer import PdfPageView, PageThumbnailSidebar, default_renderer
+from src.utils.check_dependencies import probed_pdftoppm
 
 
 def setup_preview_tab(self):
@@ -58,172 +50,97 @@ def setup_preview_tab(self):
     # Add controls to the main layout
     preview_layout.addLayout(controls_layout)
 
-    if HAS_WEBENGINE:
-        # Add zoom controls if web engine is available
-        zoom_layout = QHBoxLayout()
-        zoom_label = QLabel("Zoom:")
-        zoom_layout.addWidget(zoom_label)
-
-        # Zoom out button
-        self.btn_zoom_out = QPushButton("-")
-        self.btn_zoom_out.setFixedWidth(30)
-        self.btn_zoom_out.clicked.connect(self.zoom_out_preview)
-        self.btn_zoom_out.setToolTip("Zoom out to see more of the page")
-        zoom_layout.addWidget(self.btn_zoom_out)
-
-        # Zoom factor
-        self.zoom_factor_preview = QSpinBox()
-        self.zoom_factor_preview.setRange(50, 200)
-        self.zoom_factor_preview.setValue(100)
-        self.zoom_factor_preview.setSuffix("%")
-        self.zoom_factor_preview.setSingleStep(10)
-        self.zoom_factor_preview.valueChanged.connect(self.apply_zoom_preview)
-        self.zoom_factor_preview.setToolTip("Set zoom level for PDF preview (50% to 200%)")
-        zoom_layout.addWidget(self.zoom_factor_preview)
-
-        # Zoom in button
-        self.btn_zoom_in = QPushButton("+")
-        self.btn_zoom_in.setFixedWidth(30)
-        self.btn_zoom_in.clicked.connect(self.zoom_in_preview)
-        self.btn_zoom_in.setToolTip("Zoom in for a closer view of the page")
-        zoom_layout.addWidget(self.btn_zoom_in)
-
-        controls_layout.addLayout(zoom_layout)
-
-        # Create web engine view for PDF viewing
-        self.pdf_web_view = QWebEngineView()
-        self.pdf_web_view.setMinimumHeight(400)
-
-        # Enable PDF plugins and JavaScript
-        settings = self.pdf_web_view.settings()
-        if hasattr(settings, 'setAttribute'):
-            settings.setAttribute(QWebEngineSettings.WebAttribute.PluginsEnabled, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptEnabled, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.AllowRunningInsecureContent, True)
-
-        # Default message when no PDF is loaded
-        self.pdf_web_view.setHtml("""
-            <html>
-            <head>
-                <style>
-                    body {
-                        font-family: Arial, sans-serif;
-                        background-color: #f5f5f5;
-                        display: flex;
-                        justify-content: center;
-                        align-items: center;
-                        height: 100vh;
-                        margin: 0;
-                        text-align: center;
-                    }
-                    .container {
-                        background-color: white;
-                        padding: 30px;
-                        border-radius: 8px;
-                        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-                        max-width: 80%;
-                    }
-                    h2 {
-                        color: #333;
-                        margin-bottom: 20px;
-                    }
-                    p {
-                        color: #666;
-                        line-height: 1.6;
-                    }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h2>PDF Viewer</h2>
-                    <p>Select a PDF file to preview it here.</p>
-                    <p>Use the controls above to navigate and adjust the view.</p>
-                </div>
-            </body>
-            </html>
-        """)
-
-        # Add the web view to the layout
-        preview_layout.addWidget(self.pdf_web_view, 1)  # Give it stretch factor
-
-        # Status bar at the bottom
-        status_layout = QHBoxLayout()
-        self.preview_status = QLabel("Ready to preview PDFs")
-        status_layout.addWidget(self.preview_status)
-
-        # Page navigation (for multi-page PDFs)
-        page_nav_layout = QHBoxLayout()
-
-        # Previous page button
-        self.btn_prev_page = QPushButton("◀ Previous")
-        self.btn_prev_page.clicked.connect(self.prev_page_preview)
-        self.btn_prev_page.setEnabled(False)
-        self.btn_prev_page.setToolTip("Go to the previous page in the PDF")
-        page_nav_layout.addWidget(self.btn_prev_page)
-
-        # Page indicator
-        self.page_indicator = QLabel("Page: --")
-        page_nav_layout.addWidget(self.page_indicator)
-
-        # Next page button
-        self.btn_next_page = QPushButton("Next ▶")
-        self.btn_next_page.clicked.connect(self.next_page_preview)
-        self.btn_next_page.setEnabled(False)
-        self.btn_next_page.setToolTip("Go to the next page in the PDF")
-        page_nav_layout.addWidget(self.btn_next_page)
-
-        status_layout.addLayout(page_nav_layout)
-        preview_layout.addLayout(status_layout)
-    else:
-        # Fallback view when QWebEngineView is not available
-        fallback_layout = QVBoxLayout()
-
-        # Show message that web view is not available
-        fallback_label = QLabel(
-            "Advanced PDF viewing requires PyQt6-WebEngine to be installed.\n\n"
-            "Please install it with:\n"
-            "pip install PyQt6-WebEngine\n\n"
-            "You can still use the system PDF viewer by clicking 'Open in System Viewer'"
-        )
-        fallback_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        fallback_label.setStyleSheet("""
-            QLabel {
-                background-color: #f0f0f0;
-                padding: 20px;
-                border-radius: 8px;
-                font-size: 14px;
-                margin: 50px;
-                line-height: 1.5;
-            }
-        """)
-        fallback_layout.addWidget(fallback_label)
-
-        # Add a big button to open in system viewer
-        big_system_btn = QPushButton("Open PDF in System Viewer")
-        big_system_btn.setStyleSheet("""
-            QPushButton {
-                padding: 15px;
-                font-size: 16px;
-                margin: 20px 100px;
-            }
-        """)
-        big_system_btn.clicked.connect(self.open_in_system_viewer)
-        big_system_btn.setEnabled(False)
-        self.big_system_btn = big_system_btn
-        fallback_layout.addWidget(big_system_btn)
-
-        preview_layout.addLayout(fallback_layout)
-
-        # Simple status
-        self.preview_status = QLabel("PDF Viewer Ready (Limited Functionality)")
-        preview_layout.addWidget(self.preview_status)
+    # Zoom controls
+    zoom_layout = QHBoxLayout()
+    zoom_label = QLabel("Zoom:")
+    zoom_layout.addWidget(zoom_label)
+
+    # Zoom out button
+    self.btn_zoom_out = QPushButton("-")
+    self.btn_zoom_out.setFixedWidth(30)
+    self.btn_zoom_out.clicked.connect(self.zoom_out_preview)
+    self.btn_zoom_out.setToolTip("Zoom out to see more of the page")
+    zoom_layout.addWidget(self.btn_zoom_out)
+
+    # Zoom factor
+    self.zoom_factor_preview = QSpinBox()
+    self.zoom_factor_preview.setRange(50, 200)
+    self.zoom_factor_preview.setValue(100)
+    self.zoom_factor_preview.setSuffix("%")
+    self.zoom_factor_preview.setSingleStep(10)
+    self.zoom_factor_preview.valueChanged.connect(self.apply_zoom_preview)
+    self.zoom_factor_preview.setToolTip("Set zoom level for PDF preview (50% to 200%)")
+    zoom_layout.addWidget(self.zoom_factor_preview)
+
+    # Zoom in button
+    self.btn_zoom_in = QPushButton("+")
+    self.btn_zoom_in.setFixedWidth(30)
+    self.btn_zoom_in.clicked.connect(self.zoom_in_preview)
+    self.btn_zoom_in.setToolTip("Zoom in for a closer view of the page")
+    zoom_layout.addWidget(self.btn_zoom_in)
+
+    controls_layout.addLayout(zoom_layout)
+
+    # Native page viewer: pages are rendered to cached tiles as they scroll into view
+    self.pdf_page_view = PdfPageView(renderer=default_renderer(probed_pdftoppm(self)))
+    self.pdf_page_view.setMinimumHeight(400)
+    self.pdf_page_view.pageChanged.connect(lambda page: self.update_page_navigation())
+
+    # Page thumbnails next to the viewer; clicking one jumps to that page
+    self.preview_thumbnails = PageThumbnailSidebar(renderer=self.pdf_page_view.renderer)
+    self.preview_thumbnails.setToolTip("Click a page to jump to it")
+    self.preview_thumbnails.pageClicked.connect(self.pdf_page_view.go_to_page)
+
+    viewer_layout = QHBoxLayout()
+    viewer_layout.addWidget(self.preview_thumbnails)
+    viewer_layout.addWidget(self.pdf_page_view, 1)
+    preview_layout.addLayout(viewer_layout, 1)  # Give it stretch factor
+
+    # Status bar at the bottom
+    status_layout = QHBoxLayout()
+    self.preview_status = QLabel("Ready to preview PDFs")
+    status_layout.addWidget(self.preview_status)
+
+    # Page navigation (for multi-page PDFs)
+    page_nav_layout = QHBoxLayout()
+
+    # Previous page button
+    self.btn_prev_page = QPushButton("◀ Previous")
+    self.btn_prev_page.clicked.connect(self.prev_page_preview)
+    self.btn_prev_page.setEnabled(False)
+    self.btn_prev_page.setToolTip("Go to the previous page in the PDF")
+    page_nav_layout.addWidget(self.btn_prev_page)
+
+    # Page indicator
+    self.page_indicator = QLabel("Page: --")
+    page_nav_layout.addWidget(self.page_indicator)
+
+    # Go to page
+    self.preview_goto_page = QSpinBox()
+    self.preview_goto_page.setRange(1, 1)
+    self.preview_goto_page.setPrefix("Go to: ")
+    self.preview_goto_page.setEnabled(False)
+    self.preview_goto_page.setKeyboardTracking(False)
+    self.preview_goto_page.valueChanged.connect(self.go_to_page_preview)
+    self.preview_goto_page.setToolTip("Jump to a page number")
+    page_nav_layout.addWidget(self.preview_goto_page)
+
+    # Next page button
+    self.btn_next_page = QPushButton("Next ▶")
+    self.btn_next_page.clicked.connect(self.next_page_preview)
+    self.btn_next_page.setEnabled(False)
+    self.btn_next_page.setToolTip("Go to the next page in the PDF")
+    page_nav_layout.addWidget(self.btn_next_page)
+
+    status_layout.addLayout(page_nav_layout)
+    preview_layout.addLayout(status_layout)
 
     # Set the layout to the tab
     self.preview_tab.setLayout(preview_layout)
 
     # Store a flag to prevent duplicate loading
     self.current_loaded_pdf = ""
+    self.current_page = 0
 
 
 def select_pdf_for_preview(self):
@@ -242,10 +159,6 @@ def select_pdf_for_preview(self):
         self.btn_print_preview.setEnabled(True)
         self.btn_open_system.setEnabled(True)
 
-        # If we have a big system button (fallback UI), enable it
-        if hasattr(self, 'big_system_btn'):
-            self.big_system_btn.setEnabled(True)
-
         # Update PDF info display
         file_size = os.path.getsize(pdf_file) / 1024  # KB
         if file_size > 1024:
@@ -257,98 +170,32 @@ def select_pdf_for_preview(self):
         self.preview_pdf_info.setText(f"PDF: {os.path.basename(pdf_file)} ({size_str})")
         self.preview_status.setText(f"Selected: {os.path.basename(pdf_file)}")
 
-        # If web engine is available, load the PDF
-        if HAS_WEBENGINE:
-            self.load_pdf_in_preview(pdf_file)
+        self.load_pdf_in_preview(pdf_file)
 
 
 def load_pdf_in_preview(self, pdf_path):
-    """Load a PDF file into the web view"""
-    if not HAS_WEBENGINE:
-        return False
-
-    # Don't reload if it's the same PDF
-    if hasattr(self, 'current_loaded_pdf') and self.current_loaded_pdf == pdf_path:
-        return True
-
+    """Load a PDF file into the page viewer"""
     try:
-        # Store current PDF path to avoid reloading
+        # Remember which PDF is shown
         self.current_loaded_pdf = pdf_path
-
-        # Create a file URL that explicitly specifies it's a PDF
-        abs_path = os.path.abspath(pdf_path)
-        url = QUrl.fromLocalFile(abs_path)
-
-        # Try using direct PDF viewing
-        self.pdf_web_view.setUrl(url)
-
-        # Enable navigation buttons
-        self.btn_prev_page.setEnabled(True)
-        self.btn_next_page.setEnabled(True)
+        self.pdf_page_view.load(pdf_path)
+        self.preview_thumbnails.load(pdf_path)
 
         # Update UI
-        self.current_page = 1
         self.update_page_navigation()
-        self.preview_status.setText(f"Previewing: {os.path.basename(pdf_path)}")
-
+        self.preview_status.setText(
+            f"Previewing: {os.path.basename(pdf_path)} ({self.pdf_page_view.page_count()} pages)"
+        )
         return True
 
     except Exception as e:
         logging.error(f"Error loading PDF for preview: {str(e)}")
-        # Try the alternative HTML approach
-        try:
-            abs_path = os.path.abspath(pdf_path).replace('\\', '/')
-            file_url = QUrl.fromLocalFile(abs_path).toString()
-
-            # Use an HTML wrapper with the PDF embedded in an iframe or object tag
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>PDF Viewer</title>
-                <style>
-                    body, html {{
-                        margin: 0;
-                        padding: 0;
-                        height: 100%;
-                        overflow: hidden;
-                    }}
-                    #pdf-container {{
-                        width: 100%;
-                        height: 100%;
-                        overflow: auto;
-                    }}
-                    object, embed, iframe {{
-                        width: 100%;
-                        height: 100%;
-                        border: none;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div id="pdf-container">
-                    <!-- Try multiple embedding methods for better compatibility -->
-                    <object data="{file_url}" type="application/pdf" width="100%" height="100%">
-                        <embed src="{file_url}" type="application/pdf" width="100%" height="100%">
-                            <iframe src="{file_url}" width="100%" height="100%">
-                                <p>This browser does not support PDF embedding. Please <a href="{file_url}">click here to download the PDF</a>.</p>
-                            </iframe>
-                        </embed>
-                    </object>
-                </div>
-            </body>
-            </html>
-            """
-
-            # Load the HTML wrapper
-            self.pdf_web_view.setHtml(html_content, baseUrl=QUrl.fromLocalFile(os.path.dirname(abs_path)))
-            return True
-
-        except Exception as alt_error:
-            logging.error(f"Error with alternative PDF loading: {str(alt_error)}")
-            QMessageBox.critical(self, "Error",
-                                 "Could not load PDF using multiple methods. Please try opening with the system viewer.")
-            return False
+        self.pdf_page_view.clear()
+        self.preview_thumbnails.clear()
+        self.current_page = 0
+        self.update_page_navigation()
+        self.preview_status.setText("Could not load PDF. Please try opening with the system viewer.")
+        return False
 
 
 def open_in_system_viewer(self):
@@ -379,50 +226,47 @@ def open_in_system_viewer(self):
 
 def update_page_navigation(self):
     """Update the page navigation controls based on current state"""
-    if not HAS_WEBENGINE:
-        return
+    self.current_page = self.pdf_page_view.current_page()
+    page_count = self.pdf_page_view.page_count()
+    if page_count:
+        self.page_indicator.setText(f"Page: {self.current_page} / {page_count}")
+    else:
+        self.page_indicator.setText("Page: --")
 
-    # Most of this would be handled by the PDF viewer in the QWebEngineView
-    # We simply update the indicator here
-    self.page_indicator.setText(f"Page: {self.current_page}")
+    self.btn_prev_page.setEnabled(self.current_page > 1)
+    self.btn_next_page.setEnabled(self.current_page < page_count)
+    self.preview_thumbnails.set_current_page(self.current_page)
 
-    # Enable navigation buttons (the actual navigation is handled by the web view)
-    self.btn_prev_page.setEnabled(True)
-    self.btn_next_page.setEnabled(True)
+    # Keep the go-to box in sync without jumping back to the page it shows
+    self.preview_goto_page.blockSignals(True)
+    self.preview_goto_page.setRange(1, max(1, page_count))
+    self.preview_goto_page.setValue(max(1, self.current_page))
+    self.preview_goto_page.setEnabled(page_count > 1)
+    self.preview_goto_page.blockSignals(False)
 
 
 def prev_page_preview(self):
     """Go to previous page in the PDF preview"""
-    if not HAS_WEBENGINE:
-        return
-
-    # Execute JavaScript to go to previous page
-    # This depends on the PDF.js viewer in QWebEngineView
-    self.pdf_web_view.page().runJavaScript("window.scrollBy(0, -window.innerHeight);")
-
-    if self.current_page > 1:
-        self.current_page -= 1
+    if self.pdf_page_view.current_page() > 1:
+        self.pdf_page_view.go_to_page(self.pdf_page_view.current_page() - 1)
         self.update_page_navigation()
 
 
 def next_page_preview(self):
     """Go to next page in the PDF preview"""
-    if not HAS_WEBENGINE:
-        return
+    if self.pdf_page_view.current_page() < self.pdf_page_view.page_count():
+        self.pdf_page_view.go_to_page(self.pdf_page_view.current_page() + 1)
+        self.update_page_navigation()
 
-    # Execute JavaScript to go to next page
-    # This depends on the PDF.js viewer in QWebEngineView
-    self.pdf_web_view.page().runJavaScript("window.scrollBy(0, window.innerHeight);")
 
-    self.current_page += 1
+def go_to_page_preview(self):
+    """Jump to the page entered in the go-to box"""
+    self.pdf_page_view.go_to_page(self.preview_goto_page.value())
     self.update_page_navigation()
 
 
 def zoom_in_preview(self):
     """Zoom in on the PDF preview"""
-    if not HAS_WEBENGINE:
-        return
-
     current_zoom = self.zoom_factor_preview.value()
     new_zoom = min(current_zoom + 10, 200)  # Increment but not over 200%
     self.zoom_factor_preview.setValue(new_zoom)
@@ -430,9 +274,6 @@ def zoom_in_preview(self):
 
 def zoom_out_preview(self):
     """Zoom out on the PDF preview"""
-    if not HAS_WEBENGINE:
-        return
-
     current_zoom = self.zoom_factor_preview.value()
     new_zoom = max(current_zoom - 10, 50)  # Decrement but not below 50%
     self.zoom_factor_preview.setValue(new_zoom)
@@ -440,12 +281,7 @@ def zoom_out_preview(self):
 
 def apply_zoom_preview(self):
     """Apply the current zoom factor to the PDF preview"""
-    if not HAS_WEBENGINE:
-        return
-
-    zoom_value = self.zoom_factor_preview.value() / 100.0
-    # Apply zoom using JavaScript
-    self.pdf_web_view.page().runJavaScript(f"document.body.style.zoom = {zoom_value};")
+    self.pdf_page_view.set_zoom(self.zoom_factor_preview.value())
 
 
 def print_current_pdf(self):
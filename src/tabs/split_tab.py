@@ -5,18 +5,10 @@ from PyQt6.QtWidgets import (
     QTabWidget, QScrollArea, QListWidgetItem, QGridLayout, QGroupBox, QLineEdit, QRadioButton, QInputDialog,
     QSizePolicy
 )
-from PyQt6.QtCore import Qt, QUrl
-import os
+from PyQt6.QtCore import Qt
 import logging
-
-# Try to import QWebEngineView for PDF preview, with fallback
-HAS_WEBENGINE = False
-try:
-    from PyQt6.QtWebEngineWidgets import QWebEngineView
-    from PyQt6.QtWebEngineCore import QWebEngineSettings
-    HAS_WEBENGINE = True
-except ImportError:
-    logging.warning("QtWebEngine not available - PDF preview will use fallback mode")
+from src.utils.pdf_viewer import PdfPageView, PageThumbnailSidebar, default_renderer
+from src.utils.check_dependencies import probed_pdftoppm
 
 def setup_split_tab(self):
     """Setup the Split PDF Tab"""
@@ -107,137 +99,85 @@ def setup_split_tab(self):
     preview_header.setStyleSheet("font-weight: bold; color: #424242;")
     preview_header_layout.addWidget(preview_header)
     
-    if HAS_WEBENGINE:
-        # Add zoom controls for web engine
-        zoom_out_btn = QPushButton("-")
-        zoom_out_btn.setFixedSize(25, 25)
-        zoom_out_btn.setToolTip("Zoom out")
-        zoom_out_btn.clicked.connect(lambda: self.zoom_split_preview(-10))
-        preview_header_layout.addWidget(zoom_out_btn)
-        
-        self.split_zoom_factor = QSpinBox()
-        self.split_zoom_factor.setRange(50, 200)
-        self.split_zoom_factor.setValue(100)
-        self.split_zoom_factor.setSuffix("%")
-        self.split_zoom_factor.setSingleStep(10)
-        self.split_zoom_factor.setFixedWidth(70)
-        self.split_zoom_factor.valueChanged.connect(self.apply_split_zoom)
-        self.split_zoom_factor.setToolTip("Zoom level for preview")
-        preview_header_layout.addWidget(self.split_zoom_factor)
-        
-        zoom_in_btn = QPushButton("+")
-        zoom_in_btn.setFixedSize(25, 25)
-        zoom_in_btn.setToolTip("Zoom in")
-        zoom_in_btn.clicked.connect(lambda: self.zoom_split_preview(10))
-        preview_header_layout.addWidget(zoom_in_btn)
+    # Zoom controls
+    zoom_out_btn = QPushButton("-")
+    zoom_out_btn.setFixedSize(25, 25)
+    zoom_out_btn.setToolTip("Zoom out")
+    zoom_out_btn.clicked.connect(lambda: self.zoom_split_preview(-10))
+    preview_header_layout.addWidget(zoom_out_btn)
+
+    self.split_zoom_factor = QSpinBox()
+    self.split_zoom_factor.setRange(50, 200)
+    self.split_zoom_factor.setValue(100)
+    self.split_zoom_factor.setSuffix("%")
+    self.split_zoom_factor.setSingleStep(10)
+    self.split_zoom_factor.setFixedWidth(70)
+    self.split_zoom_factor.valueChanged.connect(self.apply_split_zoom)
+    self.split_zoom_factor.setToolTip("Zoom level for preview")
+    preview_header_layout.addWidget(self.split_zoom_factor)
+
+    zoom_in_btn = QPushButton("+")
+    zoom_in_btn.setFixedSize(25, 25)
+    zoom_in_btn.setToolTip("Zoom in")
+    zoom_in_btn.clicked.connect(lambda: self.zoom_split_preview(10))
+    preview_header_layout.addWidget(zoom_in_btn)
     
     preview_header_layout.addStretch()
     preview_layout.addLayout(preview_header_layout)
     
-    if HAS_WEBENGINE:
-        # Create web engine view for PDF viewing
-        self.split_pdf_preview = QWebEngineView()
-        self.split_pdf_preview.setMinimumHeight(150)
-        
-        # Enable PDF plugins and JavaScript
-        settings = self.split_pdf_preview.settings()
-        if hasattr(settings, 'setAttribute'):
-            settings.setAttribute(QWebEngineSettings.WebAttribute.PluginsEnabled, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptEnabled, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, True)
-            settings.setAttribute(QWebEngineSettings.WebAttribute.AllowRunningInsecureContent, True)
-        
-        # Default message when no PDF is loaded
-        self.split_pdf_preview.setHtml("""
-            <html>
-            <head>
-                <style>
-                    body {
-                        font-family: Arial, sans-serif;
-                        background-color: #f5f5f5;
-                        display: flex;
-                        justify-content: center;
-                        align-items: center;
-                        height: 100vh;
-                        margin: 0;
-                        text-align: center;
-                    }
-                    .container {
-                        background-color: white;
-                        padding: 20px;
-                        border-radius: 8px;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                        max-width: 80%;
-                    }
-                    h3 {
-                        color: #333;
-                        margin-bottom: 10px;
-                    }
-                    p {
-                        color: #666;
-                        line-height: 1.4;
-                        font-size: 12px;
-                    }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h3>PDF Preview</h3>
-                    <p>Select a PDF file to preview pages before extracting.</p>
-                </div>
-            </body>
-            </html>
-        """)
-        
-        preview_layout.addWidget(self.split_pdf_preview)
-        
-        # Page navigation for split preview
-        nav_layout = QHBoxLayout()
-        
-        self.btn_split_prev_page = QPushButton("◀ Prev")
-        self.btn_split_prev_page.setFixedHeight(24)
-        self.btn_split_prev_page.clicked.connect(self.split_prev_page)
-        self.btn_split_prev_page.setEnabled(False)
-        self.btn_split_prev_page.setToolTip("Go to previous page")
-        nav_layout.addWidget(self.btn_split_prev_page)
-        
-        self.split_page_indicator = QLabel("Page: --")
-        self.split_page_indicator.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.split_page_indicator.setStyleSheet("font-size: 9pt; color: #424242;")
-        nav_layout.addWidget(self.split_page_indicator)
-        
-        self.btn_split_next_page = QPushButton("Next ▶")
-        self.btn_split_next_page.setFixedHeight(24)
-        self.btn_split_next_page.clicked.connect(self.split_next_page)
-        self.btn_split_next_page.setEnabled(False)
-        self.btn_split_next_page.setToolTip("Go to next page")
-        nav_layout.addWidget(self.btn_split_next_page)
-        
-        preview_layout.addLayout(nav_layout)
-        
-        # Initialize split preview variables
-        self.split_current_page = 1
-        self.split_loaded_pdf = ""
-    else:
-        # Fallback when QWebEngineView is not available
-        fallback_label = QLabel(
-            "PDF Preview requires PyQt6-WebEngine.\n\n"
-            "Install with: pip install PyQt6-WebEngine\n\n"
-            "For now, you can select a PDF and use\n"
-            "the page information above."
-        )
-        fallback_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        fallback_label.setStyleSheet("""
-            QLabel {
-                background-color: #f0f0f0;
-                padding: 15px;
-                border-radius: 4px;
-                color: #666;
-                font-size: 10pt;
-                line-height: 1.4;
-            }
-        """)
-        preview_layout.addWidget(fallback_label)
+    # Native page viewer, sharing the document page index with the PDF Viewer tab
+    self.split_pdf_preview = PdfPageView(renderer=default_renderer(probed_pdftoppm(self)))
+    self.split_pdf_preview.setMinimumHeight(150)
+    self.split_pdf_preview.pageChanged.connect(lambda page: self.update_split_page_navigation())
+
+    # Page thumbnails; clicking one adds the page to the range to extract
+    self.split_thumbnails = PageThumbnailSidebar(renderer=self.split_pdf_preview.renderer)
+    self.split_thumbnails.setToolTip("Click a page to add it to the pages to extract")
+    self.split_thumbnails.pageClicked.connect(self.add_page_to_range)
+    self.split_thumbnails.pageClicked.connect(self.split_pdf_preview.go_to_page)
+
+    split_viewer_layout = QHBoxLayout()
+    split_viewer_layout.addWidget(self.split_thumbnails)
+    split_viewer_layout.addWidget(self.split_pdf_preview, 1)
+    preview_layout.addLayout(split_viewer_layout)
+    
+    # Page navigation for split preview
+    nav_layout = QHBoxLayout()
+    
+    self.btn_split_prev_page = QPushButton("◀ Prev")
+    self.btn_split_prev_page.setFixedHeight(24)
+    self.btn_split_prev_page.clicked.connect(self.split_prev_page)
+    self.btn_split_prev_page.setEnabled(False)
+    self.btn_split_prev_page.setToolTip("Go to previous page")
+    nav_layout.addWidget(self.btn_split_prev_page)
+    
+    self.split_page_indicator = QLabel("Page: --")
+    self.split_page_indicator.setAlignment(Qt.AlignmentFlag.AlignCenter)
+    self.split_page_indicator.setStyleSheet("font-size: 9pt; color: #424242;")
+    nav_layout.addWidget(self.split_page_indicator)
+    
+    self.split_goto_page = QSpinBox()
+    self.split_goto_page.setRange(1, 1)
+    self.split_goto_page.setPrefix("Go to: ")
+    self.split_goto_page.setFixedHeight(24)
+    self.split_goto_page.setEnabled(False)
+    self.split_goto_page.setKeyboardTracking(False)
+    self.split_goto_page.valueChanged.connect(self.split_go_to_page)
+    self.split_goto_page.setToolTip("Jump to a page number")
+    nav_layout.addWidget(self.split_goto_page)
+    
+    self.btn_split_next_page = QPushButton("Next ▶")
+    self.btn_split_next_page.setFixedHeight(24)
+    self.btn_split_next_page.clicked.connect(self.split_next_page)
+    self.btn_split_next_page.setEnabled(False)
+    self.btn_split_next_page.setToolTip("Go to next page")
+    nav_layout.addWidget(self.btn_split_next_page)
+    
+    preview_layout.addLayout(nav_layout)
+    
+    # Initialize split preview variables
+    self.split_current_page = 0
+    self.split_loaded_pdf = ""
     
     left_layout.addWidget(preview_frame)
     
@@ -431,131 +371,66 @@ def setup_split_tab(self):
 # Split tab preview functions
 def load_pdf_in_split_preview(self, pdf_path):
     """Load a PDF file into the split tab preview"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_pdf_preview'):
-        return False
-
-    # Don't reload if it's the same PDF
-    if hasattr(self, 'split_loaded_pdf') and self.split_loaded_pdf == pdf_path:
-        return True
-
     try:
-        # Store current PDF path to avoid reloading
+        # Remember which PDF is shown
         self.split_loaded_pdf = pdf_path
-
-        # Create a file URL for the PDF
-        abs_path = os.path.abspath(pdf_path)
-        url = QUrl.fromLocalFile(abs_path)
-
-        # Load the PDF in the preview
-        self.split_pdf_preview.setUrl(url)
-
-        # Enable navigation buttons
-        self.btn_split_prev_page.setEnabled(True)
-        self.btn_split_next_page.setEnabled(True)
-
-        # Update UI
-        self.split_current_page = 1
+        self.split_pdf_preview.load(pdf_path)
+        self.split_thumbnails.load(pdf_path)
         self.update_split_page_navigation()
-
         return True
 
     except Exception as e:
         logging.error(f"Error loading PDF for split preview: {str(e)}")
-        # Try the alternative HTML approach
-        try:
-            abs_path = os.path.abspath(pdf_path).replace('\\', '/')
-            file_url = QUrl.fromLocalFile(abs_path).toString()
-
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>PDF Preview</title>
-                <style>
-                    body, html {{
-                        margin: 0;
-                        padding: 0;
-                        height: 100%;
-                        overflow: hidden;
-                    }}
-                    #pdf-container {{
-                        width: 100%;
-                        height: 100%;
-                        overflow: auto;
-                    }}
-                    object, embed, iframe {{
-                        width: 100%;
-                        height: 100%;
-                        border: none;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div id="pdf-container">
-                    <object data="{file_url}" type="application/pdf" width="100%" height="100%">
-                        <embed src="{file_url}" type="application/pdf" width="100%" height="100%">
-                            <iframe src="{file_url}" width="100%" height="100%">
-                                <p>Unable to display PDF. <a href="{file_url}">Click here to open</a>.</p>
-                            </iframe>
-                        </embed>
-                    </object>
-                </div>
-            </body>
-            </html>
-            """
-
-            # Load the HTML wrapper
-            self.split_pdf_preview.setHtml(html_content, baseUrl=QUrl.fromLocalFile(os.path.dirname(abs_path)))
-            return True
-
-        except Exception as alt_error:
-            logging.error(f"Error with alternative PDF loading in split preview: {str(alt_error)}")
-            return False
+        self.split_pdf_preview.clear()
+        self.split_thumbnails.clear()
+        self.update_split_page_navigation()
+        return False
 
 
 def update_split_page_navigation(self):
     """Update the page navigation controls for split preview"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_current_page'):
-        return
+    self.split_current_page = self.split_pdf_preview.current_page()
+    page_count = self.split_pdf_preview.page_count()
 
     # Update the page indicator
-    self.split_page_indicator.setText(f"Page: {self.split_current_page}")
+    if page_count:
+        self.split_page_indicator.setText(f"Page: {self.split_current_page} / {page_count}")
+    else:
+        self.split_page_indicator.setText("Page: --")
+
+    # Only allow moving within the document
+    self.btn_split_prev_page.setEnabled(self.split_current_page > 1)
+    self.btn_split_next_page.setEnabled(self.split_current_page < page_count)
 
-    # Enable navigation buttons
-    self.btn_split_prev_page.setEnabled(True)
-    self.btn_split_next_page.setEnabled(True)
+    self.split_goto_page.blockSignals(True)
+    self.split_goto_page.setRange(1, max(1, page_count))
+    self.split_goto_page.setValue(max(1, self.split_current_page))
+    self.split_goto_page.setEnabled(page_count > 1)
+    self.split_goto_page.blockSignals(False)
 
 
 def split_prev_page(self):
     """Go to previous page in the split preview"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_pdf_preview'):
-        return
-
-    # Execute JavaScript to scroll up (simulate previous page)
-    self.split_pdf_preview.page().runJavaScript("window.scrollBy(0, -window.innerHeight);")
-
-    if self.split_current_page > 1:
-        self.split_current_page -= 1
+    if self.split_pdf_preview.current_page() > 1:
+        self.split_pdf_preview.go_to_page(self.split_pdf_preview.current_page() - 1)
         self.update_split_page_navigation()
 
 
 def split_next_page(self):
     """Go to next page in the split preview"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_pdf_preview'):
-        return
+    if self.split_pdf_preview.current_page() < self.split_pdf_preview.page_count():
+        self.split_pdf_preview.go_to_page(self.split_pdf_preview.current_page() + 1)
+        self.update_split_page_navigation()
 
-    # Execute JavaScript to scroll down (simulate next page)
-    self.split_pdf_preview.page().runJavaScript("window.scrollBy(0, window.innerHeight);")
 
-    self.split_current_page += 1
+def split_go_to_page(self):
+    """Jump to the page entered in the split preview go-to box"""
+    self.split_pdf_preview.go_to_page(self.split_goto_page.value())
     self.update_split_page_navigation()
 
 
 def zoom_split_preview(self, delta):
     """Zoom the split preview by delta amount"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_zoom_factor'):
-        return
-
     current_zoom = self.split_zoom_factor.value()
     new_zoom = max(50, min(current_zoom + delta, 200))  # Clamp between 50% and 200%
     self.split_zoom_factor.setValue(new_zoom)
@@ -563,12 +438,7 @@ def zoom_split_preview(self, delta):
 
 def apply_split_zoom(self):
     """Apply the current zoom factor to the split preview"""
-    if not HAS_WEBENGINE or not hasattr(self, 'split_pdf_preview'):
-        return
-
-    zoom_value = self.split_zoom_factor.value() / 100.0
-    # Apply zoom using JavaScript
-    self.split_pdf_preview.page().runJavaScript(f"document.body.style.zoom = {zoom_value};")
+    self.split_pdf_preview.set_zoom(self.split_zoom_factor.value())
 
 
 def run_pytest():
@@ -3,13 +3,16 @@
 
 import os
 import sys
-import importlib.util
+import importlib
 
 # List of all modules in this package
 __all__ = [
     'convert', 'merge', 'edit_pdf', 'compress', 'drag_drop',
     'magick', 'split', 'developer', 'check_dependencies',
-    'image_tool', 'style', 'pdf_viewer'
+    'image_tool', 'style', 'pdf_viewer', 'pdf_stream', 'convert_pipeline',
+    'preview', 'background', 'qt_image',
+    'thumbnails', 'scratch', 'pillow_ops', 'pipeline', 'watch_folder', 'http_service',
+    'orchestrator', 'qt_jobs', 'telemetry', 'stats_panel'
 ]
 
 # Try to ensure all modules are importable
@@ -37,17 +40,15 @@ def ensure_modules_importable():
 # Run the function to ensure modules are importable
 ensure_modules_importable()
 
-# Pre-import all modules to make sure they're available
-for module_name in __all__:
-    try:
-        # Try to import each module
-        module_path = os.path.join(os.path.dirname(__file__), f"{module_name}.py")
-        if os.path.exists(module_path):
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            if spec:
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                # Add to globals
-                globals()[module_name] = module
-    except Exception as e:
-        print(f"Warning: Could not pre-import {module_name}: {e}")
+# Submodules are imported the first time they are accessed (PEP 562) rather than
+# all at package import, so startup only pays for the modules it actually uses
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f"{__name__}.{name}")
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,47 @@
+import logging
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _Job(QRunnable):
+    """QRunnable that runs a callable and reports back through a BackgroundWorker."""
+
+    def __init__(self, worker, token, fn, args):
+        super().__init__()
+        self.worker = worker
+        self.token = token
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            logging.warning(f"Background job failed: {str(e)}")
+            self.worker.failed.emit(self.token, str(e))
+        else:
+            self.worker.finished.emit(self.token, result)
+
+
+class BackgroundWorker(QObject):
+    """
+    Run callables on Qt's global thread pool and deliver results on the GUI thread.
+
+    Every job carries a token that is passed back with its result, so the
+    receiver can tell whether the result is still wanted (e.g. the user has
+    zoomed or moved on since the job was submitted).
+
+    Signals:
+        finished(token, result): The job returned `result`
+        failed(token, message): The job raised an exception
+    """
+
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+
+    def submit(self, token, fn, *args):
+        """Run fn(*args) on the thread pool."""
+        self.pool.start(_Job(self, token, fn, args))
@@ -1,71 +1,225 @@
 import os
 import sys
-import subprocess
+import json
+import shutil
 import logging
+import tempfile
+import subprocess
 from PyQt6.QtWidgets import QMessageBox
+from src.utils.background import BackgroundWorker
 
-def check_dependencies(self):
-    """Check if required dependencies are available and warn the user if not."""
-    logging.info("Checking dependencies...")
-    
-    # Check for ImageMagick
-    self.has_imagick = False
-    base_dir = self._app_base()
-    parent_dir = os.path.dirname(base_dir)
-    
-    # Potential locations for imagick_portable
-    imagick_paths = [
+# External tools probed at startup: name -> (executable, argument printing the version)
+PROBED_TOOLS = {
+    "imagemagick": ("magick", "-version"),
+    "poppler": ("pdftoppm", "-v"),
+}
+
+# Seconds to wait for a tool to print its version
+PROBE_TIMEOUT = 10
+
+
+def default_dependency_cache():
+    """Return the file probe results are cached in (APPDATA/PDF Manager/dependencies.json)"""
+    base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    return os.path.join(base, 'PDF Manager', 'dependencies.json')
+
+
+def imagick_portable_dirs(base_dir):
+    """Return the folders a portable ImageMagick is looked for in, in order of preference"""
+    return [
         os.path.join(base_dir, "imagick_portable_64"),
-        os.path.join(parent_dir, "imagick_portable_64"),
+        os.path.join(os.path.dirname(base_dir), "imagick_portable_64"),
         os.path.join(os.path.dirname(sys.executable), "imagick_portable_64"),
         "imagick_portable_64"  # Check in current working directory
     ]
-    
-    for path in imagick_paths:
-        if os.path.exists(path):
-            logging.info(f"Found ImageMagick at {path}")
-            self.has_imagick = True
-            break
-            
-    if not self.has_imagick:
-        # Check if available in PATH
+
+
+def poppler_portable_dirs(base_dir):
+    """Return the folders a portable Poppler's executables are looked for in, in order of preference"""
+    bin_dir = os.path.join("poppler_portable_64", "library", "bin")
+    return [
+        os.path.join(base_dir, bin_dir),
+        os.path.join(os.path.dirname(base_dir), bin_dir),
+        os.path.join(os.path.dirname(sys.executable), bin_dir),
+        bin_dir  # Check in current working directory
+    ]
+
+
+def find_pdftoppm(base_dir):
+    """Return the pdftoppm executable of a portable Poppler or the one on PATH, or None"""
+    exe = "pdftoppm.exe" if sys.platform == 'win32' else "pdftoppm"
+    for folder in poppler_portable_dirs(base_dir):
+        portable = os.path.join(folder, exe)
+        if os.path.isfile(portable):
+            return os.path.abspath(portable)
+    return shutil.which("pdftoppm")
+
+
+def locate_tools(base_dir):
+    """
+    Find the executable of every probed tool without running anything.
+
+    Returns:
+        dict tool name -> absolute executable path, or None when not found
+    """
+    paths = {}
+    for name, (exe, _) in PROBED_TOOLS.items():
+        path = None
+        if name == "imagemagick":
+            for folder in imagick_portable_dirs(base_dir):
+                if os.path.isdir(folder):
+                    portable = os.path.join(folder, "magick.exe" if sys.platform == 'win32' else "magick")
+                    path = os.path.abspath(portable if os.path.exists(portable) else folder)
+                    break
+        elif name == "poppler":
+            path = find_pdftoppm(base_dir)
+        paths[name] = path or shutil.which(exe)
+    return paths
+
+
+def dependency_fingerprint(paths):
+    """
+    Return what cached probe results are valid for: PATH plus the
+    modification time of every executable found.
+    """
+    mtimes = {}
+    for name, path in paths.items():
         try:
-            result = subprocess.run(["magick", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            if result.returncode == 0:
-                self.has_imagick = True
-                logging.info("Found ImageMagick in PATH")
-        except (subprocess.SubprocessError, FileNotFoundError):
-            logging.warning("ImageMagick not found in PATH")
-            
-    if not self.has_imagick:
-        logging.warning("ImageMagick not found")
-        QMessageBox.warning(
-            self,
-            "ImageMagick Not Found",
-            "ImageMagick not found. Please place 'imagick_portable_64' folder next to the app."
-        )
-    
-    # Check for QtWebEngine (needed for PDF preview)
-    self.has_webengine = False
+            mtimes[name] = [path, os.stat(path).st_mtime_ns] if path else None
+        except OSError:
+            mtimes[name] = None
+    return {"PATH": os.environ.get("PATH", ""), "executables": mtimes}
+
+
+def _tool_version(path, version_arg):
+    """Run a tool with its version argument and return the first line it prints"""
+    if os.path.isdir(path):
+        return None
+    result = subprocess.run([path, version_arg], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, timeout=PROBE_TIMEOUT, check=False)
+    output = (result.stdout or result.stderr).strip()
+    return output.splitlines()[0] if output else None
+
+
+def probe_dependencies(base_dir, cache_file=None):
+    """
+    Find the external tools and their versions, reusing cached results.
+
+    Locating the tools only takes a few stat calls; the tools themselves are
+    run (to read their versions) only when PATH or one of the executables has
+    changed since the results were cached.
+
+    Args:
+        base_dir: Application base directory, searched for a portable ImageMagick
+        cache_file: JSON cache file, defaults to default_dependency_cache()
+
+    Returns:
+        dict tool name -> {"path": executable or None, "version": str or None}
+    """
+    if cache_file is None:
+        cache_file = default_dependency_cache()
+
+    paths = locate_tools(base_dir)
+    fingerprint = dependency_fingerprint(paths)
+
     try:
-        from PyQt6 import QtWebEngineWidgets
-        self.has_webengine = True
-        logging.info("QtWebEngine is available")
-    except ImportError:
-        logging.warning("QtWebEngine not available - PDF viewer will be limited")
-        # Disable the PDF Viewer tab if QtWebEngine is not available
-        for i in range(self.tab_widget.count()):
-            if self.tab_widget.tabText(i) == "PDF Viewer":
-                self.tab_widget.setTabEnabled(i, False)
-                break
-        
-        QMessageBox.warning(
-            self,
-            "PDF Viewer Limited",
-            "The PDF Viewer tab is disabled because PyQt6-WebEngine is not installed.\n\n"
-            "To enable the PDF viewer, install the required dependency:\n"
-            "pip install PyQt6-WebEngine"
-        )
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get("fingerprint") == fingerprint:
+            return cached["tools"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    tools = {}
+    for name, path in paths.items():
+        version = None
+        if path:
+            try:
+                version = _tool_version(path, PROBED_TOOLS[name][1])
+            except (subprocess.SubprocessError, OSError) as e:
+                logging.warning(f"Could not run {path}: {str(e)}")
+                path = None
+        tools[name] = {"path": path, "version": version}
+
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Write under a temporary name so a concurrent launch never reads a partial file
+        fd, part_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(cache_file))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": fingerprint, "tools": tools}, f, indent=2)
+        os.replace(part_path, cache_file)
+    except OSError as e:
+        logging.warning(f"Could not cache dependency probe results: {str(e)}")
+    return tools
+
+
+def check_dependencies(self):
+    """
+    Check which external tools are available.
+
+    The probe runs on a background thread so it never delays the first
+    window; `self.has_imagick` is None until it has finished.
+    """
+    logging.info("Checking dependencies...")
+    self.has_imagick = None
+    self.dependency_info = {}
+
+    self._dependency_worker = BackgroundWorker(self)
+    self._dependency_worker.finished.connect(lambda token, tools: _on_dependencies_probed(self, tools))
+    self._dependency_worker.failed.connect(
+        lambda token, message: logging.error(f"Dependency check failed: {message}"))
+    self._dependency_worker.submit(None, probe_dependencies, self._app_base())
+
+
+def _on_dependencies_probed(self, tools):
+    """
+    Store the probe results (GUI thread).
+
+    Most conversions run on Pillow, so a missing ImageMagick is only logged;
+    the user is warned when the image engine is set to ImageMagick (here if
+    that was done before the probe finished, otherwise by the Convert tab)
+    or a conversion needs it (see convert_to_pdf).
+    """
+    self.dependency_info = tools
+    imagick = tools.get("imagemagick", {})
+    self.has_imagick = bool(imagick.get("path"))
+
+    if self.has_imagick:
+        logging.info(f"Found ImageMagick at {imagick['path']} ({imagick.get('version')})")
+    else:
+        logging.warning("ImageMagick not found; images Pillow cannot read will not convert")
+        engine = getattr(self, 'image_engine', None)
+        if engine is not None and engine.currentText() == "ImageMagick":
+            warn_missing_imagemagick(self)
+
+
+def warn_missing_imagemagick(self):
+    """
+    Tell the user ImageMagick was not found, once per session.
+
+    Called when it is actually needed: the image engine is set to
+    ImageMagick, or a conversion has files only ImageMagick can read.
+    """
+    if getattr(self, 'has_imagick', None) is not False or getattr(self, '_imagick_warning_shown', False):
+        return
+    self._imagick_warning_shown = True
+    QMessageBox.warning(
+        self,
+        "ImageMagick Not Found",
+        "ImageMagick not found. Please place 'imagick_portable_64' folder next to the app."
+    )
+
+
+def probed_pdftoppm(self):
+    """
+    Return the pdftoppm found by the startup probe, locating it now when the
+    probe has not finished yet.
+    """
+    poppler = getattr(self, 'dependency_info', {}).get("poppler")
+    if poppler:
+        return poppler.get("path")
+    return find_pdftoppm(self._app_base())
+
 
 def check_command_exists(self, cmd):
     """Check if a command exists by running it with '--version'"""
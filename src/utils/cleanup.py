@@ -1,13 +1,163 @@
 import os
 import tempfile
 import shutil
+import getpass
 import logging
 import json
 import time
+import atexit
+import threading
 from datetime import datetime
 
-# Persistent storage for tracking files to clean up later
-CLEANUP_REGISTRY_FILE = os.path.join(tempfile.gettempdir(), "pdf_manager_cleanup.json")
+def _app_temp_root():
+    """Return the folder holding all of this user's PDF Manager temp data"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    # Keep the name filesystem safe whatever the account is called
+    user = "".join(c if c.isalnum() or c in "-_" else "_" for c in user)
+    return os.path.join(tempfile.gettempdir(), f"pdf_manager_{user}")
+
+
+# Every temp file of the application lives under this folder, in one
+# session_<pid>_<start time> subfolder per running instance. It stays on
+# disk-backed temp storage: only scratch spills go to RAM (see scratch.py)
+APP_TEMP_ROOT = _app_temp_root()
+
+_SESSION_PREFIX = "session_"
+_session_dir = None
+_session_lock = threading.Lock()
+
+# Persistent storage for tracking files to clean up later: one path per line,
+# only ever appended to, and rewritten (compacted) by process_deferred_cleanup()
+CLEANUP_REGISTRY_FILE = os.path.join(APP_TEMP_ROOT, "cleanup_registry.txt")
+
+# Registry written by earlier versions (a JSON list); migrated on the next cleanup
+LEGACY_CLEANUP_REGISTRY_FILE = os.path.join(tempfile.gettempdir(), "pdf_manager_cleanup.json")
+
+# New registry lines are fsynced once this many have been written...
+REGISTRY_FSYNC_BATCH = 64
+# ...or once this many seconds have passed since the last fsync
+REGISTRY_FSYNC_INTERVAL = 2.0
+
+
+class CleanupRegistry:
+    """
+    Append-only, line oriented list of paths to delete on a later run.
+
+    Marking a path is a set lookup and one appended line, whatever the size
+    of the registry, and the file is fsynced in batches instead of on every
+    line. A path whose line was lost in a crash is simply not retried.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._known = None
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _load_known(self):
+        if self._known is None:
+            self._known = set(self._read_lines())
+
+    def _read_lines(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return [line.rstrip('\n') for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def add(self, filepath):
+        """Append a path unless it is already registered; returns True if it was added"""
+        filepath = os.path.abspath(filepath)
+        with self._lock:
+            self._load_known()
+            if filepath in self._known:
+                return False
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(filepath + '\n')
+            self._file.flush()
+            self._known.add(filepath)
+            self._unsynced += 1
+            if self._unsynced >= REGISTRY_FSYNC_BATCH or \
+                    time.monotonic() - self._last_sync >= REGISTRY_FSYNC_INTERVAL:
+                self._sync()
+            return True
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """Make sure every registered path is on disk"""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def process(self, remove, legacy_paths=()):
+        """
+        Try to remove every registered path and compact the registry.
+
+        Args:
+            remove: Callable path -> True if the path is gone afterwards
+            legacy_paths: Paths from the old JSON registry to handle as well
+
+        Returns:
+            (number of paths removed, number still pending)
+        """
+        with self._lock:
+            self._close()
+            # dict.fromkeys drops duplicates while keeping the original order
+            entries = list(dict.fromkeys(self._read_lines() + [os.path.abspath(p) for p in legacy_paths]))
+            if not entries:
+                self._known = set()
+                return 0, 0
+
+            still_locked = [path for path in entries if not remove(path)]
+
+            # Rewrite the registry with only the remaining entries, atomically
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, part_path = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.writelines(path + '\n' for path in still_locked)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(part_path, self.path)
+            self._known = set(still_locked)
+            return len(entries) - len(still_locked), len(still_locked)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _cleanup_registry():
+    """Return the registry for CLEANUP_REGISTRY_FILE, opening it on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.path != CLEANUP_REGISTRY_FILE:
+            if _registry is not None:
+                _registry.close()
+            _registry = CleanupRegistry(CLEANUP_REGISTRY_FILE)
+            atexit.register(_registry.close)
+        return _registry
+
 
 def mark_for_future_cleanup(filepath):
     """
@@ -15,151 +165,181 @@ def mark_for_future_cleanup(filepath):
     if it can't be deleted now.
     """
     try:
-        # Load existing cleanup registry
-        cleanup_registry = []
-        if os.path.exists(CLEANUP_REGISTRY_FILE):
-            try:
-                with open(CLEANUP_REGISTRY_FILE, 'r') as f:
-                    cleanup_registry = json.load(f)
-            except Exception as e:
-                logging.error(f"Error reading cleanup registry: {str(e)}")
-                cleanup_registry = []
-        
-        # Add this file if it's not already in the registry
-        if filepath not in cleanup_registry:
-            cleanup_registry.append(filepath)
-            
-            # Save updated registry
-            with open(CLEANUP_REGISTRY_FILE, 'w') as f:
-                json.dump(cleanup_registry, f)
-                
+        if _cleanup_registry().add(filepath):
             logging.info(f"Marked for future cleanup: {filepath}")
     except Exception as e:
         logging.error(f"Error marking file for future cleanup: {str(e)}")
 
+
+def _remove_path(filepath):
+    """Delete a file or directory tree; returns True if it no longer exists"""
+    try:
+        if os.path.isdir(filepath):
+            shutil.rmtree(filepath, ignore_errors=True)
+        elif os.path.lexists(filepath):
+            os.unlink(filepath)
+    except Exception as e:
+        logging.warning(f"File still locked, deferring again: {filepath} - {str(e)}")
+        return False
+    if os.path.lexists(filepath):
+        logging.warning(f"File still locked, deferring again: {filepath}")
+        return False
+    return True
+
+
+def _load_legacy_registry():
+    """Return the paths of the old JSON registry, if there is one"""
+    try:
+        with open(LEGACY_CLEANUP_REGISTRY_FILE, 'r') as f:
+            paths = json.load(f)
+        return [p for p in paths if isinstance(p, str)] if isinstance(paths, list) else []
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        logging.error(f"Error reading legacy cleanup registry: {str(e)}")
+        return []
+
+
 def process_deferred_cleanup():
     """
     Process any files that were marked for deferred cleanup
     from previous runs.
     """
-    if not os.path.exists(CLEANUP_REGISTRY_FILE):
+    legacy_paths = _load_legacy_registry()
+    if not legacy_paths and not os.path.exists(CLEANUP_REGISTRY_FILE) \
+            and not os.path.exists(LEGACY_CLEANUP_REGISTRY_FILE):
         return 0
-        
+
     cleaned = 0
     try:
-        # Load the cleanup registry
-        with open(CLEANUP_REGISTRY_FILE, 'r') as f:
-            cleanup_registry = json.load(f)
-            
-        # Keep track of files we couldn't clean up this time
-        still_locked = []
-            
-        # Try to clean up each file/directory
-        for filepath in cleanup_registry:
-            try:
-                if os.path.exists(filepath):
-                    if os.path.isdir(filepath):
-                        shutil.rmtree(filepath, ignore_errors=True)
-                    else:
-                        os.unlink(filepath)
-                    logging.info(f"Cleaned deferred file/directory: {filepath}")
-                    cleaned += 1
-                else:
-                    # File no longer exists, consider it cleaned
-                    cleaned += 1
-            except Exception as e:
-                logging.warning(f"File still locked, deferring again: {filepath} - {str(e)}")
-                still_locked.append(filepath)
-                
-        # Update the registry with files still locked
-        with open(CLEANUP_REGISTRY_FILE, 'w') as f:
-            json.dump(still_locked, f)
-            
+        cleaned, pending = _cleanup_registry().process(_remove_path, legacy_paths)
+        if pending:
+            logging.info(f"{pending} files are still locked and stay registered for cleanup")
+        # Anything the old registry listed now lives in the new one
+        if os.path.exists(LEGACY_CLEANUP_REGISTRY_FILE):
+            os.unlink(LEGACY_CLEANUP_REGISTRY_FILE)
     except Exception as e:
         logging.error(f"Error processing deferred cleanup: {str(e)}")
-        
+
+    return cleaned
+
+
+def session_temp_dir():
+    """
+    Return this instance's temp folder, creating it on first use.
+
+    All intermediate files of a session go here, so cleaning up never has
+    to look at anything else in the system temp folder.
+    """
+    global _session_dir
+    with _session_lock:
+        if _session_dir is None or not os.path.isdir(_session_dir):
+            os.makedirs(APP_TEMP_ROOT, exist_ok=True)
+            _session_dir = os.path.join(APP_TEMP_ROOT, f"{_SESSION_PREFIX}{os.getpid()}_{int(time.time())}")
+            os.makedirs(_session_dir, exist_ok=True)
+        return _session_dir
+
+
+def make_temp_dir(prefix="tmp_"):
+    """Create a new working folder inside the session temp folder"""
+    return tempfile.mkdtemp(prefix=prefix, dir=session_temp_dir())
+
+
+def _pid_alive(pid):
+    """Return True if a process with this id is running"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and \
+                exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def cleanup_stale_sessions():
+    """
+    Remove the temp folders of instances that are no longer running,
+    and process deferred cleanup from previous runs.
+
+    Only APP_TEMP_ROOT is listed, never the whole system temp folder.
+
+    Returns:
+        Number of files/folders removed
+    """
+    cleaned = process_deferred_cleanup()
+    try:
+        entries = os.listdir(APP_TEMP_ROOT)
+    except OSError:
+        return cleaned
+
+    for name in entries:
+        if not name.startswith(_SESSION_PREFIX):
+            continue
+        try:
+            pid = int(name[len(_SESSION_PREFIX):].split("_")[0])
+        except ValueError:
+            continue
+        if _pid_alive(pid):
+            continue
+        path = os.path.join(APP_TEMP_ROOT, name)
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path):
+            mark_for_future_cleanup(path)
+        else:
+            logging.info(f"Cleaned stale session temp directory: {path}")
+            cleaned += 1
     return cleaned
 
+
+def start_stale_session_cleanup():
+    """Run cleanup_stale_sessions() on a background thread so it never delays startup"""
+    def run():
+        try:
+            cleaned = cleanup_stale_sessions()
+            if cleaned > 0:
+                logging.info(f"Cleaned up {cleaned} leftover temporary files at startup")
+        except Exception as e:
+            logging.error(f"Error during startup cleanup: {str(e)}")
+
+    thread = threading.Thread(target=run, name="stale_temp_cleanup", daemon=True)
+    thread.start()
+    return thread
+
+
 def force_cleanup_temp_files():
     """
-    Forcefully clean up all temporary files created by the PDF Manager application.
+    Remove this session's temp folder and anything deferred from earlier runs.
     This is a utility function to be called at application exit or on demand.
     """
-    # First process any deferred cleanup from previous runs
-    cleaned_deferred = process_deferred_cleanup()
-    
-    # Get the system's temporary directory
-    temp_dir = tempfile.gettempdir()
-    
-    # Search for files and directories that match our application's naming patterns
-    patterns = ["pdf_compress_", "pdf_convert_", "compressed_", "temp_", "img_temp_"]
-    cleaned_count = 0
-    
-    try:
-        # First pass - look for our temp directories
-        for item in os.listdir(temp_dir):
-            for pattern in patterns:
-                if item.startswith(pattern):
-                    full_path = os.path.join(temp_dir, item)
-                    try:
-                        if os.path.isdir(full_path):
-                            # It's a directory, remove it recursively
-                            shutil.rmtree(full_path, ignore_errors=True)
-                            logging.info(f"Cleaned temp directory: {full_path}")
-                        elif os.path.isfile(full_path):
-                            # It's a file, remove it directly
-                            os.unlink(full_path)
-                            logging.info(f"Cleaned temp file: {full_path}")
-                        cleaned_count += 1
-                    except Exception as e:
-                        logging.error(f"Failed to clean {full_path}: {str(e)}")
-                        # Mark for deferred cleanup
-                        mark_for_future_cleanup(full_path)
-                    break  # Break after first match to avoid checking other patterns
-        
-        # Second pass - look for PDF files in the root of temp directory that might be ours
-        for item in os.listdir(temp_dir):
-            if item.endswith(".pdf"):
-                # Check if it matches any of our known patterns or is likely created by our app
-                is_ours = any(pattern in item for pattern in patterns)
-                
-                if is_ours:
-                    full_path = os.path.join(temp_dir, item)
-                    try:
-                        if os.path.isfile(full_path):
-                            os.unlink(full_path)
-                            logging.info(f"Cleaned temp PDF file: {full_path}")
-                            cleaned_count += 1
-                    except Exception as e:
-                        logging.error(f"Failed to clean PDF file {full_path}: {str(e)}")
-                        # Mark for deferred cleanup
-                        mark_for_future_cleanup(full_path)
-        
-        # Look for any files within temp directories that match our patterns
-        for item in os.listdir(temp_dir):
-            if os.path.isdir(os.path.join(temp_dir, item)):
-                dir_path = os.path.join(temp_dir, item)
-                try:
-                    for file_item in os.listdir(dir_path):
-                        if file_item.endswith(".pdf") or any(p in file_item for p in patterns):
-                            file_path = os.path.join(dir_path, file_item)
-                            try:
-                                if os.path.isfile(file_path):
-                                    os.unlink(file_path)
-                                    logging.info(f"Cleaned nested temp file: {file_path}")
-                                    cleaned_count += 1
-                            except Exception as e:
-                                logging.error(f"Failed to clean nested file {file_path}: {str(e)}")
-                                # Mark for deferred cleanup
-                                mark_for_future_cleanup(file_path)
-                except Exception:
-                    # Ignore errors listing directory contents
-                    pass
-        
-        # Total cleanup count includes deferred cleanups that were processed
-        total_cleaned = cleaned_count + cleaned_deferred
-        logging.info(f"Cleanup completed: removed {total_cleaned} temporary files/directories")
-        return total_cleaned
-    except Exception as e:
-        logging.error(f"Error during temporary file cleanup: {str(e)}")
-        return cleaned_deferred  # Return at least the count of deferred files we cleaned 
\ No newline at end of file
+    global _session_dir
+    cleaned = process_deferred_cleanup()
+
+    with _session_lock:
+        session_dir, _session_dir = _session_dir, None
+    if session_dir and os.path.exists(session_dir):
+        shutil.rmtree(session_dir, ignore_errors=True)
+        if os.path.exists(session_dir):
+            logging.error(f"Failed to clean {session_dir}")
+            mark_for_future_cleanup(session_dir)
+        else:
+            logging.info(f"Cleaned session temp directory: {session_dir}")
+            cleaned += 1
+    return cleaned
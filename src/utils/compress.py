@@ -2,18 +2,14 @@ import os
 import logging
 import sys
 import subprocess
-import pikepdf
-import tempfile
-import shutil
 import io
 import gc
 from PyQt6.QtWidgets import QFileDialog, QMessageBox, QDialog
 from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
 from PyQt6.QtCore import QCoreApplication
-from PIL import Image
-from PyQt6.QtCore import QUrl
-from src.tabs.preview_tab import HAS_WEBENGINE
 from src.utils.cleanup import mark_for_future_cleanup
+from src.utils.scratch import scratch_file, copy_scratch_to
+from src.utils import telemetry
 
 
 # Global variable to track temporary files
@@ -38,23 +34,6 @@ def _cleanup_temp_files():
             logging.warning(f"Failed to remove temporary file {filepath}: {str(e)}")
             # Mark for future cleanup if we can't delete now
             mark_for_future_cleanup(filepath)
-            
-    # Search for and clean any stray pdf_compress directories that might be left
-    try:
-        tmp_dir = tempfile.gettempdir()
-        for item in os.listdir(tmp_dir):
-            if item.startswith("pdf_compress_"):
-                try:
-                    item_path = os.path.join(tmp_dir, item)
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path, ignore_errors=True)
-                        logging.info(f"Cleaned up stray temp directory: {item_path}")
-                except Exception as e:
-                    logging.error(f"Error cleaning up stray temp directory {item}: {str(e)}")
-                    # Mark for future cleanup
-                    mark_for_future_cleanup(item_path)
-    except Exception as e:
-        logging.warning(f"Error searching for stray temp directories: {str(e)}")
 
 def select_pdf(self):
     """Select a PDF file for compression or preview"""
@@ -120,21 +99,9 @@ def preview_pdf(self):
             if hasattr(self, 'btn_open_system'):
                 self.btn_open_system.setEnabled(True)
 
-            # Load the PDF directly in the web view
-            if hasattr(self, 'pdf_web_view') and HAS_WEBENGINE:
-                try:
-                    abs_path = os.path.abspath(self.latest_pdf)
-                    url = QUrl.fromLocalFile(abs_path)
-                    self.pdf_web_view.setUrl(url)
-
-                    self.status_label.setText(f"Previewing {os.path.basename(self.latest_pdf)}")
-                    return
-                except Exception as e:
-                    logging.error(f"Error loading PDF in web view: {str(e)}")
-
-            # If we have a big system button (fallback UI), enable it
-            if hasattr(self, 'big_system_btn'):
-                self.big_system_btn.setEnabled(True)
+            # Load the PDF in the page viewer
+            if hasattr(self, 'load_pdf_in_preview'):
+                self.load_pdf_in_preview(self.latest_pdf)
 
             self.status_label.setText(f"Previewing {os.path.basename(self.latest_pdf)}")
             return
@@ -204,25 +171,32 @@ def print_pdf(self):
             QMessageBox.critical(self, "Error", "Could not print PDF using system method either.")
 
 
-def direct_compress_pdf(input_path, output_path, compression_level=2):
+def compressed_save_options():
+    """Return the pikepdf save() options used for compressed PDFs"""
+    import pikepdf
+
+    return dict(
+        compress_streams=True,
+        recompress_flate=True,
+        object_stream_mode=pikepdf.ObjectStreamMode.generate,
+        preserve_pdfa=True  # Maintain PDF/A compatibility when possible
+    )
+
+
+def compress_document(pdf, compression_level=2):
     """
-    Direct PDF compression function with special handling for image-heavy PDFs.
+    Recompress the images of an open pikepdf document in place.
     compression_level: 1=light, 2=medium, 3=maximum
     """
-    # Create a temporary working directory for image processing
-    temp_image_dir = tempfile.mkdtemp(prefix="pdf_compress_")
-    _register_temp_file(temp_image_dir)
-    
-    pdf = None  # Initialize pdf variable for proper cleanup
-    
-    try:
-        # Open the PDF file
-        pdf = pikepdf.Pdf.open(input_path)
-        
-        # Check if there are images to process
-        has_images = False
+    # Imported here so they are only loaded when a PDF is actually compressed
+    import pikepdf
+    from PIL import Image
 
-        # First pass - scan for images
+    # Check if there are images to process
+    has_images = False
+
+    # First pass - scan for images
+    with telemetry.span("scan"):
         for page in pdf.pages:
             if "/Resources" in page and "/XObject" in page["/Resources"]:
                 for name, obj in list(page["/Resources"].get("/XObject", {}).items()):
@@ -232,54 +206,52 @@ def direct_compress_pdf(input_path, output_path, compression_level=2):
                 if has_images:
                     break
 
-        # If images found, process them based on compression level
-        if has_images:
-            # Determine image compression level
-            jpeg_quality = 90  # Default - light compression
-            max_resolution = 300  # DPI
-
-            if compression_level == 2:  # Medium
-                jpeg_quality = 75
-                max_resolution = 200
-            elif compression_level == 3:  # Maximum
-                jpeg_quality = 60
-                max_resolution = 150
-
-            # Process images in each page
-            for page in pdf.pages:
-                if "/Resources" in page and "/XObject" in page["/Resources"]:
-                    resources = page["/Resources"]
-                    for name, obj in list(resources.get("/XObject", {}).items()):
-                        if isinstance(obj, pikepdf.Stream) and obj.get("/Subtype") == "/Image":
-                            # Get image details
-                            width = int(obj.get("/Width", 0))
-                            height = int(obj.get("/Height", 0))
-
-                            # Skip small images
-                            if width < 100 or height < 100:
-                                continue
-
-                            # Process based on image type
-                            filter_type = obj.get("/Filter")
-
-                            # Images that are already JPEG
-                            is_jpeg = False
-                            if filter_type == "/DCTDecode" or filter_type == pikepdf.Name.DCTDecode:
-                                is_jpeg = True
-                            elif isinstance(filter_type, pikepdf.Array):
-                                for f in filter_type:
-                                    if f == pikepdf.Name.DCTDecode or f == "/DCTDecode":
-                                        is_jpeg = True
-                                        break
+    # If images found, process them based on compression level
+    if has_images:
+        # Determine image compression level
+        jpeg_quality = 90  # Default - light compression
+        max_resolution = 300  # DPI
 
-                            if is_jpeg:
-                                # For JPEGs, we can try to recompress if they're large
-                                if compression_level >= 2 and (width > 1000 or height > 1000):
-                                    try:
-                                        # Create a unique temp file for this image
-                                        temp_img_file = os.path.join(temp_image_dir, f"img_temp_{id(obj)}.jpg")
-                                        _register_temp_file(temp_img_file)
-                                        
+        if compression_level == 2:  # Medium
+            jpeg_quality = 75
+            max_resolution = 200
+        elif compression_level == 3:  # Maximum
+            jpeg_quality = 60
+            max_resolution = 150
+
+        # Process images in each page
+        for page in pdf.pages:
+            if "/Resources" in page and "/XObject" in page["/Resources"]:
+                resources = page["/Resources"]
+                for name, obj in list(resources.get("/XObject", {}).items()):
+                    if isinstance(obj, pikepdf.Stream) and obj.get("/Subtype") == "/Image":
+                        # Get image details
+                        width = int(obj.get("/Width", 0))
+                        height = int(obj.get("/Height", 0))
+
+                        # Skip small images
+                        if width < 100 or height < 100:
+                            continue
+
+                        # Process based on image type
+                        filter_type = obj.get("/Filter")
+
+                        # Images that are already JPEG
+                        is_jpeg = False
+                        if filter_type == "/DCTDecode" or filter_type == pikepdf.Name.DCTDecode:
+                            is_jpeg = True
+                        elif isinstance(filter_type, pikepdf.Array):
+                            for f in filter_type:
+                                if f == pikepdf.Name.DCTDecode or f == "/DCTDecode":
+                                    is_jpeg = True
+                                    break
+
+                        if is_jpeg:
+                            # For JPEGs, we can try to recompress if they're large
+                            if compression_level >= 2 and (width > 1000 or height > 1000):
+                                try:
+                                    telemetry.count("images")
+                                    with telemetry.span("decode"):
                                         # Read image data
                                         img_data = obj.read_raw_bytes()
                                         img = Image.open(io.BytesIO(img_data))
@@ -291,61 +263,60 @@ def direct_compress_pdf(input_path, output_path, compression_level=2):
                                             new_height = int(height * ratio)
                                             img = img.resize((new_width, new_height), Image.BICUBIC)
 
-                                        # Recompress with adobe-compatible settings
-                                        img.save(temp_img_file, format="JPEG", quality=jpeg_quality, optimize=True)
+                                    # Recompress with adobe-compatible settings, in memory
+                                    with telemetry.span("encode"):
+                                        buffer = io.BytesIO()
+                                        img.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+                                        new_data = buffer.getvalue()
+
+                                    # Only replace if smaller
+                                    if len(new_data) < len(img_data):
+                                        # Make sure new dimensions are updated properly
+                                        if width > 1500 or height > 1500:
+                                            obj["/Width"] = new_width
+                                            obj["/Height"] = new_height
                                         
-                                        with open(temp_img_file, 'rb') as f:
-                                            new_data = f.read()
+                                        obj.write(new_data, filter=pikepdf.Name.DCTDecode)
+                                except Exception as e:
+                                    logging.warning(f"Error processing JPEG image: {e}")
+                                    telemetry.count("image_errors")
+
+                        # Non-JPEG images (like PNG, bitmap, etc)
+                        else:
+                            is_flate = False
+                            if filter_type == "/FlateDecode" or filter_type == pikepdf.Name.FlateDecode:
+                                is_flate = True
+                            elif isinstance(filter_type, pikepdf.Array):
+                                for f in filter_type:
+                                    if f == pikepdf.Name.FlateDecode or f == "/FlateDecode":
+                                        is_flate = True
+                                        break
 
-                                        # Only replace if smaller
-                                        if len(new_data) < len(img_data):
-                                            # Make sure new dimensions are updated properly
-                                            if width > 1500 or height > 1500:
-                                                obj["/Width"] = new_width
-                                                obj["/Height"] = new_height
-                                            
-                                            obj.write(new_data, filter=pikepdf.Name.DCTDecode)
-                                    except Exception as e:
-                                        print(f"Error processing JPEG image: {e}")
-
-                            # Non-JPEG images (like PNG, bitmap, etc)
-                            else:
-                                is_flate = False
-                                if filter_type == "/FlateDecode" or filter_type == pikepdf.Name.FlateDecode:
-                                    is_flate = True
-                                elif isinstance(filter_type, pikepdf.Array):
-                                    for f in filter_type:
-                                        if f == pikepdf.Name.FlateDecode or f == "/FlateDecode":
-                                            is_flate = True
-                                            break
-
-                                # For Adobe Acrobat compatibility, be more cautious with image conversions
-                                # Only convert simple RGB and Grayscale images
-                                if is_flate and compression_level >= 2:
-                                    try:
-                                        # Get color space
-                                        colorspace = obj.get("/ColorSpace")
-                                        bits = int(obj.get("/BitsPerComponent", 8))
+                            # For Adobe Acrobat compatibility, be more cautious with image conversions
+                            # Only convert simple RGB and Grayscale images
+                            if is_flate and compression_level >= 2:
+                                try:
+                                    # Get color space
+                                    colorspace = obj.get("/ColorSpace")
+                                    bits = int(obj.get("/BitsPerComponent", 8))
+                                    
+                                    # Only process standard RGB and Grayscale images
+                                    if bits == 8 and colorspace in ["/DeviceRGB", pikepdf.Name.DeviceRGB, 
+                                                                  "/DeviceGray", pikepdf.Name.DeviceGray]:
                                         
-                                        # Only process standard RGB and Grayscale images
-                                        if bits == 8 and colorspace in ["/DeviceRGB", pikepdf.Name.DeviceRGB, 
-                                                                      "/DeviceGray", pikepdf.Name.DeviceGray]:
-                                            
-                                            is_rgb = colorspace in ["/DeviceRGB", pikepdf.Name.DeviceRGB]
-                                            
-                                            # Create a unique temp file for this image
-                                            temp_img_file = os.path.join(temp_image_dir, f"img_temp_{id(obj)}.jpg")
-                                            _register_temp_file(temp_img_file)
-                                            
+                                        is_rgb = colorspace in ["/DeviceRGB", pikepdf.Name.DeviceRGB]
+                                        telemetry.count("images")
+
+                                        with telemetry.span("decode"):
                                             # Try to load image
                                             img_data = obj.read_bytes()
-                                            
+
                                             # Handle based on colorspace
                                             if is_rgb:
                                                 img = Image.frombytes("RGB", (width, height), img_data)
                                             else:  # DeviceGray
                                                 img = Image.frombytes("L", (width, height), img_data)
-                                            
+
                                             # Resize large images
                                             new_width, new_height = width, height
                                             if width > 1500 or height > 1500:
@@ -354,114 +325,107 @@ def direct_compress_pdf(input_path, output_path, compression_level=2):
                                                 new_height = int(height * ratio)
                                                 img = img.resize((new_width, new_height), Image.BICUBIC)
 
-                                            # Convert to JPEG with Adobe compatibility settings
-                                            img.save(temp_img_file, format="JPEG", quality=jpeg_quality, optimize=True)
+                                        # Convert to JPEG with Adobe compatibility settings, in memory
+                                        with telemetry.span("encode"):
+                                            buffer = io.BytesIO()
+                                            img.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+                                            new_data = buffer.getvalue()
+                                        
+                                        # Calculate if the new version is smaller
+                                        original_size = len(img_data)
+                                        new_size = len(new_data)
+                                        
+                                        # Only replace if the new version is smaller
+                                        if new_size < original_size:
+                                            # Update dimensions if resized
+                                            if width > 1500 or height > 1500:
+                                                obj["/Width"] = new_width
+                                                obj["/Height"] = new_height
                                             
-                                            with open(temp_img_file, 'rb') as f:
-                                                new_data = f.read()
+                                            # Set proper colorspace
+                                            if img.mode == "L":
+                                                obj["/ColorSpace"] = pikepdf.Name.DeviceGray
+                                            elif img.mode == "RGB":
+                                                obj["/ColorSpace"] = pikepdf.Name.DeviceRGB
                                             
-                                            # Calculate if the new version is smaller
-                                            original_size = len(img_data)
-                                            new_size = len(new_data)
+                                            # Update image data
+                                            obj.write(new_data, filter=pikepdf.Name.DCTDecode)
                                             
-                                            # Only replace if the new version is smaller
-                                            if new_size < original_size:
-                                                # Update dimensions if resized
-                                                if width > 1500 or height > 1500:
-                                                    obj["/Width"] = new_width
-                                                    obj["/Height"] = new_height
-                                                
-                                                # Set proper colorspace
-                                                if img.mode == "L":
-                                                    obj["/ColorSpace"] = pikepdf.Name.DeviceGray
-                                                elif img.mode == "RGB":
-                                                    obj["/ColorSpace"] = pikepdf.Name.DeviceRGB
-                                                
-                                                # Update image data
-                                                obj.write(new_data, filter=pikepdf.Name.DCTDecode)
-                                                
-                                                # Set bits per component
-                                                obj["/BitsPerComponent"] = 8
-                                                
-                                                # Remove unnecessary entries that might cause conflicts
-                                                for key in ["/DecodeParms", "/Predictor", "/Interpolate"]:
-                                                    if key in obj:
-                                                        del obj[key]
-                                        
-                                    except Exception as e:
-                                        print(f"Error converting image to JPEG: {e}")
-            
-            # Clean up any unreferenced objects created during processing
+                                            # Set bits per component
+                                            obj["/BitsPerComponent"] = 8
+                                            
+                                            # Remove unnecessary entries that might cause conflicts
+                                            for key in ["/DecodeParms", "/Predictor", "/Interpolate"]:
+                                                if key in obj:
+                                                    del obj[key]
+                                    
+                                except Exception as e:
+                                    logging.warning(f"Error converting image to JPEG: {e}")
+                                    telemetry.count("image_errors")
+        
+        # Clean up any unreferenced objects created during processing
+        with telemetry.span("cleanup"):
             pdf.remove_unreferenced_resources()
 
-        # Use a temporary file for the initial save to avoid issues
-        temp_output = os.path.join(temp_image_dir, "temp_output.pdf")
-        _register_temp_file(temp_output)
-        
-        # Save with compatibility options for best Adobe support
-        pdf.save(
-            temp_output,
-            compress_streams=True,
-            recompress_flate=True,
-            object_stream_mode=pikepdf.ObjectStreamMode.generate,
-            preserve_pdfa=True  # Maintain PDF/A compatibility when possible
-        )
-        
-        # Close the PDF before copying to release file handles
-        pdf.close()
-        pdf = None
-        
-        # Force garbage collection to release any file handles
-        gc.collect()
-        
-        # Now copy to final destination
-        shutil.copy2(temp_output, output_path)
-        
-    except Exception as e:
-        logging.error(f"Error processing PDF: {str(e)}")
-        if pdf is not None:
-            try:
-                pdf.close()
-            except:
-                pass
-        raise
-    finally:
-        # Make sure to close the PDF if it's still open
-        if pdf is not None:
-            try:
-                pdf.close()
-            except:
-                pass
-            
-        # Force garbage collection
-        gc.collect()
-        
-        # Clean up the temporary directory and its contents
+
+def direct_compress_pdf(input_path, output_path, compression_level=2):
+    """
+    Direct PDF compression function with special handling for image-heavy PDFs.
+    output_path: Path of the compressed PDF, or a writable binary file object (e.g. a scratch_file())
+    compression_level: 1=light, 2=medium, 3=maximum
+    """
+    # Imported here so it is only loaded when a PDF is actually compressed
+    import pikepdf
+
+    pdf = None  # Initialize pdf variable for proper cleanup
+
+    with telemetry.operation("compress", level=compression_level):
+        telemetry.count("bytes_in", telemetry.file_size(input_path))
         try:
-            # First try to delete individual files
-            for filename in os.listdir(temp_image_dir):
+            # Open the PDF file
+            with telemetry.span("open"):
+                pdf = pikepdf.Pdf.open(input_path)
+            telemetry.count("pages", len(pdf.pages))
+            compress_document(pdf, compression_level)
+
+            # A path is written via scratch storage (in memory unless the result is
+            # large), so it is never left half written and may even be the input
+            save_options = compressed_save_options()
+            if hasattr(output_path, 'write'):
+                with telemetry.span("write"):
+                    pdf.save(output_path, **save_options)
+                telemetry.count("bytes_out", output_path.tell())
+            else:
+                with scratch_file() as compressed, telemetry.span("write"):
+                    pdf.save(compressed, **save_options)
+
+                    # Close the PDF before writing the destination to release file handles
+                    pdf.close()
+                    pdf = None
+                    gc.collect()
+
+                    copy_scratch_to(compressed, output_path)
+                telemetry.count("bytes_out", telemetry.file_size(output_path))
+
+        except Exception as e:
+            logging.error(f"Error processing PDF: {str(e)}")
+            if pdf is not None:
                 try:
-                    filepath = os.path.join(temp_image_dir, filename)
-                    if os.path.isfile(filepath):
-                        try:
-                            os.unlink(filepath)
-                        except Exception as e:
-                            logging.warning(f"Could not delete file {filepath}: {str(e)}")
-                            mark_for_future_cleanup(filepath)
+                    pdf.close()
                 except:
                     pass
-                
-            # Then try to remove the directory
-            shutil.rmtree(temp_image_dir, ignore_errors=True)
-            _temp_files = [f for f in _temp_files if not f.startswith(temp_image_dir)]
-            
-            # If directory still exists, mark it for future cleanup
-            if os.path.exists(temp_image_dir):
-                mark_for_future_cleanup(temp_image_dir)
-                
-        except Exception as e:
-            logging.warning(f"Failed to clean up temp directory {temp_image_dir}: {str(e)}")
-            mark_for_future_cleanup(temp_image_dir)
+            raise
+        finally:
+            with telemetry.span("cleanup"):
+                # Make sure to close the PDF if it's still open
+                if pdf is not None:
+                    try:
+                        pdf.close()
+                    except:
+                        pass
+
+                # Force garbage collection
+                gc.collect()
 
     return True
 
@@ -472,15 +436,14 @@ def compress_pdf(self):
         QMessageBox.warning(self, "Warning", "Please select a PDF file first.")
         return
 
+    compressed = None
     try:
         self.status_label.setText(f"Analyzing {os.path.basename(self.latest_pdf)}...")
         self.progress_bar.setValue(10)
         QCoreApplication.processEvents()
 
-        # Create a temporary output filename for the compressed file
-        temp_dir = tempfile.gettempdir()
-        temp_filename = os.path.join(temp_dir, f"compressed_{os.path.basename(self.latest_pdf)}")
-        _register_temp_file(temp_filename)
+        # Keep the compressed file in scratch storage until the user picks where to save it
+        compressed = scratch_file()
 
         # Record the original file size
         original_size = os.path.getsize(self.latest_pdf) / 1024  # KB
@@ -505,7 +468,7 @@ def compress_pdf(self):
         QCoreApplication.processEvents()
 
         # Call the direct compression function with the appropriate level
-        direct_compress_pdf(self.latest_pdf, temp_filename, compression_level)
+        direct_compress_pdf(self.latest_pdf, compressed, compression_level)
 
         self.progress_bar.setValue(80)
         QCoreApplication.processEvents()
@@ -520,7 +483,7 @@ def compress_pdf(self):
 
         if save_path:
             # Copy the compressed file to the chosen location
-            shutil.copy2(temp_filename, save_path)
+            copy_scratch_to(compressed, save_path)
 
             # Get compressed file size
             compressed_size = os.path.getsize(save_path) / 1024  # KB
@@ -582,3 +545,7 @@ def compress_pdf(self):
         
         # Even on error, try to clean up temp files
         _cleanup_temp_files()
+    finally:
+        # Releases the scratch memory, or deletes the file it spilled to
+        if compressed is not None:
+            compressed.close()
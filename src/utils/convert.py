@@ -2,11 +2,14 @@ import os
 import logging
 from PyQt6.QtWidgets import QMessageBox, QFileDialog, QApplication
 import math
-import tempfile
 import shutil
 import gc
 from src.utils.compress import _register_temp_file, _cleanup_temp_files
 from src.utils.cleanup import mark_for_future_cleanup
+from src.utils.scratch import scratch_dir
+from src.utils.check_dependencies import warn_missing_imagemagick
+from src.utils.magick import MagickCommand
+from src.utils import telemetry
 
 
 def update_conversion_ui(self):
@@ -49,8 +52,6 @@ def load_conversion_settings(self):
 
 def convert_to_pdf(self):
     """Convert selected images to PDF based on current settings"""
-    merger = None  # Initialize merger variable for proper cleanup
-    
     if len(self.selected_files) == 0:
         self.status_label.setText("No images selected!")
         QMessageBox.warning(self, "Warning", "Please select images first before converting.")
@@ -93,10 +94,16 @@ def convert_to_pdf(self):
             compression = "JPEG"
             quality = 85
 
-    # Create a temporary working directory for this conversion
-    temp_dir = tempfile.mkdtemp(prefix="pdf_convert_")
+    # Create a temporary working directory for this conversion, on the scratch storage
+    temp_dir = scratch_dir(prefix="pdf_convert_")
     _register_temp_file(temp_dir)
 
+    # Pillow handles every common format itself, so ImageMagick is only started when needed
+    from src.utils.pillow_ops import image_engine, use_pillow, render_command, encode_command
+    engine = image_engine(self)
+    if getattr(self, 'has_imagick', None) is False and not all(use_pillow(engine, f) for f in self.selected_files):
+        warn_missing_imagemagick(self)
+
     try:
         if self.chk_separate.isChecked():
             # Save as separate PDFs
@@ -113,26 +120,29 @@ def convert_to_pdf(self):
                     out_file = os.path.join(folder, os.path.splitext(os.path.basename(img_file))[0] + ".pdf")
 
                     # Build ImageMagick command
-                    rotate_option = f"-rotate {self.rotations[i]}" if i in self.rotations else ""
-                    border_option = f"-border {margin} -bordercolor white" if margin > 0 else ""
-                    orient_option = "-rotate 90" if apply_global_orientation else ""
-                    quality_option = f"-quality {quality}" if quality != 95 else ""
-                    density_option = f"-density {dpi}" if dpi != 150 else ""
-                    compress_option = f"-compress {compression}" if compression != "JPEG" else ""
-
-                    # Add paper size option
-                    page_size_option = f"-page {paper_size}"
-
-                    # Combine options
-                    options = " ".join(filter(None, [rotate_option, border_option, orient_option,
-                                                     page_size_option, quality_option, density_option, compress_option]))
+                    command = (MagickCommand(img_file)
+                               .rotate(self.rotations.get(i))
+                               .border(margin)
+                               .rotate(90 if apply_global_orientation else None)
+                               .density(dpi)
+                               .page(paper_size)
+                               .quality(quality)
+                               .compress(compression if compression != "JPEG" else None))
 
-                    cmd = f'magick "{img_file}" {options} "{temp_out_file}"'
                     try:
-                        self.run_imagemagick(cmd)
-                        
-                        # Copy from temp to final destination
-                        shutil.copy2(temp_out_file, out_file)
+                        with telemetry.operation("convert", engine=engine, separate=True):
+                            telemetry.count("bytes_in", telemetry.file_size(img_file))
+                            telemetry.count("images")
+                            if use_pillow(engine, img_file):
+                                render_command(command, temp_out_file)
+                            else:
+                                self.run_imagemagick(command.args(temp_out_file))
+
+                            # Copy from temp to final destination
+                            with telemetry.span("write"):
+                                shutil.copy2(temp_out_file, out_file)
+                            telemetry.count("pages")
+                            telemetry.count("bytes_out", telemetry.file_size(out_file))
 
                         count += 1
                         self.progress_bar.setValue(math.floor((count / total) * 100))
@@ -156,86 +166,99 @@ def convert_to_pdf(self):
                 "PDF Files (*.pdf)"
             )
             if output_pdf:
-                self.progress_bar.setValue(0)
-
-                # Apply formatting options
-                border_option = f"-border {margin} -bordercolor white" if margin > 0 else ""
-                orient_option = "-rotate 90" if apply_global_orientation else ""
-
-                # Use simpler set of options that are more compatible
-                common_options = "-quality 95"  # Simple quality setting
+                # The PDF writer and image pipeline need PIL, so load them on first use
+                from src.utils.pdf_stream import StreamingPdfWriter, encode_image_file, encode_ccitt_frame
+                from src.utils.convert_pipeline import iter_encoded_pages, iter_image_frames
 
-                # Process each file individually to create temporary PDFs
-                temp_pdfs = []
-                for i, img_file in enumerate(self.selected_files):
-                    # Create a temporary PDF for each image
-                    temp_pdf = os.path.join(temp_dir, f"temp_{i}.pdf")
-                    _register_temp_file(temp_pdf)
-                    temp_pdfs.append(temp_pdf)
+                self.progress_bar.setValue(0)
 
-                    # Build command with individual file options
-                    rotation = f"-rotate {self.rotations[i]}" if i in self.rotations else ""
+                def encode_page(i, frame):
+                    """Convert one image frame on a worker thread and encode it as a PDF page"""
+                    # Group 4 fax frames are copied into the PDF without being decoded;
+                    # their rotation and border are applied to the page instead
+                    telemetry.count("images")
+                    if frame.passthrough:
+                        return encode_ccitt_frame(frame.path, frame.frame)
 
                     # Simple command for single image conversion
-                    file_cmd = f'magick "{img_file}" {rotation} {border_option} {common_options} "{temp_pdf}"'
+                    command = (MagickCommand(frame.path, frame.frame if frame.frame_count > 1 else None)
+                               .rotate(self.rotations.get(frame.file_index))
+                               .border(margin)
+                               .quality(95))
 
-                    try:
-                        print(f"Converting image {i + 1}/{len(self.selected_files)}")
-                        self.run_imagemagick(file_cmd)
+                    if use_pillow(engine, frame.path):
+                        return encode_command(command)
 
-                        # Update progress
-                        progress = int((i + 1) / len(self.selected_files) * 90)
-                        self.progress_bar.setValue(progress)
-                        QApplication.processEvents()
-                    except Exception as e:
-                        logging.error(f"Error converting image {img_file}: {str(e)}")
-                        QMessageBox.warning(self, "Conversion Error", f"Error converting {os.path.basename(img_file)}: {str(e)}")
-                        continue
+                    # Keep JPEG sources as JPEG so they are embedded without re-decoding
+                    ext = ".jpg" if frame.path.lower().endswith((".jpg", ".jpeg")) else ".png"
+                    temp_img = os.path.join(temp_dir, f"temp_{i}{ext}")
+                    _register_temp_file(temp_img)
 
-                # Now merge all temporary PDFs using PyPDF2
-                if temp_pdfs:
                     try:
-                        import PyPDF2
-                        merger = PyPDF2.PdfMerger()
-
-                        for pdf in temp_pdfs:
-                            if os.path.exists(pdf):
-                                merger.append(pdf)
-
-                        # Create a temporary output file first
-                        temp_final_pdf = os.path.join(temp_dir, "final_output.pdf")
-                        _register_temp_file(temp_final_pdf)
-                        
-                        # Write to temp file first
-                        with open(temp_final_pdf, 'wb') as f:
-                            merger.write(f)
-                        
-                        # Close the merger to release file handles before copying
-                        merger.close()
-                        merger = None
-                            
-                        # Force garbage collection to release any file handles
-                        gc.collect()
-                            
-                        # Then copy to final destination
-                        shutil.copy2(temp_final_pdf, output_pdf)
-
-                        self.progress_bar.setValue(100)
-                        self.status_label.setText(f"PDF created with {len(self.selected_files)} images: {output_pdf}")
-                        QMessageBox.information(self, "Success", "PDF conversion complete!")
-
-                        # Store the latest PDF file path and enable preview/print/compress buttons
-                        self.latest_pdf = output_pdf
-                    except Exception as merge_error:
-                        logging.error(f"Error merging PDFs: {str(merge_error)}")
-                        QMessageBox.critical(self, "Error", f"Error creating final PDF: {str(merge_error)}")
-                        self.progress_bar.setValue(0)
-                        return
-                else:
+                        self.run_imagemagick(command.args(temp_img))
+                        with telemetry.span("encode"):
+                            return encode_image_file(temp_img)
+                    finally:
+                        # Drop the intermediate as soon as it is encoded
+                        if os.path.exists(temp_img):
+                            os.unlink(temp_img)
+
+                # Stream each converted page straight into the output PDF. Images are
+                # decoded, encoded and written one small window at a time, so memory
+                # use stays flat however many images are in the batch. Multi-page
+                # files such as TIFF scans contribute one page per frame.
+                converted = 0
+                total = len(self.selected_files)
+                try:
+                    with telemetry.operation("convert", engine=engine, separate=False):
+                        telemetry.count("bytes_in", sum(telemetry.file_size(path) for path in self.selected_files))
+                        with StreamingPdfWriter(output_pdf) as writer:
+                            pages = iter_encoded_pages(iter_image_frames(self.selected_files), encode_page)
+                            for i, frame, page, error in pages:
+                                img_file = frame.path
+                                if error is not None:
+                                    logging.error(f"Error converting image {img_file}: {str(error)}")
+                                    QMessageBox.warning(self, "Conversion Error", f"Error converting {os.path.basename(img_file)}: {str(error)}")
+                                    continue
+
+                                logging.debug(f"Converted page {i + 1} (image {frame.file_index + 1}/{total})")
+                                with telemetry.span("write"):
+                                    if frame.passthrough:
+                                        writer.add_encoded(page, rotate=self.rotations.get(frame.file_index, 0), margin=margin)
+                                    else:
+                                        writer.add_encoded(page)
+                                telemetry.count("pages")
+                                converted += 1
+
+                                # Update progress
+                                progress = int((frame.file_index + (frame.frame + 1) / frame.frame_count) / total * 90)
+                                self.progress_bar.setValue(progress)
+                                QApplication.processEvents()
+
+                            if converted == 0:
+                                writer.abort()
+                        telemetry.count("bytes_out", telemetry.file_size(output_pdf))
+                except Exception as write_error:
+                    logging.error(f"Error writing PDF: {str(write_error)}")
+                    QMessageBox.critical(self, "Error", f"Error creating final PDF: {str(write_error)}")
+                    self.progress_bar.setValue(0)
+                    return
+
+                if converted == 0:
                     QMessageBox.critical(self, "Error", "No images were successfully converted to PDF")
                     self.progress_bar.setValue(0)
                     return
 
+                self.progress_bar.setValue(100)
+                self.status_label.setText(f"PDF created with {converted} pages: {output_pdf}")
+                QMessageBox.information(self, "Success", "PDF conversion complete!")
+
+                # Store the latest PDF file path and enable preview/print/compress buttons
+                self.latest_pdf = output_pdf
+
+                # The Compress tab shows the new PDF, so make sure it exists
+                self.ensure_tab_built(self.tools_tab)
+
                 # Enable buttons if they exist
                 if hasattr(self, 'btn_preview_pdf'):
                     self.btn_preview_pdf.setEnabled(True)
@@ -263,13 +286,6 @@ def convert_to_pdf(self):
         QMessageBox.critical(self, "Error", f"Error during PDF conversion: {str(e)}\nSee error.log for details.")
         self.progress_bar.setValue(0)
     finally:
-        # Make sure to close the merger if it exists
-        if 'merger' in locals() and merger is not None:
-            try:
-                merger.close()
-            except:
-                pass
-                
         # Force garbage collection to release file handles
         gc.collect()
         
@@ -300,19 +316,5 @@ def convert_to_pdf(self):
             # Clean up any remaining registered temp files
             _cleanup_temp_files()
             
-            # Search for and clean any stray pdf_convert directories that might be left
-            tmp_dir = tempfile.gettempdir()
-            for item in os.listdir(tmp_dir):
-                if item.startswith("pdf_convert_"):
-                    try:
-                        item_path = os.path.join(tmp_dir, item)
-                        if os.path.isdir(item_path):
-                            shutil.rmtree(item_path, ignore_errors=True)
-                            logging.info(f"Cleaned up stray temp directory: {item_path}")
-                    except Exception as e:
-                        logging.error(f"Error cleaning up stray temp directory {item}: {str(e)}")
-                        # Mark for future cleanup
-                        mark_for_future_cleanup(item_path)
-            
         except Exception as cleanup_error:
             logging.error(f"Error cleaning up temp files: {str(cleanup_error)}")
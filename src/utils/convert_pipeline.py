@@ -0,0 +1,154 @@
+import os
+import logging
+import threading
+import contextvars
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.utils.pdf_stream import ccitt_passthrough_info
+
+# Upper bound on decoded pixels held in memory at once (~64 MP, about 192 MB as RGB).
+# Can be overridden with the PDF_MANAGER_MAX_INFLIGHT_PIXELS environment variable.
+DEFAULT_MAX_INFLIGHT_PIXELS = 64 * 1024 * 1024
+
+# Number of images that may be in flight (being decoded/encoded or waiting to be written)
+DEFAULT_WINDOW = 2
+
+
+def _default_max_inflight_pixels():
+    value = os.environ.get("PDF_MANAGER_MAX_INFLIGHT_PIXELS")
+    if value:
+        try:
+            return max(1, int(value))
+        except ValueError:
+            logging.warning(f"Ignoring invalid PDF_MANAGER_MAX_INFLIGHT_PIXELS value: {value}")
+    return DEFAULT_MAX_INFLIGHT_PIXELS
+
+
+class PixelBudget:
+    """
+    Counting limit on decoded pixels shared by concurrent conversions.
+
+    A request larger than the whole budget is clamped to it, so an oversized
+    image can still be processed - it just runs on its own.
+    """
+
+    def __init__(self, max_pixels):
+        self.max_pixels = max_pixels
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, pixels):
+        pixels = min(pixels, self.max_pixels)
+        with self._condition:
+            while self.in_use + pixels > self.max_pixels:
+                self._condition.wait()
+            self.in_use += pixels
+        return pixels
+
+    def release(self, pixels):
+        with self._condition:
+            self.in_use -= pixels
+            self._condition.notify_all()
+
+
+# One page worth of input: a single frame of an image file. `passthrough` is True
+# when the frame can be embedded without decoding (single-strip CCITT Group 4).
+ImageFrame = namedtuple(
+    "ImageFrame", ["file_index", "path", "frame", "frame_count", "width", "height", "passthrough"]
+)
+
+
+def image_pixels(image):
+    """Return the decoded pixel count of an image path or ImageFrame, reading only headers."""
+    if isinstance(image, ImageFrame):
+        return 0 if image.passthrough else image.width * image.height
+    try:
+        with Image.open(image) as img:
+            return img.width * img.height
+    except Exception as e:
+        logging.warning(f"Could not read image size of {image}: {str(e)}")
+        return 0
+
+
+def iter_image_frames(image_files):
+    """
+    Expand image files into their frames, one page each.
+
+    Multi-page TIFF scans yield every frame; animated formats such as GIF
+    only contribute their first frame. Only image headers
+    are read, lazily, as the stream is consumed. A file that cannot be opened
+    still yields one frame so the encoder can report the error.
+    """
+    for file_index, image_path in enumerate(image_files):
+        try:
+            with Image.open(image_path) as img:
+                frame_count = getattr(img, "n_frames", 1) if img.format == "TIFF" else 1
+                for frame in range(frame_count):
+                    if frame:
+                        img.seek(frame)
+                    passthrough = ccitt_passthrough_info(img) is not None
+                    yield ImageFrame(file_index, image_path, frame, frame_count,
+                                     img.width, img.height, passthrough)
+        except Exception as e:
+            logging.warning(f"Could not read frames of {image_path}: {str(e)}")
+            yield ImageFrame(file_index, image_path, 0, 1, 0, 0, False)
+
+
+def _encode_within_budget(budget, encode, index, image):
+    """Run one encode job while holding its share of the pixel budget."""
+    pixels = budget.acquire(image_pixels(image))
+    try:
+        return encode(index, image)
+    finally:
+        budget.release(pixels)
+
+
+def iter_encoded_pages(images, encode, max_inflight_pixels=None, window=DEFAULT_WINDOW):
+    """
+    Encode images into PDF pages as a bounded stream.
+
+    Only `window` images are in flight at a time and the decoded pixels held
+    by running encode jobs never exceed `max_inflight_pixels`, so memory use
+    does not grow with the size of the batch. Each decoded image is released
+    as soon as it has been encoded.
+
+    Args:
+        images: Iterable of image paths or ImageFrames, consumed lazily
+        encode: Callable (index, image) -> EncodedImage, run on a worker thread
+        max_inflight_pixels: Pixel budget shared by the running encode jobs
+        window: Number of images processed ahead of the consumer
+
+    Yields:
+        (index, image, page, error) tuples in input order, where page is
+        None and error is the raised exception if encoding failed
+    """
+    if max_inflight_pixels is None:
+        max_inflight_pixels = _default_max_inflight_pixels()
+    window = max(1, window)
+    budget = PixelBudget(max_inflight_pixels)
+    source = iter(enumerate(images))
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=window, thread_name_prefix="pdf_convert") as pool:
+        def submit_next():
+            for index, image in source:
+                # Run in the caller's context, so telemetry spans land in its operation
+                future = pool.submit(contextvars.copy_context().run, _encode_within_budget,
+                                     budget, encode, index, image)
+                pending.append((index, image, future))
+                return
+
+        for _ in range(window):
+            submit_next()
+
+        while pending:
+            index, image, future = pending.popleft()
+            try:
+                page, error = future.result(), None
+            except Exception as e:
+                page, error = None, e
+            # Keep the window full while the consumer writes this page
+            submit_next()
+            yield index, image, page, error
+            page = None
@@ -1,6 +1,7 @@
 import os
 import logging
 from PyQt6.QtWidgets import QMessageBox
+from src.utils.image_tool import IMAGE_EXTENSIONS
 
 
 def setupDragDrop(self):
@@ -22,7 +23,7 @@ def dropEvent(self, event):
 
         if current_tab == 0:  # Main tab
             # Proceed only if image files are dropped
-            image_files = [f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
+            image_files = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS)]
             if image_files:
                 for file in image_files:
                     if file not in self.selected_files:
@@ -0,0 +1,570 @@
+"""
+Local HTTP service exposing compress, merge, split and convert.
+
+Other programs can use the PDF tools without the GUI:
+
+    POST /compress?level=2              body: a PDF
+    POST /split?pages=1-3,7             body: a PDF
+    POST /merge?bookmarks=1             body: multipart/form-data with the PDFs in order
+    POST /convert?paper=A4&dpi=150      body: an image, or multipart/form-data with several
+    GET  /health                        JSON status
+    GET  /metrics                       Prometheus text format
+
+Single-file endpoints take the file as the raw request body or as the only
+part of a multipart upload; chunked uploads are accepted. Uploads are
+streamed into the session scratch folder, jobs run on a small process pool
+with a bounded queue (requests beyond it get 503), and the resulting PDF is
+streamed back. A worker process that dies takes its pool down; the pool is
+replaced and the requests whose jobs were lost get 503. Start it with:
+
+    python -m src.utils.http_service [--port 8765] [--workers N] [--queue N]
+
+The service listens on 127.0.0.1 only unless another --host is given.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from src.utils.pipeline import ignore_interrupts
+
+DEFAULT_PORT = 8765
+
+# Jobs waiting for a worker on top of the running ones; more requests are turned away with 503
+DEFAULT_MAX_QUEUED = 8
+
+# Largest accepted request body
+DEFAULT_MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+
+# Seconds a job may take, including its time in the queue
+JOB_TIMEOUT = 600
+
+# Bytes copied per read/write when streaming uploads and results
+_CHUNK = 1024 * 1024
+
+_ENDPOINTS = ("compress", "merge", "split", "convert")
+
+
+class HttpError(Exception):
+    """A request error reported to the client with an HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class BodyReader:
+    """
+    Read a request body of known length or in chunked transfer encoding.
+
+    Raises HttpError 413 once more than `limit` bytes have been read.
+    """
+
+    def __init__(self, rfile, length=None, chunked=False, limit=DEFAULT_MAX_UPLOAD_BYTES):
+        self.rfile = rfile
+        self.remaining = length
+        self.chunked = chunked
+        self.limit = limit
+        self.total = 0
+        self._chunk_left = 0
+        self._done = False
+
+    def read(self, size=_CHUNK):
+        if self._done:
+            return b""
+        if self.chunked:
+            data = self._read_chunked(size)
+        else:
+            data = self.rfile.read(min(size, self.remaining)) if self.remaining else b""
+            self.remaining -= len(data)
+            if not data:
+                self._done = True
+        self.total += len(data)
+        if self.total > self.limit:
+            raise HttpError(413, f"Upload larger than {self.limit} bytes")
+        return data
+
+    def _read_chunked(self, size):
+        if self._chunk_left == 0:
+            line = self.rfile.readline(1024)
+            try:
+                self._chunk_left = int(line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, "Malformed chunked upload")
+            if self._chunk_left == 0:
+                # Skip optional trailers up to the empty line
+                while self.rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+                    pass
+                self._done = True
+                return b""
+        data = self.rfile.read(min(size, self._chunk_left))
+        if not data:
+            raise HttpError(400, "Upload ended early")
+        self._chunk_left -= len(data)
+        if self._chunk_left == 0:
+            self.rfile.readline(16)  # CRLF after the chunk
+        return data
+
+    def drain(self):
+        while self.read():
+            pass
+
+
+def save_body(reader, path):
+    """Stream a raw request body to `path`; returns the bytes written"""
+    with open(path, "wb") as f:
+        while True:
+            data = reader.read()
+            if not data:
+                break
+            f.write(data)
+    return reader.total
+
+
+def save_multipart(reader, boundary, directory):
+    """
+    Stream the file parts of a multipart/form-data body into `directory`.
+
+    Parts are written to disk as they arrive, never held in memory whole.
+
+    Returns:
+        List of (field name, client file name, saved path) in upload order
+    """
+    delimiter = b"\r\n--" + boundary
+    buffer = b"\r\n"  # The first delimiter has no CRLF in front of it
+    parts = []
+
+    def fill(minimum):
+        nonlocal buffer
+        while len(buffer) < minimum:
+            data = reader.read()
+            if not data:
+                return False
+            buffer += data
+        return True
+
+    # Skip the preamble up to the first delimiter
+    while True:
+        index = buffer.find(delimiter)
+        if index >= 0:
+            buffer = buffer[index + len(delimiter):]
+            break
+        buffer = buffer[-len(delimiter):]
+        if not fill(len(buffer) + 1):
+            raise HttpError(400, "Malformed multipart upload")
+
+    while True:
+        fill(2)
+        if buffer.startswith(b"--"):
+            return parts
+        # Headers of the next part
+        while b"\r\n\r\n" not in buffer:
+            if not fill(len(buffer) + 1) or len(buffer) > 64 * 1024:
+                raise HttpError(400, "Malformed multipart upload")
+        header_block, buffer = buffer.split(b"\r\n\r\n", 1)
+        headers = header_block.decode("utf-8", "replace")
+        name = re.search(r'\bname="([^"]*)"', headers)
+        filename = re.search(r'\bfilename="([^"]*)"', headers)
+
+        path = os.path.join(directory, f"part_{len(parts)}")
+        with open(path, "wb") as f:
+            while True:
+                index = buffer.find(delimiter)
+                if index >= 0:
+                    f.write(buffer[:index])
+                    buffer = buffer[index + len(delimiter):]
+                    break
+                # Keep enough bytes back for a delimiter split across reads
+                keep = len(delimiter)
+                if len(buffer) > keep:
+                    f.write(buffer[:-keep])
+                    buffer = buffer[-keep:]
+                if not fill(len(buffer) + 1):
+                    raise HttpError(400, "Multipart upload ended early")
+
+        if filename is not None:
+            parts.append((name.group(1) if name else "", os.path.basename(filename.group(1)), path))
+        else:
+            os.unlink(path)  # Plain form fields are not used
+
+
+def run_job(stages, output):
+    """
+    Worker process job: run pipeline stages and write `output`.
+
+    Returns the page count. Files that are not a readable PDF or image
+    raise ValueError, which the client gets as a 400 error.
+    """
+    import pikepdf
+    from PIL import UnidentifiedImageError
+    from src.utils.pipeline import Pipeline
+
+    try:
+        return Pipeline(stages).run(output)
+    except (pikepdf.PdfError, UnidentifiedImageError) as e:
+        raise ValueError(f"Unreadable upload: {str(e)}")
+
+
+def _query_int(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise HttpError(400, f"Parameter '{name}' must be a whole number")
+
+
+def build_stages(endpoint, files, query):
+    """Turn an endpoint, its uploaded files and its query parameters into pipeline stages"""
+    if not files:
+        raise HttpError(400, "No file uploaded")
+
+    if endpoint == "convert":
+        return [{
+            "stage": "convert",
+            "images": files,
+            "paper": query.get("paper", [None])[0],
+            "dpi": _query_int(query, "dpi", 150),
+            "margin": _query_int(query, "margin", 0),
+            "rotate": _query_int(query, "rotate", 0),
+            "quality": _query_int(query, "quality", 95),
+        }]
+
+    if endpoint == "merge":
+        if len(files) < 2:
+            raise HttpError(400, "Upload at least two PDF files to merge")
+        bookmarks = query.get("bookmarks", ["0"])[0].lower() in ("1", "true", "yes")
+        return [{"stage": "merge", "files": files, "bookmarks": bookmarks}]
+
+    if len(files) != 1:
+        raise HttpError(400, f"/{endpoint} takes exactly one PDF")
+    stages = [{"stage": "open", "file": files[0]}]
+    if endpoint == "compress":
+        level = _query_int(query, "level", 2)
+        if level not in (1, 2, 3):
+            raise HttpError(400, "Parameter 'level' must be 1, 2 or 3")
+        stages.append({"stage": "compress", "level": level})
+    else:
+        pages = query.get("pages", [""])[0]
+        if not pages:
+            raise HttpError(400, "Parameter 'pages' is required, e.g. pages=1-3,7")
+        stages.append({"stage": "extract", "pages": pages})
+    return stages
+
+
+class ServiceMetrics:
+    """Counters reported by /metrics and /health"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}  # (endpoint, status) -> count
+        self.job_seconds = {}  # endpoint -> (sum, count)
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.active_jobs = 0
+        self.pool_restarts = 0
+
+    def count_request(self, endpoint, status):
+        with self._lock:
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+
+    def add_job_time(self, endpoint, seconds):
+        with self._lock:
+            total, count = self.job_seconds.get(endpoint, (0.0, 0))
+            self.job_seconds[endpoint] = (total + seconds, count + 1)
+
+    def job_started(self):
+        with self._lock:
+            self.active_jobs += 1
+
+    def job_finished(self):
+        with self._lock:
+            self.active_jobs -= 1
+
+    def pool_restarted(self):
+        with self._lock:
+            self.pool_restarts += 1
+
+    def add_bytes(self, received=0, sent=0):
+        with self._lock:
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def prometheus(self, workers):
+        with self._lock:
+            lines = [
+                "# TYPE pdf_manager_http_requests_total counter",
+                *(f'pdf_manager_http_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}'
+                  for (endpoint, status), count in sorted(self.requests.items())),
+                "# TYPE pdf_manager_http_job_seconds summary",
+                *(line for endpoint, (total, count) in sorted(self.job_seconds.items())
+                  for line in (f'pdf_manager_http_job_seconds_sum{{endpoint="{endpoint}"}} {total:.6f}',
+                               f'pdf_manager_http_job_seconds_count{{endpoint="{endpoint}"}} {count}')),
+                "# TYPE pdf_manager_http_jobs_running gauge",
+                f"pdf_manager_http_jobs_running {min(self.active_jobs, workers)}",
+                "# TYPE pdf_manager_http_jobs_queued gauge",
+                f"pdf_manager_http_jobs_queued {max(0, self.active_jobs - workers)}",
+                "# TYPE pdf_manager_http_pool_restarts_total counter",
+                f"pdf_manager_http_pool_restarts_total {self.pool_restarts}",
+                "# TYPE pdf_manager_http_received_bytes_total counter",
+                f"pdf_manager_http_received_bytes_total {self.bytes_received}",
+                "# TYPE pdf_manager_http_sent_bytes_total counter",
+                f"pdf_manager_http_sent_bytes_total {self.bytes_sent}",
+                "# TYPE pdf_manager_http_uptime_seconds gauge",
+                f"pdf_manager_http_uptime_seconds {time.time() - self.started:.3f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+class PdfService(ThreadingHTTPServer):
+    """
+    HTTP server running PDF jobs on a process pool.
+
+    At most `workers` jobs run at a time and `max_queued` more wait for a
+    worker; a request that would exceed that is answered with 503 at once
+    rather than tying up a connection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, max_queued=DEFAULT_MAX_QUEUED,
+                 max_upload=DEFAULT_MAX_UPLOAD_BYTES):
+        super().__init__(address, ServiceHandler)
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.max_upload = max_upload
+        self.metrics = ServiceMetrics()
+        self.pool = self._new_pool()
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, max_queued))
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+
+    def replace_broken_pool(self, broken):
+        """
+        Start a new pool in place of one a dead worker has broken.
+
+        Every request with a job on the broken pool calls this; only the
+        first replaces it.
+        """
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            logging.error("A worker process died, starting a new process pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+            self.metrics.pool_restarted()
+
+    def admit(self):
+        """Reserve a place in the job queue; returns False when it is full"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        self.metrics.job_started()
+        return True
+
+    def release(self):
+        self.metrics.job_finished()
+        self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PDFManager"
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "5")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        metrics = self.server.metrics
+        metrics.count_request(path.lstrip("/") or "root", 200 if path in ("/health", "/metrics") else 404)
+        if path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "uptime": round(time.time() - metrics.started, 3),
+                "workers": self.server.workers,
+                "active_jobs": metrics.active_jobs,
+                "pool_restarts": metrics.pool_restarts,
+                "endpoints": list(_ENDPOINTS),
+            })
+        elif path == "/metrics":
+            body = metrics.prometheus(self.server.workers).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": f"Unknown path {path or '/'}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.strip("/")
+        if endpoint not in _ENDPOINTS:
+            self.close_connection = True
+            self.server.metrics.count_request("unknown", 404)
+            self._send_json(404, {"error": f"Unknown endpoint /{endpoint}"})
+            return
+
+        status = 500
+        error = None
+        admitted = False
+        job_dir = None
+        reader = None
+        try:
+            try:
+                reader = self._body_reader()
+                if not self.server.admit():
+                    raise HttpError(503, "Too many jobs queued, try again later")
+                admitted = True
+
+                from src.utils.cleanup import make_temp_dir
+                job_dir = make_temp_dir(prefix=f"http_{endpoint}_")
+                files = self._save_uploads(reader, job_dir, endpoint)
+                self.server.metrics.add_bytes(received=reader.total)
+
+                stages = build_stages(endpoint, files, parse_qs(url.query))
+                output = os.path.join(job_dir, "result.pdf")
+                started = time.perf_counter()
+                pool = self.server.pool
+                try:
+                    future = pool.submit(run_job, stages, output)
+                    pages = future.result(timeout=JOB_TIMEOUT)
+                except BrokenProcessPool:
+                    self.server.replace_broken_pool(pool)
+                    raise HttpError(503, "A worker process crashed, try again")
+                except FutureTimeoutError:
+                    if not future.cancel():
+                        # The job is still running in a worker, which keeps its slot and folder until it ends
+                        self._release_when_done(future, job_dir)
+                        admitted, job_dir = False, None
+                    raise HttpError(504, f"Job took longer than {JOB_TIMEOUT} seconds")
+                except ValueError as e:
+                    raise HttpError(400, str(e))
+                self.server.metrics.add_job_time(endpoint, time.perf_counter() - started)
+                status = 200
+            except HttpError as e:
+                status, error = e.status, str(e)
+            except Exception as e:
+                logging.error(f"Error in /{endpoint}: {str(e)}")
+                error = str(e)
+            finally:
+                # Done before replying, so a client reading /metrics next sees the job finished
+                if admitted:
+                    self.server.release()
+                self.server.metrics.count_request(endpoint, status)
+
+            if status == 200:
+                self._send_result(output, pages, endpoint)
+            else:
+                # The rest of the body may not have been read, so the connection cannot be reused
+                self.close_connection = True
+                self._send_json(status, {"error": error})
+        finally:
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _release_when_done(self, future, job_dir):
+        """Free the queue slot and delete the folder of a job the request gave up on once the job ends"""
+        server = self.server
+
+        def finished(_):
+            server.release()
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+        future.add_done_callback(finished)
+
+    def _body_reader(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return BodyReader(self.rfile, chunked=True, limit=self.server.max_upload)
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            raise HttpError(411, "Content-Length or chunked Transfer-Encoding is required")
+        if length > self.server.max_upload:
+            raise HttpError(413, f"Upload larger than {self.server.max_upload} bytes")
+        return BodyReader(self.rfile, length=length, limit=self.server.max_upload)
+
+    def _save_uploads(self, reader, job_dir, endpoint):
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            boundary = re.search(r'boundary="?([^";]+)"?', content_type)
+            if boundary is None:
+                raise HttpError(400, "Multipart upload without a boundary")
+            parts = save_multipart(reader, boundary.group(1).encode("latin-1"), job_dir)
+            reader.drain()
+            return [path for _, _, path in parts]
+
+        path = os.path.join(job_dir, "upload.pdf" if endpoint != "convert" else "upload")
+        if save_body(reader, path) == 0:
+            return []
+        return [path]
+
+    def _send_result(self, output, pages, endpoint):
+        size = os.path.getsize(output)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(size))
+        self.send_header("Content-Disposition", f'attachment; filename="{endpoint}.pdf"')
+        self.send_header("X-Page-Count", str(pages))
+        self.end_headers()
+        try:
+            with open(output, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, _CHUNK)
+        except (BrokenPipeError, ConnectionResetError):
+            logging.warning(f"Client went away while receiving the /{endpoint} result")
+            self.close_connection = True
+            return
+        self.server.metrics.add_bytes(sent=size)
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, workers=None, max_queued=DEFAULT_MAX_QUEUED,
+                max_upload=DEFAULT_MAX_UPLOAD_BYTES):
+    """Create the service; call serve_forever() to run it and server_close() when done"""
+    return PdfService((host, port), workers, max_queued, max_upload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the PDF tools over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--queue", type=int, default=DEFAULT_MAX_QUEUED,
+                        help="Jobs that may wait for a worker before requests are refused")
+    parser.add_argument("--max-upload-mb", type=float, default=DEFAULT_MAX_UPLOAD_BYTES / 1024 / 1024,
+                        help="Largest accepted upload in MB")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    server = make_server(args.host, args.port, args.workers, args.queue, int(args.max_upload_mb * 1024 * 1024))
+    logging.info(f"Serving on http://{args.host}:{server.server_address[1]} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
 import os
 import logging
 from PyQt6.QtWidgets import QFileDialog, QMessageBox
-from PIL import Image
-from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, QSize, QTimer
+from src.utils.background import BackgroundWorker
+from src.utils.qt_image import pil_to_qimage
+from src.utils.magick import IMAGE_EXTENSIONS
+
+# Delay after the last navigation/zoom before the high quality preview pass runs
+PREVIEW_IDLE_MS = 250
+
+# Delay after the last wheel event before the zoomed preview is re-rendered
+ZOOM_SETTLE_MS = 120
+
+# Number of images on each side of the current one decoded ahead of time
+PREFETCH_RADIUS = 2
 
 
 def select_images(self):
@@ -10,7 +22,7 @@ def select_images(self):
         self,
         "Select Images",
         "",
-        "Image Files (*.jpg *.jpeg *.png *.bmp)"
+        "Image Files (" + " ".join(f"*{ext}" for ext in IMAGE_EXTENSIONS) + ")"
     )
     if files:
         for file in files:
@@ -43,46 +55,120 @@ def next_image(self):
         self.update_picture_box()
 
 
+def _preview_bounds(self):
+    """Return the (width, height) available for the image preview"""
+    size = self.preview_label.size()
+    if size.width() < 50 or size.height() < 50:
+        # Not laid out yet, fall back to the frame's minimum size
+        size = self.preview_frame.minimumSize()
+    return max(1, size.width()), max(1, size.height())
+
+
+def _preview_cache(self):
+    """Return the window's preview cache, creating it and its prefetcher on first use"""
+    if getattr(self, '_preview_image_cache', None) is None:
+        # The preview module pulls in PIL, which is only needed once there is an image to show
+        from src.utils.preview import PreviewCache, PreviewPrefetcher
+        self._preview_image_cache = PreviewCache()
+        self._preview_prefetcher = PreviewPrefetcher(self._preview_image_cache)
+    return self._preview_image_cache
+
+
+def _prefetch_neighbors(self, bounds):
+    """Decode the next and previous few images in the background"""
+    jobs = []
+    for distance in range(1, PREFETCH_RADIUS + 1):
+        # Forward first, since that is the usual direction of travel
+        for index in (self.current_index + distance, self.current_index - distance):
+            if 0 <= index < len(self.selected_files):
+                jobs.append((self.selected_files[index], bounds,
+                             self.rotations.get(index, 0), self.zoom_factor))
+    self._preview_prefetcher.request(jobs)
+
+
+def _schedule_quality_preview(self, delay=PREVIEW_IDLE_MS):
+    """Run the high quality preview pass once navigation and zooming are idle"""
+    timer = getattr(self, '_preview_quality_timer', None)
+    if timer is None:
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: _render_quality_preview(self))
+        self._preview_quality_timer = timer
+    # Restarting the timer coalesces bursts of navigation or wheel events
+    timer.start(delay)
+
+
+def _preview_request(self):
+    """Return the (path, bounds, rotation, zoom) of the preview currently wanted"""
+    return (self.selected_files[self.current_index], _preview_bounds(self),
+            self.rotations.get(self.current_index, 0), self.zoom_factor)
+
+
+def _show_preview(self, qimage, zoom):
+    """Display a rendered preview and remember it for interactive zooming"""
+    self._preview_pixmap = QPixmap.fromImage(qimage)
+    self._preview_pixmap_zoom = zoom
+    self.preview_label.setPixmap(self._preview_pixmap)
+
+
+def _render_quality_preview(self):
+    """Render the current preview with LANCZOS on a background thread"""
+    if not (0 <= self.current_index < len(self.selected_files)):
+        return
+    worker = getattr(self, '_preview_worker', None)
+    if worker is None:
+        worker = BackgroundWorker(self)
+        worker.finished.connect(lambda request, qimage: _on_quality_preview(self, request, qimage))
+        self._preview_worker = worker
+    request = _preview_request(self)
+    worker.submit(request, _render_quality_image, _preview_cache(self), *request)
+
+
+def _render_quality_image(cache, path, bounds, rotation, zoom):
+    """Background job: render a LANCZOS preview and wrap it in a QImage"""
+    from src.utils.preview import get_preview_image
+    return pil_to_qimage(get_preview_image(cache, path, bounds, rotation, zoom, True))
+
+
+def _on_quality_preview(self, request, qimage):
+    """Show a background render unless the user has moved on since it was requested"""
+    if not (0 <= self.current_index < len(self.selected_files)):
+        return
+    if request != _preview_request(self):
+        return
+    _show_preview(self, qimage, request[3])
+
+
 def update_picture_box(self):
-    """Update the image preview based on the current index"""
+    """
+    Update the image preview based on the current index.
+
+    Interactive updates decode at display size with a cheap filter; a LANCZOS
+    pass is rendered in the background once the preview has been idle for
+    PREVIEW_IDLE_MS.
+    """
     if len(self.selected_files) > 0 and 0 <= self.current_index < len(self.selected_files):
         try:
-            # Open the image
-            img = Image.open(self.selected_files[self.current_index])
-
-            # Apply rotation if stored
-            if self.current_index in self.rotations:
-                angle = self.rotations[self.current_index]
-                if angle == 90:
-                    img = img.transpose(Image.Transpose.ROTATE_90)
-                elif angle == 180:
-                    img = img.transpose(Image.Transpose.ROTATE_180)
-                elif angle == 270:
-                    img = img.transpose(Image.Transpose.ROTATE_270)
-
-            # Apply zoom factor and resize to fit preview
-            img_width, img_height = img.size
-            new_width = int(img_width * self.zoom_factor)
-            new_height = int(img_height * self.zoom_factor)
-
-            # Resize the image maintaining aspect ratio
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # Convert PIL Image to QPixmap for display
-            img_data = img.tobytes("raw", "RGB")
-            qimage = QImage(img_data, img.width, img.height, img.width * 3, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(qimage)
-
-            self.preview_label.setPixmap(pixmap)
+            # Decode the image at the size it is displayed at, with rotation applied,
+            # unless it is already cached (e.g. prefetched while viewing a neighbour)
+            from src.utils.preview import get_preview_image
+            path, bounds, rotation, zoom = _preview_request(self)
+            img = get_preview_image(_preview_cache(self), path, bounds, rotation, zoom, False)
+            _show_preview(self, pil_to_qimage(img), zoom)
+
             self.status_label.setText(f"Image {self.current_index + 1} of {len(self.selected_files)}")
 
             # Update listbox selection
             if self.listbox.count() > 0:
                 self.listbox.setCurrentRow(self.current_index)
+
+            _schedule_quality_preview(self)
+            _prefetch_neighbors(self, bounds)
         except Exception as e:
             logging.error(f"Error in update_picture_box: {str(e)}")
             self.status_label.setText("Error loading image.")
     else:
+        self._preview_pixmap = None
         self.preview_label.clear()
         self.status_label.setText("No images selected!")
 
@@ -243,4 +329,14 @@ def wheelEvent(self, event):
         self.zoom_factor += 0.1
     else:
         self.zoom_factor = max(0.1, self.zoom_factor - 0.1)
-    self.update_picture_box()
+
+    # Scale the pixmap already on screen for instant feedback, and only
+    # re-render from the source once the wheel has settled
+    pixmap = getattr(self, '_preview_pixmap', None)
+    if pixmap is None or not self.selected_files:
+        return
+    scale = self.zoom_factor / self._preview_pixmap_zoom
+    size = QSize(max(1, round(pixmap.width() * scale)), max(1, round(pixmap.height() * scale)))
+    self.preview_label.setPixmap(pixmap.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                               Qt.TransformationMode.FastTransformation))
+    _schedule_quality_preview(self, ZOOM_SETTLE_MS)
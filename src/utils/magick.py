@@ -1,6 +1,78 @@
 import os
-import subprocess
+import re
+import sys
+import queue
+import atexit
 import logging
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+from src.utils import telemetry
+
+# Number of long-lived ImageMagick processes shared by all conversions
+MAGICK_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+# Seconds a single ImageMagick operation may take before its worker is restarted
+MAGICK_JOB_TIMEOUT = 300
+
+# ImageMagick buffers what it prints when talking to a pipe, so every job
+# marker is followed by this much padding to push the marker out of the buffer
+_MARKER_PADDING = 64 * 1024
+
+_MARKER_PREFIX = "PDF_MANAGER_JOB_DONE"
+
+# 'magick <tool> ...' commands that are not conversions and run as a process of their own
+_MAGICK_TOOLS = {"animate", "compare", "composite", "conjure", "convert", "display",
+                 "identify", "import", "mogrify", "montage", "stream"}
+
+# Memory ImageMagick may use for pixels per job before it falls back to memory-mapped files
+MAGICK_MEMORY_LIMIT = "256MiB"
+
+# Memory-mapped pixel cache per job before ImageMagick falls back to plain disk files
+MAGICK_MAP_LIMIT = "512MiB"
+
+# ImageMagick threads shared by all jobs that run at the same time
+MAGICK_THREAD_BUDGET = os.cpu_count() or 1
+
+# Image formats accepted by the converter (multi-page TIFFs contribute one page per frame)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.gif', '.webp')
+
+# Paper sizes in points (1/72 inch)
+PAPER_SIZES = {
+    "A3": (842, 1191),
+    "A4": (595, 842),
+    "A5": (420, 595),
+    "Letter": (612, 792),
+    "Legal": (612, 1008),
+}
+
+# Windows: don't flash a console window for every ImageMagick process
+_CREATION_FLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0) if sys.platform == 'win32' else 0
+
+_executable = None
+_executable_lock = threading.Lock()
+
+
+def resolve_magick_executable():
+    """
+    Return the ImageMagick executable: the portable copy next to the
+    project when present, otherwise 'magick' from PATH. The lookup is done
+    once per session.
+    """
+    global _executable
+    with _executable_lock:
+        if _executable is None:
+            # Get the project root directory (one level up from src)
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            portable_magick = os.path.join(project_root, "imagick_portable_64", "magick.exe")
+            if os.path.exists(portable_magick):
+                logging.info(f"Using portable ImageMagick: {portable_magick}")
+                _executable = portable_magick
+            else:
+                logging.info("Portable ImageMagick not found, using 'magick' from PATH")
+                _executable = "magick"
+        return _executable
 
 
 def find_imagick(self):
@@ -8,90 +80,402 @@ def find_imagick(self):
     Locate the portable ImageMagick exe, or fallback to 'magick'.
     Returns the path to the executable.
     """
-    # Get the project root directory (one level up from src)
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    print(f"Project root: {project_root}")
-
-    # Primary location for portable ImageMagick
-    portable_magick = os.path.join(project_root, "imagick_portable_64", "magick.exe")
-
-    if os.path.exists(portable_magick):
-        print(f"Found ImageMagick at: {portable_magick}")
-        return portable_magick
-
-    # If not found in primary location, try system command
-    print("ImageMagick not found in portable location, defaulting to system 'magick'")
-    return "magick"
-
-
-def run_imagemagick(self, cmd):
-    """Run an ImageMagick command with the portable executable if available."""
-    # Get the path to ImageMagick directly using the project root
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    portable_magick = os.path.join(project_root, "imagick_portable_64", "magick.exe")
-
-    # Check if it exists
-    if os.path.exists(portable_magick):
-        magick_path = portable_magick
-        print(f"Using portable ImageMagick: {portable_magick}")
-    else:
-        magick_path = "magick"
-        print(f"Portable ImageMagick not found at {portable_magick}, falling back to 'magick' command")
-
-    # Replace 'magick' with the full path to the executable if needed
-    if magick_path != 'magick':
-        # Quote the path to handle spaces
-        if 'magick -' in cmd:
-            invocation = cmd.replace('magick -', f'"{magick_path}" -', 1)
-        elif cmd.startswith('magick '):
-            invocation = cmd.replace('magick ', f'"{magick_path}" ', 1)
-        else:
-            invocation = cmd
-    else:
-        # Just use the command as is
-        invocation = cmd
-
-    print(f"Executing ImageMagick command: {invocation}")
-
-    try:
-        # Set environment variables
-        env = os.environ.copy()
-
-        # Simplify command for testing if there are issues
-        if " -page " in invocation and " -density " in invocation:
-            print("Simplifying command for better compatibility...")
-            # Remove complex options that might cause issues
-            invocation = invocation.replace(" -page ", " ")
-
-        result = subprocess.run(
-            invocation,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True,
-            env=env
+    return resolve_magick_executable()
+
+
+def _script_token(value):
+    """Quote one argument for an ImageMagick script"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class MagickCommand:
+    """
+    Describe one image conversion and build its ImageMagick arguments as a list.
+
+    The arguments never pass through a shell, so file names may contain
+    spaces, quotes or any other character. The operations are also kept as
+    data, so the same command can be carried out without ImageMagick (see
+    src.utils.pillow_ops). Example:
+
+        MagickCommand("scan.jpg").rotate(90).border(20).density(300).page("A4").args("scan.pdf")
+    """
+
+    def __init__(self, source, frame=None):
+        self.path = source
+        self.frame = frame
+        # ("rotate", degrees) and ("border", width, color) in the order they are applied
+        self.operations = []
+        self.quality_value = None
+        self.compress_method = None
+        self.dpi = None
+        self.paper = None
+
+    @property
+    def source(self):
+        return self.path if self.frame is None else f"{self.path}[{self.frame}]"
+
+    def rotate(self, degrees):
+        if degrees:
+            self.operations.append(("rotate", degrees))
+        return self
+
+    def border(self, width, color="white"):
+        if width and width > 0:
+            self.operations.append(("border", width, color))
+        return self
+
+    def quality(self, quality):
+        self.quality_value = quality
+        return self
+
+    def compress(self, method):
+        self.compress_method = method
+        return self
+
+    def density(self, dpi):
+        self.dpi = dpi
+        return self
+
+    def page(self, paper):
+        self.paper = paper
+        return self
+
+    def page_geometry(self):
+        """
+        Return the -page geometry for the paper size.
+
+        ImageMagick reads a -page geometry in pixels at the image density, so
+        a paper name only gives the right page size at 72 DPI. With a density
+        set, the paper size is converted to pixels at that density.
+        """
+        if self.paper is None:
+            return None
+        size = PAPER_SIZES.get(self.paper)
+        if size is None or self.dpi is None:
+            return self.paper
+        width, height = (round(points * self.dpi / 72) for points in size)
+        return f"{width}x{height}"
+
+    def args(self, output):
+        """Return the argument list (without the executable) writing to `output`"""
+        args = [self.source]
+        for operation in self.operations:
+            if operation[0] == "rotate":
+                args += ["-rotate", str(operation[1])]
+            else:
+                # The colour has to be set before -border uses it
+                args += ["-bordercolor", operation[2], "-border", str(operation[1])]
+        if self.dpi is not None:
+            args += ["-units", "PixelsPerInch", "-density", str(self.dpi)]
+        geometry = self.page_geometry()
+        if geometry is not None:
+            args += ["-page", geometry]
+        if self.quality_value is not None:
+            args += ["-quality", str(self.quality_value)]
+        if self.compress_method:
+            args += ["-compress", self.compress_method]
+        return args + [output]
+
+
+class ThreadBudget:
+    """
+    Share a fixed number of ImageMagick threads between concurrent jobs.
+
+    Each job reserves a few threads and passes the count on with
+    -limit thread, so jobs running side by side never use more threads
+    together than the budget. A job waits while no thread is free.
+    """
+
+    def __init__(self, total=MAGICK_THREAD_BUDGET, share=None):
+        self.total = max(1, total)
+        # Threads a job gets by default: an equal part for every pool worker
+        self.share = share or max(1, self.total // MAGICK_WORKERS)
+        self._available = self.total
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, wanted=None):
+        """Reserve up to `wanted` threads (the default share) and yield the number granted"""
+        wanted = max(1, min(wanted or self.share, self.total))
+        with self._condition:
+            while self._available < 1:
+                self._condition.wait()
+            granted = min(wanted, self._available)
+            self._available -= granted
+        try:
+            yield granted
+        finally:
+            with self._condition:
+                self._available += granted
+                self._condition.notify_all()
+
+
+thread_budget = ThreadBudget()
+
+
+def limit_args(threads, memory=MAGICK_MEMORY_LIMIT, map_size=MAGICK_MAP_LIMIT):
+    """Return the -limit arguments that cap one job's memory, memory map and threads"""
+    return ["-limit", "memory", memory, "-limit", "map", map_size, "-limit", "thread", str(threads)]
+
+
+class MagickWorker:
+    """
+    One long-lived `magick -script -` process that runs conversions sent over stdin.
+
+    Each job is wrapped in parentheses with -respect-parentheses, so the
+    settings of one job (-density, -quality, ...) never leak into the next,
+    and ends by printing a marker that tells the job has finished. Errors
+    share the pipe with the markers, so the messages read before a job's
+    marker are exactly that job's. If the process dies or a job times out,
+    the process is discarded and a new one is started for the next job.
+    """
+
+    def __init__(self, executable):
+        self.executable = executable
+        self.process = None
+        self._lines = None
+        self._next_job = 0
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            [self.executable, "-script", "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding='utf-8', errors='replace', bufsize=1,
+            creationflags=_CREATION_FLAGS
         )
-        print("ImageMagick command executed successfully")
-        return result
-    except subprocess.CalledProcessError as e:
-        stderr = e.stderr if hasattr(e, 'stderr') else ""
-        stdout = e.stdout if hasattr(e, 'stdout') else ""
-
-        # Show more detailed error information
-        error_info = f"Exit code: {e.returncode}\nStdout: {stdout}\nStderr: {stderr}"
-        logging.error(f"ImageMagick failed: {error_info}")
-        print(f"ImageMagick command failed: {error_info}")
-
-        # Check for common error patterns
-        if "not recognized" in str(stderr).lower():
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self.process, self._lines), daemon=True).start()
+        self.process.stdin.write(_script_token("-respect-parentheses") + "\n")
+
+    @staticmethod
+    def _read_output(process, lines):
+        for line in process.stdout:
+            line = line.strip()
+            # Skip the blank lines and padding printed around the markers
+            if line.strip("."):
+                lines.put(line)
+        lines.put(None)  # The process has exited
+
+    def _read_job_output(self, marker, timeout):
+        """
+        Read the messages printed until a job's marker.
+
+        Returns:
+            (list of message lines, True when the marker came; False when the
+            process exited or the job timed out)
+        """
+        deadline = time.monotonic() + timeout
+        messages = []
+        while True:
+            try:
+                line = self._lines.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                messages.append(f"Timed out after {timeout} seconds")
+                return messages, False
+            if line is None:
+                return messages, False
+            if line == marker:
+                return messages, True
+            messages.append(line)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, args, timeout=MAGICK_JOB_TIMEOUT):
+        """Run one conversion; returns None on success or the error message"""
+        return self.run_many([args], timeout)[0]
+
+    def run_many(self, jobs, timeout=MAGICK_JOB_TIMEOUT):
+        """
+        Run a batch of conversions, all sent to the process at once.
+
+        Args:
+            jobs: List of argument lists without the executable, e.g.
+                ["in.jpg", "-rotate", "90", "out.png"]; the last argument is
+                the output file
+
+        Returns:
+            List with, per job, None on success or the error message
+        """
+        if not self.alive():
+            self._start()
+
+        markers = []
+        script = []
+        for args in jobs:
+            self._next_job += 1
+            marker = f"{_MARKER_PREFIX} {self._next_job}"
+            markers.append(marker)
+            # A file left by an earlier run must not pass for this job's output
+            try:
+                os.unlink(args[-1])
+            except OSError:
+                pass
+            tokens = ["("] + list(args[:-1]) + ["-write", args[-1], ")", "-delete", "0--1",
+                                                "-print", f"\\n{marker}\\n" + "." * _MARKER_PADDING + "\\n"]
+            script.append(" ".join(_script_token(t) for t in tokens) + "\n")
+
+        try:
+            self.process.stdin.write("".join(script))
+            self.process.stdin.flush()
+        except OSError as e:
+            self.close()
+            return [f"ImageMagick worker failed: {str(e)}"] * len(jobs)
+
+        results = []
+        for args, marker in zip(jobs, markers):
+            messages, finished = self._read_job_output(marker, timeout)
+            if not finished:
+                # The process died (or hung) while running this job; later jobs never ran
+                self.close()
+                results.append("\n".join(messages) or "ImageMagick worker exited unexpectedly")
+                results.extend(["Not run: an earlier ImageMagick job failed"] * (len(jobs) - len(results)))
+                break
+            if not os.path.exists(args[-1]):
+                results.append("\n".join(messages) or f"No output written to {args[-1]}")
+            else:
+                results.append(None)
+        return results
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+class MagickPool:
+    """
+    A small pool of MagickWorkers shared by all threads.
+
+    run() takes any idle worker, so conversions running on several threads
+    use several ImageMagick processes without ever starting a new one per
+    operation.
+    """
+
+    def __init__(self, executable, size=MAGICK_WORKERS):
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(MagickWorker(executable))
+        self._workers = list(self._idle.queue)
+
+    def run_many(self, jobs, timeout=MAGICK_JOB_TIMEOUT):
+        """Run a batch of conversions on one worker; see MagickWorker.run_many()"""
+        worker = self._idle.get()
+        try:
+            return worker.run_many(jobs, timeout)
+        finally:
+            self._idle.put(worker)
+
+    def run(self, args, timeout=MAGICK_JOB_TIMEOUT):
+        """Run one conversion; returns None on success or the error message"""
+        return self.run_many([args], timeout)[0]
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def magick_pool():
+    """Return the session's ImageMagick worker pool, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MagickPool(resolve_magick_executable())
+            atexit.register(_pool.close)
+        return _pool
+
+
+def _split_command(cmd):
+    """Split a 'magick "in" options "out"' command line into its arguments"""
+    return [quoted if quoted else bare for quoted, bare in re.findall(r'"([^"]*)"|(\S+)', cmd)]
+
+
+def _raise_magick_error(stderr):
+    """Turn ImageMagick's error output into a RuntimeError with a helpful message"""
+    logging.error(f"ImageMagick failed: {stderr}")
+
+    # Check for common error patterns
+    if "not recognized" in str(stderr).lower():
+        raise RuntimeError(
+            "ImageMagick not found. Please ensure the portable version is available in the imagick_portable_64 folder."
+        )
+    elif "cannot find the path" in str(stderr).lower():
+        raise RuntimeError(
+            "ImageMagick error: The system cannot find one of the paths in the command. Check that all files exist."
+        )
+
+    # Generic error
+    raise RuntimeError(f"ImageMagick error: {stderr}")
+
+
+def run_imagemagick(self, cmd, threads=None):
+    """
+    Run an ImageMagick command with the portable executable if available.
+
+    Args:
+        cmd: Argument list such as ["in.jpg", "-rotate", "90", "out.pdf"] or
+            ["identify", "file.pdf"] (see MagickCommand); a leading "magick" is
+            ignored. A command line string is still accepted and split into
+            arguments, it is never run through a shell.
+        threads: ImageMagick threads wanted for this job, taken from the shared
+            thread budget; defaults to the budget's share per job
+
+    Conversions run on the persistent worker pool; other tools such as
+    'magick identify' run as a single process. Every job runs with
+    -limit memory/map/thread.
+    """
+    magick_path = resolve_magick_executable()
+
+    args = _split_command(cmd) if isinstance(cmd, str) else [str(arg) for arg in cmd]
+    if args and args[0] == "magick":
+        args = args[1:]
+
+    with thread_budget.reserve(threads) as granted:
+        limits = limit_args(granted)
+        if len(args) >= 2 and args[0] not in _MAGICK_TOOLS:
+            args = limits + args
+            logging.debug(f"Executing ImageMagick conversion: {args}")
+            try:
+                with telemetry.span("encode"):
+                    error = magick_pool().run(args)
+            except OSError as e:
+                raise RuntimeError(
+                    "ImageMagick not found. Please ensure the portable version is available in the imagick_portable_64 folder."
+                ) from e
+            if error is not None:
+                _raise_magick_error(error)
+            return subprocess.CompletedProcess([magick_path] + args, 0, "", "")
+
+        if args and args[0] in _MAGICK_TOOLS:
+            argv = [magick_path, args[0]] + limits + args[1:]
+        else:
+            argv = [magick_path] + args
+        logging.debug(f"Executing ImageMagick command: {argv}")
+
+        try:
+            with telemetry.span("scan" if args[:1] == ["identify"] else "encode"):
+                return subprocess.run(
+                    argv,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    check=True,
+                    creationflags=_CREATION_FLAGS
+                )
+        except FileNotFoundError as e:
             raise RuntimeError(
                 "ImageMagick not found. Please ensure the portable version is available in the imagick_portable_64 folder."
-            )
-        elif "cannot find the path" in str(stderr).lower():
-            raise RuntimeError(
-                "ImageMagick error: The system cannot find one of the paths in the command. Check that all files exist."
-            )
-
-        # Generic error
-        raise RuntimeError(f"ImageMagick error: {stderr}")
+            ) from e
+        except subprocess.CalledProcessError as e:
+            logging.error(f"ImageMagick failed: Exit code: {e.returncode}\nStdout: {e.stdout}")
+            _raise_magick_error(e.stderr)
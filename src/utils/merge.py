@@ -1,6 +1,7 @@
 import os
 import logging
 from PyQt6.QtWidgets import QMessageBox, QFileDialog, QApplication
+from src.utils import telemetry
 
 def merge_pdfs(self):
     """Merge PDFs in the list using PyPDF2."""
@@ -28,33 +29,39 @@ def merge_pdfs(self):
         # Import PyPDF2 here to ensure it's available
         import PyPDF2
         
-        # Create a PDF merger object
-        pdf_merger = PyPDF2.PdfMerger()
-        
-        total_files = len(pdf_files)
-        for i, pdf in enumerate(pdf_files):
-            # Ensure the file exists
-            if not os.path.exists(pdf):
-                QMessageBox.warning(self, "File Not Found", f"The file '{pdf}' does not exist.")
-                continue
-                
-            # Add PDF with a bookmark if requested
-            if self.chk_add_bookmarks.isChecked():
-                bookmark_name = os.path.basename(pdf)  # Use filename as bookmark
-                pdf_merger.append(pdf, outline_item=bookmark_name)
-            else:
-                pdf_merger.append(pdf)
-            
-            # Update progress
-            progress = int(((i + 1) / total_files) * 90)  # Reserve last 10% for writing
-            self.progress_bar.setValue(progress)
-            self.status_label.setText(f"Merging PDF {i+1}/{total_files}")
-            QApplication.processEvents()  # Keep UI responsive
-        
-        # Write the merged PDF to output file
-        with open(output_pdf, 'wb') as f:
-            pdf_merger.write(f)
-        
+        with telemetry.operation("merge", files=len(pdf_files), bookmarks=self.chk_add_bookmarks.isChecked()):
+            # Create a PDF merger object
+            pdf_merger = PyPDF2.PdfMerger()
+
+            total_files = len(pdf_files)
+            for i, pdf in enumerate(pdf_files):
+                # Ensure the file exists
+                if not os.path.exists(pdf):
+                    QMessageBox.warning(self, "File Not Found", f"The file '{pdf}' does not exist.")
+                    continue
+
+                telemetry.count("bytes_in", telemetry.file_size(pdf))
+
+                # Add PDF with a bookmark if requested
+                with telemetry.span("open"):
+                    if self.chk_add_bookmarks.isChecked():
+                        bookmark_name = os.path.basename(pdf)  # Use filename as bookmark
+                        pdf_merger.append(pdf, outline_item=bookmark_name)
+                    else:
+                        pdf_merger.append(pdf)
+
+                # Update progress
+                progress = int(((i + 1) / total_files) * 90)  # Reserve last 10% for writing
+                self.progress_bar.setValue(progress)
+                self.status_label.setText(f"Merging PDF {i+1}/{total_files}")
+                QApplication.processEvents()  # Keep UI responsive
+
+            # Write the merged PDF to output file
+            telemetry.count("pages", len(pdf_merger.pages))
+            with telemetry.span("write"), open(output_pdf, 'wb') as f:
+                pdf_merger.write(f)
+            telemetry.count("bytes_out", telemetry.file_size(output_pdf))
+
         self.progress_bar.setValue(100)
         self.status_label.setText(f"Successfully merged {total_files} PDFs")
         
@@ -88,25 +95,19 @@ def merge_pdfs(self):
 def update_merge_summary(self):
     """Update the merge summary display"""
     count = self.pdf_listbox.count()
-    print(f"update_merge_summary called - PDF count: {count}")
     if count == 0:
         self.merge_summary.setText("No PDF files selected yet")
         self.btn_merge_pdfs.setEnabled(False)
-        print("Disabled merge button - no PDFs")
     elif count == 1:
         self.merge_summary.setText("1 PDF file selected. Add at least one more file to merge.")
         self.btn_merge_pdfs.setEnabled(False)
-        print("Disabled merge button - only 1 PDF")
     else:
         self.merge_summary.setText(f"{count} PDF files ready to merge")
         self.btn_merge_pdfs.setEnabled(True)
-        print(f"Enabled merge button - {count} PDFs ready")
-    print(f"btn_merge_pdfs.isEnabled(): {self.btn_merge_pdfs.isEnabled()}")
      
 
 def add_pdf(self):
     """Add a PDF to the merge list"""
-    print("add_pdf function called")
     files, _ = QFileDialog.getOpenFileNames(
         self,
         "Select PDF Files",
@@ -115,12 +116,11 @@ def add_pdf(self):
     )
     
     if files:
-        print(f"Selected {len(files)} PDF files")
+        logging.debug(f"Adding {len(files)} PDF files to the merge list")
         for file in files:
             self.pdf_listbox.addItem(file)
         
         self.update_merge_summary()
-        print("Called update_merge_summary from add_pdf")
         
 def remove_pdf(self):
     """Remove the selected PDF from the merge list"""
@@ -0,0 +1,500 @@
+"""
+Schedule pipeline jobs on worker processes by priority, deadline and owner.
+
+Interactive single-file jobs must not wait behind a nightly batch of
+thousands of files. The orchestrator keeps its own queue instead of the
+process pool's first-come-first-served one and hands a job to the pool only
+when a worker is free:
+
+- Lower priority values run first (INTERACTIVE, NORMAL, BATCH). A job that
+  has waited AGING_SECONDS moves up one level, so a batch still makes
+  progress under a steady stream of interactive work.
+- Owners of jobs with the same priority take turns, so one owner's
+  thousand files do not hold back another owner's three.
+- A job that has not finished by its deadline expires: it is dropped from
+  the queue, or stopped at its next stage if it is running.
+
+Jobs are lists of pipeline stages (see src.utils.pipeline). Progress is
+reported per stage and cancellation takes effect between stages. When a
+worker process dies the pool is replaced; the jobs it took down run again
+one at a time, so only the job that crashes a worker on its own fails.
+
+The orchestrator runs on an asyncio loop. OrchestratorThread runs one on a
+background thread for callers without a loop, and src.utils.qt_jobs turns
+its events into Qt signals. Recipes can be run from the command line:
+
+    python -m src.utils.orchestrator nightly/*.json [--priority batch] [--workers N] [--deadline SECONDS]
+
+Ctrl+C cancels the jobs; running ones stop at their next stage.
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from src.utils.pipeline import ignore_interrupts, load_recipe
+
+INTERACTIVE, NORMAL, BATCH = 0, 1, 2
+PRIORITIES = {"interactive": INTERACTIVE, "normal": NORMAL, "batch": BATCH}
+
+# Seconds a queued job waits before it moves up one priority level
+AGING_SECONDS = 60.0
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, EXPIRED = "queued", "running", "done", "failed", "cancelled", "expired"
+FINISHED_STATES = (DONE, FAILED, CANCELLED, EXPIRED)
+
+_job_ids = itertools.count(1)
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job was cancelled or has expired"""
+
+
+class Job:
+    """
+    One pipeline run scheduled by the orchestrator.
+
+    Args:
+        stages: Pipeline stage dictionaries, as in a recipe
+        output: PDF file to write
+        priority: INTERACTIVE, NORMAL or BATCH
+        owner: Who submitted the job; owners of the same priority take turns
+        deadline: Seconds after submission by which the job must finish, or None
+        name: Label used in progress reports, the output file name by default
+    """
+
+    def __init__(self, stages, output, priority=NORMAL, owner="default", deadline=None, name=None):
+        self.id = next(_job_ids)
+        self.stages = list(stages)
+        self.output = output
+        self.priority = priority
+        self.owner = owner
+        self.deadline = deadline
+        self.name = name or os.path.basename(output)
+        self.state = QUEUED
+        self.progress = (0, len(self.stages), "")  # (stage index, stage count, stage name)
+        self.pages = None
+        self.error = None
+        self.submitted = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name!r} {self.state}>"
+
+
+class JobQueue:
+    """
+    Queued jobs, kept in one FIFO per (owner, priority).
+
+    pop() only looks at the head of each FIFO - its oldest and therefore
+    most aged job - so choosing the next job does not get slower with the
+    number of jobs waiting.
+    """
+
+    def __init__(self, aging=AGING_SECONDS):
+        self.aging = aging
+        self._fifos = {}  # (owner, priority) -> deque of jobs
+        self._owners = []  # In order of their first job, for turn taking
+        self._last_owner = None
+
+    def __len__(self):
+        return sum(len(fifo) for fifo in self._fifos.values())
+
+    def push(self, job):
+        if job.owner not in self._owners:
+            self._owners.append(job.owner)
+        self._fifos.setdefault((job.owner, job.priority), deque()).append(job)
+
+    def remove(self, job):
+        key = (job.owner, job.priority)
+        fifo = self._fifos.get(key)
+        if fifo is not None and job in fifo:
+            fifo.remove(job)
+            if not fifo:
+                del self._fifos[key]
+
+    def effective_priority(self, job, now):
+        if not self.aging:
+            return job.priority
+        return max(INTERACTIVE, job.priority - int((now - job.submitted) // self.aging))
+
+    def pop(self, now=None):
+        """Take the next job to run, or None when the queue is empty"""
+        now = time.monotonic() if now is None else now
+
+        # Best (effective priority, priority) among the FIFO heads of each owner
+        best = {}
+        for (owner, priority), fifo in self._fifos.items():
+            rank = (self.effective_priority(fifo[0], now), priority)
+            if owner not in best or rank < best[owner]:
+                best[owner] = rank
+        if not best:
+            return None
+
+        top = min(rank[0] for rank in best.values())
+        # Owners take turns, starting after the one served last
+        start = self._owners.index(self._last_owner) + 1 if self._last_owner in self._owners else 0
+        for owner in self._owners[start:] + self._owners[:start]:
+            if owner in best and best[owner][0] == top:
+                self._last_owner = owner
+                key = (owner, best[owner][1])
+                job = self._fifos[key].popleft()
+                if not self._fifos[key]:
+                    del self._fifos[key]
+                return job
+
+
+# Set in each worker process by _init_worker
+_cancel_flags = None
+_events = None
+
+
+def _init_worker(cancel_flags, events):
+    global _cancel_flags, _events
+    ignore_interrupts()
+    _cancel_flags, _events = cancel_flags, events
+
+
+def _run_job(job_id, slot, stages, output):
+    """Worker process side of a job: run the pipeline, reporting each stage and checking the slot's cancel flag"""
+    from src.utils.pipeline import Pipeline
+
+    def progress(index, count, name):
+        if _cancel_flags[slot]:
+            raise JobCancelled()
+        _events.put((job_id, index, count, name))
+
+    return Pipeline(stages).run(output, progress)
+
+
+class Orchestrator:
+    """
+    Run Jobs on a process pool in the order chosen by a JobQueue.
+
+    Use it on a running asyncio loop, as `async with Orchestrator() as o:`
+    or with start() and close(). Listeners are called on the loop as
+    listener(job, event) with event "queued", "started", "progress" or
+    "finished"; a finished job's state says how it ended.
+
+    Each running job owns a worker slot with a cancel flag in shared
+    memory, which the worker checks before every stage.
+    """
+
+    def __init__(self, workers=None, aging=AGING_SECONDS):
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.queue = JobQueue(aging)
+        self.pending = {}  # Job id -> job, until it finishes
+        self.listeners = []
+        self._free_slots = list(range(self.workers))
+        self._running = {}  # Job id -> worker slot
+        self._stop_states = {}  # Job id -> CANCELLED or EXPIRED, for running jobs asked to stop
+        self._timers = {}  # Job id -> deadline timer
+        self._waiters = {}  # Job id -> future resolved when the job finishes
+        self._retries = deque()  # Jobs lost with a crashed worker, run again one at a time
+        self._retrying = None  # Id of the retried job running alone
+        self._tasks = set()
+        self._loop = None
+        self._pool = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._cancel_flags = multiprocessing.Array("b", self.workers, lock=False)
+        self._events = multiprocessing.Queue()
+        self._pool = self._new_pool()
+        self._pump = threading.Thread(target=self._pump_events, name="orchestrator-events", daemon=True)
+        self._pump.start()
+        return self
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self._cancel_flags, self._events))
+
+    async def close(self, cancel=True):
+        """Stop the orchestrator once its jobs are over; with `cancel` they are cancelled first"""
+        if cancel:
+            for job_id in list(self.pending):
+                self.cancel(job_id)
+        await self.join()
+        self._events.put(None)
+        await self._loop.run_in_executor(None, self._pump.join)
+        self._pool.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Leaving normally waits for the jobs; an error or Ctrl+C cancels them
+        await self.close(cancel=exc_type is not None)
+
+    def submit(self, job):
+        """Queue a job; returns it"""
+        job.submitted = time.monotonic()
+        self.pending[job.id] = job
+        self._waiters[job.id] = self._loop.create_future()
+        self._idle.clear()
+        self.queue.push(job)
+        if job.deadline is not None:
+            self._timers[job.id] = self._loop.call_later(job.deadline, self.cancel, job.id, EXPIRED)
+        self._notify(job, "queued")
+        self._dispatch()
+        return job
+
+    def cancel(self, job_id, state=CANCELLED):
+        """
+        Cancel a queued or running job; a running one stops before its next stage.
+
+        Returns:
+            False if the job is unknown or already finished
+        """
+        job = self.pending.get(job_id)
+        if job is None:
+            return False
+        if job.state == QUEUED:
+            self.queue.remove(job)
+            if job in self._retries:
+                self._retries.remove(job)
+            self._finish(job, state)
+        else:
+            self._stop_states[job_id] = state
+            self._cancel_flags[self._running[job_id]] = 1
+        return True
+
+    async def wait(self, job):
+        """Wait for a submitted job to finish; returns it"""
+        waiter = self._waiters.get(job.id)
+        if waiter is not None:
+            await asyncio.shield(waiter)
+        return job
+
+    async def join(self):
+        """Wait until no job is queued or running"""
+        await self._idle.wait()
+
+    def _dispatch(self):
+        while self._free_slots:
+            if self._retrying in self._running:
+                return
+            if self._retries:
+                if self._running:
+                    return
+                job = self._retries.popleft()
+                self._retrying = job.id
+            else:
+                job = self.queue.pop()
+            if job is None:
+                return
+            slot = self._free_slots.pop()
+            self._cancel_flags[slot] = 0
+            self._running[job.id] = slot
+            job.state = RUNNING
+            job.started = time.monotonic()
+            task = self._loop.create_task(self._run(job, slot))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self._notify(job, "started")
+
+    async def _run(self, job, slot):
+        state, error = DONE, None
+        pool = self._pool
+        try:
+            job.pages = await self._loop.run_in_executor(pool, _run_job, job.id, slot, job.stages, job.output)
+        except JobCancelled:
+            state = self._stop_states.get(job.id, CANCELLED)
+        except BrokenProcessPool as e:
+            if job.id in self._stop_states:
+                state = self._stop_states[job.id]
+            elif self._replace_broken_pool(pool):
+                logging.error(f"Job {job.name} crashed its worker process")
+                state, error = FAILED, f"The worker process crashed: {str(e)}"
+            else:
+                logging.warning(f"Job {job.name} was lost with a crashed worker, it will run again")
+                state = QUEUED
+        except Exception as e:
+            logging.error(f"Job {job.name} failed: {str(e)}")
+            state, error = FAILED, str(e)
+        finally:
+            del self._running[job.id]
+            self._stop_states.pop(job.id, None)
+            self._free_slots.append(slot)
+        if state == QUEUED:
+            job.state = QUEUED
+            self._retries.append(job)
+        else:
+            self._finish(job, state, error)
+        self._dispatch()
+
+    def _replace_broken_pool(self, broken):
+        """
+        Start a new pool in place of one a dead worker has broken.
+
+        Returns:
+            True when the job that saw the broken pool was the only one
+            running on it, and therefore the one that crashed
+        """
+        if self._pool is not broken:
+            return False
+        logging.error("A worker process died, starting a new process pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+        return len(self._running) == 1
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished = time.monotonic()
+        timer = self._timers.pop(job.id, None)
+        if timer is not None:
+            timer.cancel()
+        del self.pending[job.id]
+        self._waiters.pop(job.id).set_result(job)
+        self._notify(job, "finished")
+        if not self.pending:
+            self._idle.set()
+
+    def _pump_events(self):
+        """Forward progress events from the workers to the loop; runs on its own thread"""
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_progress, *event)
+
+    def _on_progress(self, job_id, index, count, name):
+        job = self.pending.get(job_id)
+        # Events can arrive after the job has finished
+        if job is not None and job.state == RUNNING:
+            job.progress = (index, count, name)
+            self._notify(job, "progress")
+
+    def _notify(self, job, event):
+        for listener in list(self.listeners):
+            try:
+                listener(job, event)
+            except Exception as e:
+                logging.warning(f"Job listener failed on {event}: {str(e)}")
+
+
+class OrchestratorThread:
+    """
+    An Orchestrator on its own asyncio loop in a background thread, for
+    callers without a loop such as the GUI.
+
+    submit(), cancel(), add_listener() and stop() may be called from any
+    thread; listeners are called on the orchestrator thread.
+    """
+
+    def __init__(self, workers=None, aging=AGING_SECONDS):
+        self.orchestrator = Orchestrator(workers, aging)
+        self._cancel_on_stop = True
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="orchestrator", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        try:
+            await self.orchestrator.start()
+        finally:
+            self._ready.set()
+        await self._stop.wait()
+        await self.orchestrator.close(cancel=self._cancel_on_stop)
+
+    def submit(self, job):
+        self._loop.call_soon_threadsafe(self.orchestrator.submit, job)
+        return job
+
+    def cancel(self, job_id):
+        self._loop.call_soon_threadsafe(self.orchestrator.cancel, job_id)
+
+    def add_listener(self, listener):
+        self._loop.call_soon_threadsafe(self.orchestrator.listeners.append, listener)
+
+    def stop(self, cancel=True):
+        """Stop the orchestrator and its workers; without `cancel`, the jobs are finished first"""
+        if self._thread.is_alive():
+            self._cancel_on_stop = cancel
+            self._loop.call_soon_threadsafe(self._stop.set)
+            self._thread.join()
+
+
+async def run_jobs(jobs, workers=None, listener=None, cancel_on_signals=False):
+    """
+    Run jobs to completion on a new orchestrator; returns them.
+
+    With `cancel_on_signals`, SIGINT and SIGTERM cancel the jobs instead of
+    interrupting the loop (where the platform supports it).
+    """
+    async with Orchestrator(workers) as orchestrator:
+        if listener is not None:
+            orchestrator.listeners.append(listener)
+        if cancel_on_signals:
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, lambda: [orchestrator.cancel(job.id) for job in jobs])
+                except NotImplementedError:
+                    pass  # Windows: Ctrl+C raises KeyboardInterrupt, which also cancels the jobs
+        for job in jobs:
+            orchestrator.submit(job)
+        await orchestrator.join()
+    return jobs
+
+
+def print_progress(job, event):
+    if event == "started":
+        print(f"[{job.name}] started")
+    elif event == "progress":
+        index, count, name = job.progress
+        print(f"[{job.name}] {index + 1}/{count} {name}")
+    elif event == "finished":
+        if job.state == DONE:
+            print(f"[{job.name}] wrote {job.pages} pages to {job.output}")
+        else:
+            print(f"[{job.name}] {job.state}" + (f": {job.error}" if job.error else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pipeline recipes on worker processes")
+    parser.add_argument("recipes", nargs="+", help="JSON or YAML recipe files, each naming its output")
+    parser.add_argument("--priority", choices=list(PRIORITIES), default="normal", help="Priority of the jobs")
+    parser.add_argument("--owner", default="cli", help="Owner name used for fair scheduling")
+    parser.add_argument("--deadline", type=float, help="Seconds each job may take from submission")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    jobs = []
+    for path in args.recipes:
+        pipeline, output = load_recipe(path)
+        if not output:
+            parser.error(f"{path} does not name an output file")
+        stages = [dict(params, stage=name) for name, params in pipeline.stages]
+        jobs.append(Job(stages, output, PRIORITIES[args.priority], args.owner, args.deadline,
+                        name=os.path.basename(path)))
+
+    try:
+        asyncio.run(run_jobs(jobs, args.workers, print_progress, cancel_on_signals=True))
+    except KeyboardInterrupt:
+        return 130
+    return 0 if all(job.state == DONE for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,345 @@
+import os
+import io
+import zlib
+import logging
+import secrets
+from collections import namedtuple
+from PIL import Image
+
+# Rows compressed per chunk when Flate encoding decoded images
+_FLATE_BAND_ROWS = 256
+
+# An image that is already encoded for embedding in a PDF page
+EncodedImage = namedtuple(
+    "EncodedImage",
+    ["data", "width", "height", "colorspace", "bits_per_component",
+     "filter_name", "decode_parms", "decode", "dpi"]
+)
+
+
+def open_part_file(output_path):
+    """
+    Create a hidden ".part" file next to `output_path` to write a document into.
+
+    Unlike tempfile.mkstemp(), which makes files only their owner can read,
+    the file gets the permissions of any new file (0666 less the umask), and
+    keeps them when it is renamed into place.
+
+    Returns:
+        (binary file object, path)
+    """
+    out_dir, name = os.path.split(os.path.abspath(output_path))
+    while True:
+        path = os.path.join(out_dir, f".{name}.{secrets.token_hex(4)}.part")
+        try:
+            return open(path, "xb"), path
+        except FileExistsError:
+            continue
+
+
+class StreamingPdfWriter:
+    """
+    Write a PDF one page at a time straight to its destination.
+
+    Every page is flushed to disk as soon as it is added, so only the page
+    being written is ever held in memory and no intermediate PDFs are needed.
+    The document is written to a hidden ".part" file next to the destination
+    and atomically renamed into place by close(); abort() discards it.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = os.path.abspath(output_path)
+        self._fh, self._part_path = open_part_file(self.output_path)
+        self._offsets = {}
+        self._page_ids = []
+        # Objects 1 (catalog) and 2 (page tree) are written last by close()
+        self._next_id = 3
+        self._closed = False
+
+        self._fh.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+    def _reserve_id(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, body, stream=None):
+        """Write an indirect object, optionally followed by its stream data."""
+        self._offsets[obj_id] = self._fh.tell()
+        self._fh.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._fh.write(body.encode("ascii"))
+        if stream is not None:
+            self._fh.write(b"\nstream\n")
+            self._fh.write(stream)
+            self._fh.write(b"\nendstream")
+        self._fh.write(b"\nendobj\n")
+
+    def add_image_page(self, data, width, height, colorspace="/DeviceRGB",
+                       bits_per_component=8, filter_name="/DCTDecode",
+                       decode_parms=None, decode=None, dpi=(72, 72),
+                       rotate=0, margin=0):
+        """
+        Append a page showing a single, already encoded image.
+
+        Args:
+            data: Encoded image stream (e.g. JPEG or Flate compressed samples)
+            width, height: Image size in pixels
+            colorspace: PDF colour space name
+            bits_per_component: Bits per sample
+            filter_name: PDF filter the data is encoded with
+            decode_parms: Optional /DecodeParms dictionary as a PDF string
+            decode: Optional /Decode array as a PDF string
+            dpi: (x, y) resolution used to compute the page size
+            rotate: Clockwise page rotation in degrees (multiple of 90)
+            margin: White border around the image in image pixels
+        """
+        if self._closed:
+            raise RuntimeError("Cannot add pages to a closed PDF writer")
+
+        x_dpi = dpi[0] or 72
+        y_dpi = dpi[1] or 72
+        image_width = width * 72.0 / x_dpi
+        image_height = height * 72.0 / y_dpi
+
+        # Borders and rotation are applied to the page, so the image data
+        # never has to be decoded for them
+        margin_x = margin * 72.0 / x_dpi
+        margin_y = margin * 72.0 / y_dpi
+        page_width = image_width + 2 * margin_x
+        page_height = image_height + 2 * margin_y
+
+        image_id = self._reserve_id()
+        content_id = self._reserve_id()
+        page_id = self._reserve_id()
+
+        extra = ""
+        if decode_parms:
+            extra += f" /DecodeParms {decode_parms}"
+        if decode:
+            extra += f" /Decode {decode}"
+        self._write_object(
+            image_id,
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height}"
+            f" /ColorSpace {colorspace} /BitsPerComponent {bits_per_component}"
+            f" /Filter {filter_name}{extra} /Length {len(data)} >>",
+            data
+        )
+
+        content = (f"q {image_width:.4f} 0 0 {image_height:.4f} {margin_x:.4f} {margin_y:.4f} cm"
+                   f" /Im0 Do Q").encode("ascii")
+        self._write_object(content_id, f"<< /Length {len(content)} >>", content)
+
+        rotate_entry = f" /Rotate {rotate % 360}" if rotate % 360 else ""
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R"
+            f" /MediaBox [0 0 {page_width:.4f} {page_height:.4f}]{rotate_entry}"
+            f" /Resources << /XObject << /Im0 {image_id} 0 R >> >>"
+            f" /Contents {content_id} 0 R >>"
+        )
+        self._page_ids.append(page_id)
+
+    def add_encoded(self, page, rotate=0, margin=0):
+        """Append a page from an EncodedImage."""
+        self.add_image_page(page.data, page.width, page.height, page.colorspace,
+                            page.bits_per_component, page.filter_name,
+                            page.decode_parms, page.decode, page.dpi,
+                            rotate, margin)
+
+    def add_image(self, img, dpi=None):
+        """Append a page from a PIL image, storing its samples Flate compressed."""
+        self.add_encoded(encode_image(img, dpi))
+
+    def add_image_file(self, image_path):
+        """Append a page from an image file (see encode_image_file)."""
+        self.add_encoded(encode_image_file(image_path))
+
+    def add_jpeg(self, data, img=None):
+        """Append a page from JPEG bytes without re-encoding them."""
+        self.add_encoded(encode_jpeg(data, img))
+
+    def close(self):
+        """Write the page tree and cross-reference table, then move the file into place."""
+        if self._closed:
+            return
+        if not self._page_ids:
+            self.abort()
+            raise RuntimeError("Cannot write a PDF without any pages")
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._fh.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            lines.append(f"{self._offsets[obj_id]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._fh.write("".join(lines).encode("ascii"))
+
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        self._closed = True
+
+        os.replace(self._part_path, self.output_path)
+        logging.info(f"Wrote {len(self._page_ids)} pages to {self.output_path}")
+
+    def abort(self):
+        """Discard the partially written file."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._fh.close()
+        finally:
+            try:
+                os.unlink(self._part_path)
+            except OSError as e:
+                logging.warning(f"Could not remove partial PDF {self._part_path}: {str(e)}")
+
+
+def encode_image(img, dpi=None):
+    """Flate compress the samples of a PIL image into an EncodedImage."""
+    if dpi is None:
+        dpi = _image_dpi(img)
+
+    if img.mode == "1":
+        colorspace, bits = "/DeviceGray", 1
+    elif img.mode == "L":
+        colorspace, bits = "/DeviceGray", 8
+    elif img.mode == "RGB":
+        colorspace, bits = "/DeviceRGB", 8
+    elif img.mode == "CMYK":
+        colorspace, bits = "/DeviceCMYK", 8
+    else:
+        img = _flatten_to_rgb(img)
+        colorspace, bits = "/DeviceRGB", 8
+
+    # Compress in bands of rows so the raw samples are never copied in one piece
+    compressor = zlib.compressobj(6)
+    chunks = []
+    for top in range(0, img.height, _FLATE_BAND_ROWS):
+        band = img.crop((0, top, img.width, min(top + _FLATE_BAND_ROWS, img.height)))
+        chunks.append(compressor.compress(band.tobytes()))
+    chunks.append(compressor.flush())
+
+    return EncodedImage(b"".join(chunks), img.width, img.height, colorspace, bits,
+                        "/FlateDecode", None, None, dpi)
+
+
+def encode_jpeg(data, img=None):
+    """Wrap JPEG bytes into an EncodedImage without re-encoding them."""
+    if img is None:
+        img = Image.open(io.BytesIO(data))
+    colorspace = {"L": "/DeviceGray", "CMYK": "/DeviceCMYK"}.get(img.mode, "/DeviceRGB")
+    # Adobe CMYK JPEGs store inverted samples
+    decode = "[1 0 1 0 1 0 1 0]" if img.mode == "CMYK" and "adobe" in img.info else None
+    return EncodedImage(data, img.width, img.height, colorspace, 8,
+                        "/DCTDecode", None, decode, _image_dpi(img))
+
+
+def encode_image_file(image_path):
+    """
+    Encode an image file for embedding in a PDF page.
+
+    JPEG files are embedded as-is without being decoded; any other format
+    is decoded with Pillow and stored losslessly.
+    """
+    with Image.open(image_path) as img:
+        if img.format == "JPEG" and img.mode in ("L", "RGB", "CMYK"):
+            with open(image_path, "rb") as f:
+                data = f.read()
+            return encode_jpeg(data, img)
+        img.load()
+        return encode_image(img)
+
+
+def ccitt_passthrough_info(img):
+    """
+    Check whether the current frame of a TIFF can be embedded without decoding.
+
+    Returns (offset, byte_count, black_is_1) for single-strip CCITT Group 4
+    frames, or None when the frame has to be decoded.
+    """
+    if getattr(img, "format", None) != "TIFF" or img.info.get("compression") != "group4":
+        return None
+
+    tags = img.tag_v2
+    offsets = tags.get(273)  # StripOffsets
+    byte_counts = tags.get(279)  # StripByteCounts
+    if 324 in tags or not offsets or not byte_counts:  # Tiled images
+        return None
+    if len(offsets) != 1 or len(byte_counts) != 1:
+        # Every strip is a separate Group 4 stream; they cannot be joined
+        return None
+    if tags.get(266, 1) != 1:  # FillOrder: reversed bit order is not supported by PDF
+        return None
+
+    # With BlackIsZero photometric the encoded "white" runs are black
+    black_is_1 = tags.get(262, 0) == 1
+    return offsets[0], byte_counts[0], black_is_1
+
+
+def encode_ccitt_frame(image_path, frame=0):
+    """
+    Embed a CCITT Group 4 TIFF frame as a CCITTFaxDecode stream without decoding it.
+
+    Frames that cannot be passed through are decoded and Flate compressed instead.
+    """
+    with Image.open(image_path) as img:
+        img.seek(frame)
+        info = ccitt_passthrough_info(img)
+        if info is None:
+            img.load()
+            return encode_image(img)
+
+        offset, byte_count, black_is_1 = info
+        width, height = img.size
+        dpi = _image_dpi(img)
+
+    with open(image_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(byte_count)
+
+    decode_parms = (f"<< /K -1 /Columns {width} /Rows {height}"
+                    f" /BlackIs1 {'true' if black_is_1 else 'false'} >>")
+    return EncodedImage(data, width, height, "/DeviceGray", 1,
+                        "/CCITTFaxDecode", decode_parms, None, dpi)
+
+
+def _image_dpi(img):
+    """Return the (x, y) resolution stored in an image, defaulting to 72 DPI."""
+    dpi = img.info.get("dpi")
+    try:
+        x_dpi, y_dpi = float(dpi[0]), float(dpi[1])
+        if x_dpi > 1 and y_dpi > 1:
+            return x_dpi, y_dpi
+    except (TypeError, ValueError, IndexError):
+        pass
+    return 72, 72
+
+
+def _flatten_to_rgb(img):
+    """Convert any image mode to RGB, compositing transparency onto white."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
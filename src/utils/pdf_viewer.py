@@ -0,0 +1,510 @@
+import os
+import bisect
+import importlib.util
+import shutil
+import logging
+import threading
+from functools import partial
+from itertools import accumulate
+from collections import OrderedDict, namedtuple
+from PyQt6.QtWidgets import QAbstractScrollArea, QAbstractItemView, QListView, QListWidget
+from PyQt6.QtCore import Qt, QRect, QSize, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter
+from src.utils.background import BackgroundWorker
+from src.utils.qt_image import pil_to_qimage
+from src.utils.thumbnails import ThumbnailListLoader
+
+# PyMuPDF is optional; it renders without poppler and is used when poppler is missing.
+# Only its presence is checked here, it is imported the first time a page is rendered.
+HAS_PYMUPDF = any(importlib.util.find_spec(name) is not None for name in ("pymupdf", "fitz"))
+
+# Side of the square tiles pages are cut into for caching and drawing
+TILE_SIZE = 256
+
+# Memory budget of the rendered tile cache
+DEFAULT_TILE_CACHE_MB = 96
+
+# Resolution that corresponds to 100% zoom
+SCREEN_DPI = 96
+
+# Space around and between pages, in pixels
+PAGE_GAP = 12
+
+# Icon size of the page thumbnails in the sidebar
+SIDEBAR_ICON_SIZE = 80
+
+# Number of documents whose page index is kept by page_index()
+PAGE_INDEX_CACHE_SIZE = 8
+
+_BACKGROUND_COLOR = QColor("#e0e0e0")
+
+
+class Pdf2ImageRenderer:
+    """Render pages with poppler through pdf2image."""
+
+    def __init__(self, poppler_path=None):
+        self.poppler_path = poppler_path
+
+    def page_count(self, pdf_path):
+        from pdf2image import pdfinfo_from_path
+        return int(pdfinfo_from_path(pdf_path, poppler_path=self.poppler_path)["Pages"])
+
+    def render_page(self, pdf_path, page_number, dpi):
+        """Render a 1-based page to a PIL image"""
+        from pdf2image import convert_from_path
+        return convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number,
+                                 poppler_path=self.poppler_path)[0]
+
+
+def _import_fitz():
+    try:
+        import pymupdf as fitz
+    except ImportError:
+        import fitz
+    return fitz
+
+
+class PyMuPdfRenderer:
+    """Render pages with PyMuPDF (no external programs needed)."""
+
+    def page_count(self, pdf_path):
+        fitz = _import_fitz()
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+
+    def render_page(self, pdf_path, page_number, dpi):
+        """Render a 1-based page to a PIL image"""
+        from PIL import Image
+        fitz = _import_fitz()
+        with fitz.open(pdf_path) as doc:
+            scale = dpi / 72.0
+            pixmap = doc[page_number - 1].get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+            return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def default_renderer(pdftoppm=None):
+    """
+    Return pdf2image when poppler is found, otherwise PyMuPDF if available.
+
+    Args:
+        pdftoppm: poppler's pdftoppm executable (see check_dependencies.find_pdftoppm),
+            looked up on PATH when not given
+    """
+    pdftoppm = pdftoppm or shutil.which("pdftoppm")
+    if pdftoppm:
+        return Pdf2ImageRenderer(poppler_path=os.path.dirname(pdftoppm))
+    if HAS_PYMUPDF:
+        return PyMuPdfRenderer()
+    return Pdf2ImageRenderer()
+
+
+def read_page_sizes(pdf_path):
+    """
+    Return the displayed (width, height) of every page in points.
+
+    Only the page tree is read, so this is fast even for large documents.
+    The crop box is used when present and /Rotate is taken into account.
+    """
+    import pikepdf
+
+    sizes = []
+    with pikepdf.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            box = [float(v) for v in page.cropbox]
+            width, height = abs(box[2] - box[0]), abs(box[3] - box[1])
+            if int(page.obj.get("/Rotate", 0)) % 180 == 90:
+                width, height = height, width
+            sizes.append((width, height))
+    return sizes
+
+
+# Pixel geometry of a document at one zoom level: the top of every page, every
+# page's (width, height), and the size of the whole scrollable area
+PageLayout = namedtuple("PageLayout", ["tops", "sizes", "width", "height"])
+
+
+class PageIndex:
+    """
+    Page geometry of one document: page count, page sizes and, for every zoom
+    level used so far, the cumulative offsets of the pages.
+
+    Looking up where a page starts is a list index, so jumping to page N is
+    O(1) and finding the page at a scroll position is a bisection, even for
+    documents with tens of thousands of pages.
+    """
+
+    def __init__(self, page_sizes):
+        self.page_sizes = page_sizes
+        self._layouts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        return len(self.page_sizes)
+
+    def layout(self, dpi):
+        """Return the PageLayout at `dpi`, computing it on first use"""
+        with self._lock:
+            layout = self._layouts.get(dpi)
+            if layout is None:
+                scale = dpi / 72.0
+                sizes = [(max(1, round(w * scale)), max(1, round(h * scale))) for w, h in self.page_sizes]
+                # Each page starts one gap below the previous one
+                tops = list(accumulate((h + PAGE_GAP for _, h in sizes[:-1]), initial=PAGE_GAP)) if sizes else []
+                height = tops[-1] + sizes[-1][1] + PAGE_GAP if sizes else 0
+                width = max((w for w, _ in sizes), default=0) + 2 * PAGE_GAP
+                layout = self._layouts[dpi] = PageLayout(tops, sizes, width, height)
+            return layout
+
+    @staticmethod
+    def page_at(layout, y):
+        """Return the 0-based page showing at vertical offset `y`"""
+        return max(0, bisect.bisect_right(layout.tops, y) - 1)
+
+
+_page_indexes = OrderedDict()
+_page_indexes_lock = threading.Lock()
+
+
+def page_index(pdf_path):
+    """
+    Return the PageIndex of a PDF, reading its page tree only once per version.
+
+    Indexes are cached by path, modification time and size, so every view of
+    the same document (viewer, split preview, page counts) shares one index.
+    """
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+    with _page_indexes_lock:
+        index = _page_indexes.get(key)
+        if index is not None:
+            _page_indexes.move_to_end(key)
+            return index
+
+    index = PageIndex(read_page_sizes(pdf_path))
+    with _page_indexes_lock:
+        _page_indexes[key] = index
+        while len(_page_indexes) > PAGE_INDEX_CACHE_SIZE:
+            _page_indexes.popitem(last=False)
+    return index
+
+
+class TileCache:
+    """Thread-safe LRU of rendered tiles (QImages), bounded by their size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            old = self._tiles.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old.sizeInBytes()
+            self._tiles[key] = tile
+            self.size_bytes += tile.sizeInBytes()
+            while self.size_bytes > self.max_bytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self.size_bytes -= evicted.sizeInBytes()
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self.size_bytes = 0
+
+
+def _render_page_tiles(renderer, pdf_path, page_number, dpi, size, tile_size):
+    """Background job: render one page and cut it into tiles of `tile_size` pixels"""
+    from PIL import Image
+
+    page = renderer.render_page(pdf_path, page_number, dpi)
+    if page.mode != "RGB":
+        page = page.convert("RGB")
+    # Renderers may round the page size differently; match the layout exactly
+    if page.size != size:
+        page = page.resize(size, Image.Resampling.BILINEAR)
+
+    tiles = {}
+    for top in range(0, size[1], tile_size):
+        for left in range(0, size[0], tile_size):
+            box = (left, top, min(left + tile_size, size[0]), min(top + tile_size, size[1]))
+            tiles[(left // tile_size, top // tile_size)] = pil_to_qimage(page.crop(box))
+    return tiles
+
+
+class PdfPageView(QAbstractScrollArea):
+    """
+    Native PDF viewer showing pages as rendered image tiles.
+
+    Pages are laid out from their sizes alone, so opening a document renders
+    nothing. Only pages with tiles inside the viewport are rendered, on a
+    background thread pool, and their tiles are kept in an LRU cache bounded
+    in megabytes.
+
+    Signals:
+        pageChanged(int): 1-based number of the page at the top of the view
+    """
+
+    pageChanged = pyqtSignal(int)
+
+    def __init__(self, parent=None, renderer=None, cache_mb=DEFAULT_TILE_CACHE_MB):
+        super().__init__(parent)
+        self.renderer = renderer or default_renderer()
+        self.tile_cache = TileCache(cache_mb * 1024 * 1024)
+        self.pdf_path = None
+        self.zoom = 100
+        self._mtime = None
+        self.index = PageIndex([])
+        self._layout = self.index.layout(self.dpi())
+        self._current_page = 0
+        self._requested = set()
+        self._failed = set()
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.worker = BackgroundWorker(self, self.pool)
+        self.worker.finished.connect(self._on_page_rendered)
+        self.worker.failed.connect(self._on_render_failed)
+
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+
+    def page_count(self):
+        return self.index.page_count
+
+    def current_page(self):
+        """Return the 1-based number of the page at the top of the view (0 if empty)"""
+        return self._current_page + 1 if self.index.page_count else 0
+
+    def load(self, pdf_path):
+        """Open a PDF; raises if its page tree cannot be read"""
+        index = page_index(pdf_path)
+        self.pool.clear()
+        self.pdf_path = pdf_path
+        self._mtime = os.path.getmtime(pdf_path)
+        self.index = index
+        self._requested.clear()
+        self._failed.clear()
+        self._current_page = 0
+        self._relayout()
+        self.verticalScrollBar().setValue(0)
+        self.horizontalScrollBar().setValue(0)
+        self.pageChanged.emit(self.current_page())
+        self.viewport().update()
+
+    def clear(self):
+        self.pool.clear()
+        self.pdf_path = None
+        self.index = PageIndex([])
+        self._relayout()
+        self.viewport().update()
+
+    def dpi(self):
+        return SCREEN_DPI * self.zoom / 100.0
+
+    def set_zoom(self, percent):
+        """Change the zoom, keeping the page at the top of the view in place"""
+        if percent == self.zoom:
+            return
+        page = self._current_page
+        offset = 0.0
+        if self.index.page_count:
+            layout = self._layout
+            offset = (self.verticalScrollBar().value() - layout.tops[page]) / layout.sizes[page][1]
+
+        self.pool.clear()
+        self._requested.clear()
+        self.zoom = percent
+        self._relayout()
+
+        if self.index.page_count:
+            layout = self._layout
+            self.verticalScrollBar().setValue(round(layout.tops[page] + offset * layout.sizes[page][1]))
+            self._current_page = page
+        self.viewport().update()
+
+    def go_to_page(self, page_number):
+        """Scroll to a 1-based page number (clamped to the document)"""
+        if not self.index.page_count:
+            return
+        page = max(0, min(page_number - 1, self.index.page_count - 1))
+        self.verticalScrollBar().setValue(self._layout.tops[page] - PAGE_GAP // 2)
+        # Near the end the scroll bar is clamped; the requested page is still the current one
+        if self._current_page != page:
+            self._current_page = page
+            self.pageChanged.emit(self.current_page())
+
+    def _relayout(self):
+        """Look up page positions for the current zoom"""
+        self._layout = self.index.layout(self.dpi())
+        self._update_scrollbars()
+
+    def _update_scrollbars(self):
+        viewport = self.viewport().size()
+        vertical = self.verticalScrollBar()
+        vertical.setRange(0, max(0, self._layout.height - viewport.height()))
+        vertical.setPageStep(viewport.height())
+        vertical.setSingleStep(40)
+        horizontal = self.horizontalScrollBar()
+        horizontal.setRange(0, max(0, self._layout.width - viewport.width()))
+        horizontal.setPageStep(viewport.width())
+        horizontal.setSingleStep(40)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+
+    def _on_scrolled(self, value):
+        if self.index.page_count:
+            page = PageIndex.page_at(self._layout, value + PAGE_GAP)
+            if page != self._current_page:
+                self._current_page = page
+                self.pageChanged.emit(self.current_page())
+        self.viewport().update()
+
+    def _page_rect(self, page):
+        """Return a page's rectangle in document coordinates"""
+        width, height = self._layout.sizes[page]
+        left = max(PAGE_GAP, (max(self._layout.width, self.viewport().width()) - width) // 2)
+        return QRect(left, self._layout.tops[page], width, height)
+
+    def _tile_key(self, page, column, row):
+        return (self.pdf_path, self._mtime, page, self.zoom, column, row)
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(self.viewport().rect(), _BACKGROUND_COLOR)
+        if not self.index.page_count:
+            return
+
+        dx = self.horizontalScrollBar().value()
+        dy = self.verticalScrollBar().value()
+        visible = QRect(dx, dy, self.viewport().width(), self.viewport().height())
+
+        for page in range(PageIndex.page_at(self._layout, dy), self.index.page_count):
+            rect = self._page_rect(page)
+            if rect.top() > visible.bottom():
+                break
+            if not rect.intersects(visible):
+                continue
+
+            painter.fillRect(rect.translated(-dx, -dy), Qt.GlobalColor.white)
+            if page in self._failed:
+                painter.drawText(rect.translated(-dx, -dy), Qt.AlignmentFlag.AlignCenter,
+                                 "Could not render this page")
+                continue
+
+            # Draw the cached tiles that are in view, and render the page if any is missing
+            area = rect.intersected(visible)
+            missing = False
+            for row in range((area.top() - rect.top()) // TILE_SIZE,
+                             (area.bottom() - rect.top()) // TILE_SIZE + 1):
+                for column in range((area.left() - rect.left()) // TILE_SIZE,
+                                    (area.right() - rect.left()) // TILE_SIZE + 1):
+                    tile = self.tile_cache.get(self._tile_key(page, column, row))
+                    if tile is None:
+                        missing = True
+                        continue
+                    painter.drawImage(rect.left() + column * TILE_SIZE - dx,
+                                      rect.top() + row * TILE_SIZE - dy, tile)
+            if missing:
+                self._request_page(page)
+
+    def _request_page(self, page):
+        token = (self.pdf_path, self._mtime, page, self.zoom)
+        if token in self._requested:
+            return
+        self._requested.add(token)
+        self.worker.submit(token, _render_page_tiles, self.renderer, self.pdf_path, page + 1,
+                           self.dpi(), self._layout.sizes[page], TILE_SIZE)
+
+    def _on_page_rendered(self, token, tiles):
+        self._requested.discard(token)
+        pdf_path, mtime, page, zoom = token
+        if (pdf_path, mtime, zoom) != (self.pdf_path, self._mtime, self.zoom):
+            return
+        for (column, row), tile in tiles.items():
+            self.tile_cache.put(self._tile_key(page, column, row), tile)
+        self.viewport().update()
+
+    def _on_render_failed(self, token, message):
+        self._requested.discard(token)
+        pdf_path, mtime, page, zoom = token
+        if (pdf_path, mtime) == (self.pdf_path, self._mtime):
+            logging.error(f"Could not render page {page + 1} of {pdf_path}: {message}")
+            self._failed.add(page)
+            self.viewport().update()
+
+
+def render_page_thumbnail(renderer, pdf_path, size, page):
+    """Render a 1-based page (given as a string) at the low DPI that fits `size` pixels"""
+    page_number = int(page)
+    width, height = page_index(pdf_path).page_sizes[page_number - 1]
+    dpi = max(1.0, size * 72.0 / max(width, height, 1))
+    thumbnail = renderer.render_page(pdf_path, page_number, dpi)
+    thumbnail.thumbnail((size, size))
+    return thumbnail
+
+
+class PageThumbnailSidebar(QListWidget):
+    """
+    Vertical strip of page thumbnails for a PDF.
+
+    Thumbnails are rendered at low DPI by a background pool, for the pages
+    in view first; requests for pages scrolled past are cancelled. They are
+    cached on disk (see thumbnails.load_thumbnail), so reopening a document
+    shows them immediately.
+
+    Signals:
+        pageClicked(int): 1-based number of the page the user clicked
+    """
+
+    pageClicked = pyqtSignal(int)
+
+    def __init__(self, parent=None, renderer=None):
+        super().__init__(parent)
+        self.pdf_path = None
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setFlow(QListView.Flow.TopToBottom)
+        self.setWrapping(False)
+        self.setMovement(QListView.Movement.Static)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setGridSize(QSize(SIDEBAR_ICON_SIZE + 20, SIDEBAR_ICON_SIZE + 24))
+        self.setFixedWidth(SIDEBAR_ICON_SIZE + 44)
+
+        self.loader = ThumbnailListLoader(
+            self,
+            lambda row: self.pdf_path if 0 <= row < self.count() else None,
+            render=partial(render_page_thumbnail, renderer or default_renderer()),
+            variant_for_row=lambda row: str(row + 1),
+            icon_size=SIDEBAR_ICON_SIZE
+        )
+        self.itemClicked.connect(lambda item: self.pageClicked.emit(self.row(item) + 1))
+
+    def load(self, pdf_path):
+        """Show the pages of a PDF (raises if its page tree cannot be read)"""
+        page_count = page_index(pdf_path).page_count
+        self.clear()
+        self.pdf_path = pdf_path
+        self.addItems([str(page) for page in range(1, page_count + 1)])
+
+    def clear(self):
+        self.pdf_path = None
+        super().clear()
+
+    def set_current_page(self, page_number):
+        """Highlight a 1-based page and scroll it into view"""
+        item = self.item(page_number - 1)
+        if item is not None:
+            self.setCurrentItem(item)
+            self.scrollToItem(item)
@@ -0,0 +1,205 @@
+import io
+import os
+import logging
+from PIL import Image, ImageOps
+from src.utils import telemetry
+from src.utils.magick import PAPER_SIZES
+from src.utils.pdf_stream import (StreamingPdfWriter, encode_image, encode_image_file,
+                                  encode_jpeg, _image_dpi)
+
+# Engine used for image conversions: "auto", "pillow" or "magick". Used when the
+# engine setting in the Convert tab is left on Automatic.
+IMAGE_ENGINE_ENV = "PDF_MANAGER_IMAGE_ENGINE"
+
+# Engines in the order of the Convert tab's engine setting
+IMAGE_ENGINES = ("auto", "pillow", "magick")
+
+# Colour used for borders and for the area around an image fitted on a page
+_WHITE = "white"
+
+
+def image_engine(self=None):
+    """
+    Return the engine chosen for image conversions.
+
+    The engine setting in the Convert tab wins; while it is on Automatic the
+    PDF_MANAGER_IMAGE_ENGINE environment variable may force an engine.
+    """
+    combo = getattr(self, "image_engine", None)
+    if combo is not None and combo.currentIndex() > 0:
+        return IMAGE_ENGINES[combo.currentIndex()]
+
+    value = os.environ.get(IMAGE_ENGINE_ENV, "").strip().lower()
+    if value in IMAGE_ENGINES:
+        return value
+    if value:
+        logging.warning(f"Ignoring invalid {IMAGE_ENGINE_ENV} value: {value}")
+    return "auto"
+
+
+def pillow_can_read(path):
+    """Check whether Pillow can read an image file (only the header is read)"""
+    try:
+        with Image.open(path):
+            return True
+    except Exception:
+        return False
+
+
+def use_pillow(engine, path):
+    """
+    Decide whether a file is converted with Pillow.
+
+    On Automatic, every file Pillow can read is converted without
+    ImageMagick; only other formats are left to ImageMagick.
+    """
+    if engine == "pillow":
+        return True
+    if engine == "magick":
+        return False
+    return pillow_can_read(path)
+
+
+def rotate_image(img, degrees):
+    """Rotate an image clockwise like ImageMagick's -rotate, filling new corners with white"""
+    degrees = degrees % 360
+    if degrees == 0:
+        return img
+    # Quarter turns are exact, lossless pixel moves
+    transpose = {90: Image.Transpose.ROTATE_270, 180: Image.Transpose.ROTATE_180,
+                 270: Image.Transpose.ROTATE_90}.get(degrees)
+    if transpose is not None:
+        return img.transpose(transpose)
+    img = _paintable(img)
+    return img.rotate(-degrees, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=_WHITE)
+
+
+def add_border(img, width, color=_WHITE):
+    """Add a border of `width` pixels on every side, like ImageMagick's -border"""
+    return ImageOps.expand(_paintable(img), border=width, fill=color)
+
+
+def fit_to_paper(img, paper, dpi):
+    """
+    Center an image on a page of the given paper size.
+
+    The page is `dpi` pixels per inch; an image larger than the page is
+    scaled down to fit it, a smaller one is kept at its size. Unknown paper
+    sizes leave the image unchanged.
+    """
+    size = PAPER_SIZES.get(paper)
+    if size is None or not dpi:
+        return img
+    page_width, page_height = (round(points * dpi / 72) for points in size)
+
+    img = _paintable(img)
+    scale = min(page_width / img.width, page_height / img.height, 1.0)
+    if scale < 1.0:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                         Image.Resampling.LANCZOS)
+
+    page = Image.new(img.mode, (page_width, page_height), _WHITE)
+    page.paste(img, ((page_width - img.width) // 2, (page_height - img.height) // 2))
+    return page
+
+
+def apply_command(command):
+    """Load the source of a MagickCommand and apply its operations with Pillow"""
+    with Image.open(command.path) as img:
+        if command.frame is not None:
+            img.seek(command.frame)
+        # The copy keeps the pixels once the file is closed
+        result = img.copy()
+
+    for operation in command.operations:
+        if operation[0] == "rotate":
+            result = rotate_image(result, operation[1])
+        else:
+            result = add_border(result, operation[1], operation[2])
+    return result
+
+
+def encode_command(command):
+    """
+    Carry out a MagickCommand with Pillow and encode the result as a PDF page.
+
+    JPEG sources that need no change are embedded without being decoded.
+    JPEG sources and images fitted on a paper size are JPEG encoded at the
+    command's quality unless another compression is asked for; everything
+    else is stored losslessly.
+    """
+    if not command.operations and command.paper is None and command.frame is None:
+        with Image.open(command.path) as img:
+            passthrough = img.format == "JPEG"
+        if passthrough:
+            with telemetry.span("encode"):
+                return encode_image_file(command.path)
+
+    with telemetry.span("decode"):
+        with Image.open(command.path) as img:
+            source_is_jpeg = img.format == "JPEG"
+            # Like ImageMagick, keep the source resolution unless a density is given
+            dpi = (command.dpi, command.dpi) if command.dpi else _image_dpi(img)
+        img = apply_command(command)
+        if command.paper is not None:
+            img = fit_to_paper(img, command.paper, dpi[0])
+    with telemetry.span("encode"):
+        lossy = command.compress_method in (None, "JPEG") and (command.paper is not None or source_is_jpeg)
+        if lossy and img.mode != "1":
+            return _encode_as_jpeg(img, command.quality_value or 95, dpi)
+        return encode_image(img, dpi)
+
+
+def render_command(command, output):
+    """
+    Carry out a MagickCommand with Pillow, writing `output` like ImageMagick would.
+
+    PDF output gets one page; any other extension is saved in that format
+    by Pillow.
+    """
+    if output.lower().endswith(".pdf"):
+        page = encode_command(command)
+        with telemetry.span("write"), StreamingPdfWriter(output) as writer:
+            writer.add_encoded(page)
+        return
+
+    with telemetry.span("decode"):
+        img = apply_command(command)
+    options = {}
+    if command.quality_value is not None:
+        options["quality"] = command.quality_value
+    if command.dpi:
+        options["dpi"] = (command.dpi, command.dpi)
+    if output.lower().endswith((".jpg", ".jpeg")):
+        img = _flatten(img)
+    with telemetry.span("encode"):
+        img.save(output, **options)
+
+
+def _paintable(img):
+    """Return a version of the image that white pixels can be painted on"""
+    if img.mode in ("RGB", "L", "CMYK"):
+        return img
+    if img.mode == "1":
+        return img.convert("L")
+    return _flatten(img)
+
+
+def _flatten(img):
+    """Convert to RGB (or keep L), compositing transparency onto white"""
+    if img.mode in ("RGB", "L"):
+        return img
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, _WHITE)
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def _encode_as_jpeg(img, quality, dpi):
+    if img.mode not in ("RGB", "L", "CMYK"):
+        img = _flatten(img)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality, dpi=dpi)
+    return encode_jpeg(buffer.getvalue())
@@ -0,0 +1,366 @@
+"""
+Run several PDF operations over one in-memory document and write it once.
+
+A pipeline is a list of stages - open, convert, merge, compress, extract -
+applied in order to a single pikepdf document. Nothing is written to disk
+between stages; the result is saved once at the end. Pipelines are built in
+code:
+
+    Pipeline().convert(["scan1.jpg", "scan2.jpg"], paper="A4").compress(2) \\
+              .merge(["cover.pdf"], position="start").extract("1-3").run("out.pdf")
+
+or loaded from a JSON (or, with PyYAML installed, YAML) recipe:
+
+    {
+      "output": "out.pdf",
+      "stages": [
+        {"stage": "convert", "images": ["scan1.jpg", "scan2.jpg"], "paper": "A4"},
+        {"stage": "compress", "level": 2},
+        {"stage": "merge", "files": ["cover.pdf"], "position": "start"},
+        {"stage": "extract", "pages": "1-3"}
+      ]
+    }
+
+Relative paths in a recipe file are relative to the recipe. A recipe can be
+run from the command line:
+
+    python -m src.utils.pipeline recipe.json [-o out.pdf]
+"""
+import os
+import re
+import gc
+import json
+import signal
+import logging
+import argparse
+from src.utils import telemetry
+from src.utils.scratch import scratch_file, copy_scratch_to
+
+# Stage name -> function(context, **params), filled in by the @stage decorator
+STAGES = {}
+
+
+def stage(name):
+    """Register a function as the pipeline stage `name`"""
+    def register(fn):
+        STAGES[name] = fn
+        return fn
+    return register
+
+
+class PipelineContext:
+    """
+    State shared by the stages of one run: the document being built, the
+    source documents its pages still refer to, and the options of the final
+    save.
+    """
+
+    def __init__(self):
+        import pikepdf
+
+        self.pdf = pikepdf.Pdf.new()
+        self.save_options = {}
+        self._sources = []
+
+    def open_source(self, path):
+        """Open a PDF whose pages are copied into the document; it stays open until the final write"""
+        import pikepdf
+
+        telemetry.count("bytes_in", telemetry.file_size(path))
+        with telemetry.span("open"):
+            source = pikepdf.Pdf.open(path)
+        self._sources.append(source)
+        return source
+
+    def close(self):
+        """Close the document and its sources; safe to call more than once"""
+        for source in self._sources:
+            source.close()
+        self._sources = []
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+
+
+@stage("open")
+def open_stage(context, file):
+    """Start from the pages of an existing PDF"""
+    context.pdf.pages.extend(context.open_source(file).pages)
+
+
+@stage("convert")
+def convert_stage(context, images, rotate=0, margin=0, paper=None, dpi=150, quality=95, compression="JPEG"):
+    """Append one page per image, converted with Pillow like the Convert tab does"""
+    from src.utils.magick import MagickCommand
+    from src.utils.pillow_ops import encode_command
+    from src.utils.pdf_stream import encode_ccitt_frame
+    from src.utils.convert_pipeline import iter_image_frames
+
+    for frame in iter_image_frames(images):
+        telemetry.count("images")
+        # Group 4 fax frames that need no change are copied without being decoded
+        if frame.passthrough and not rotate and not margin and paper is None:
+            add_encoded_page(context.pdf, encode_ccitt_frame(frame.path, frame.frame))
+            continue
+        command = (MagickCommand(frame.path, frame.frame if frame.frame_count > 1 else None)
+                   .rotate(rotate)
+                   .border(margin)
+                   .quality(quality)
+                   .compress(compression if compression != "JPEG" else None))
+        if paper is not None:
+            command.density(dpi).page(paper)
+        add_encoded_page(context.pdf, encode_command(command))
+
+
+@stage("merge")
+def merge_stage(context, files, position="end", bookmarks=False):
+    """Add the pages of other PDFs at the start or the end of the document"""
+    import pikepdf
+
+    if position not in ("start", "end"):
+        raise ValueError(f"Merge position must be 'start' or 'end', not '{position}'")
+
+    insert_at = 0 if position == "start" else len(context.pdf.pages)
+    first_pages = []
+    for path in files:
+        source = context.open_source(path)
+        first_pages.append((os.path.basename(path), insert_at))
+        for page in source.pages:
+            context.pdf.pages.insert(insert_at, page)
+            insert_at += 1
+
+    if bookmarks:
+        with context.pdf.open_outline() as outline:
+            items = [pikepdf.OutlineItem(title, index) for title, index in first_pages]
+            if position == "start":
+                outline.root[0:0] = items
+            else:
+                outline.root.extend(items)
+
+
+@stage("compress")
+def compress_stage(context, level=2):
+    """Recompress the images of the document and write it with compressed streams"""
+    from src.utils.compress import compress_document, compressed_save_options
+
+    compress_document(context.pdf, level)
+    context.save_options.update(compressed_save_options())
+
+
+@stage("extract")
+def extract_stage(context, pages):
+    """Keep only the pages in a range such as "1,3,5-8"; the others are dropped"""
+    from src.utils.split import parse_pages
+
+    selection = parse_pages(str(pages), len(context.pdf.pages))
+    for note in selection.notes:
+        logging.warning(note)
+    if selection.invalid:
+        raise ValueError(f"Invalid page range: {', '.join(selection.invalid)}")
+    if not selection.pages:
+        raise ValueError("No valid pages specified for extraction.")
+
+    keep = set(selection.pages)
+    for index in reversed(range(len(context.pdf.pages))):
+        if index + 1 not in keep:
+            del context.pdf.pages[index]
+
+
+def add_encoded_page(pdf, page):
+    """Append a page showing one EncodedImage (see src.utils.pdf_stream) to a pikepdf document"""
+    import pikepdf
+
+    x_dpi, y_dpi = (value or 72 for value in page.dpi)
+    width = page.width * 72.0 / x_dpi
+    height = page.height * 72.0 / y_dpi
+
+    image = pikepdf.Stream(pdf, page.data)
+    image.Type = pikepdf.Name.XObject
+    image.Subtype = pikepdf.Name.Image
+    image.Width = page.width
+    image.Height = page.height
+    image.ColorSpace = pikepdf.Name(page.colorspace)
+    image.BitsPerComponent = page.bits_per_component
+    image.Filter = pikepdf.Name(page.filter_name)
+    if page.decode_parms:
+        image.DecodeParms = _pdf_dictionary(page.decode_parms)
+    if page.decode:
+        image.Decode = pikepdf.Array(float(n) for n in page.decode.strip("[]").split())
+
+    content = pikepdf.Stream(pdf, f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode("ascii"))
+    pdf.pages.append(pikepdf.Page(pikepdf.Dictionary(
+        Type=pikepdf.Name.Page,
+        MediaBox=[0, 0, width, height],
+        Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image)),
+        Contents=content,
+    )))
+
+
+def _pdf_dictionary(text):
+    """Turn a flat '<< /Key value ... >>' string of names, numbers and booleans into a pikepdf Dictionary"""
+    import pikepdf
+
+    values = {}
+    for key, value in re.findall(r"/(\w+)\s+(/?[\w.+-]+)", text):
+        if value.startswith("/"):
+            values["/" + key] = pikepdf.Name(value)
+        elif value in ("true", "false"):
+            values["/" + key] = value == "true"
+        else:
+            values["/" + key] = float(value) if "." in value else int(value)
+    return pikepdf.Dictionary(values)
+
+
+class Pipeline:
+    """
+    An ordered list of stages run over one in-memory PDF document.
+
+    Stages are added with the helper methods (or add()) and run() applies
+    them in order and writes the result once.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = []
+        for entry in stages or []:
+            entry = dict(entry)
+            self.add(entry.pop("stage"), **entry)
+
+    def add(self, name, **params):
+        if name not in STAGES:
+            raise ValueError(f"Unknown pipeline stage '{name}'; available stages: {', '.join(sorted(STAGES))}")
+        self.stages.append((name, params))
+        return self
+
+    def open(self, file):
+        return self.add("open", file=file)
+
+    def convert(self, images, **options):
+        return self.add("convert", images=list(images), **options)
+
+    def merge(self, files, position="end", bookmarks=False):
+        return self.add("merge", files=list(files), position=position, bookmarks=bookmarks)
+
+    def compress(self, level=2):
+        return self.add("compress", level=level)
+
+    def extract(self, pages):
+        return self.add("extract", pages=pages)
+
+    def run(self, output_path, progress=None):
+        """
+        Run all stages and write the document to `output_path`.
+
+        The document is written through scratch storage, so the output may
+        be one of the input files.
+
+        Args:
+            output_path: Path of the PDF to write
+            progress: Optional callable (stage_index, stage_count, stage_name)
+                called before each stage
+
+        Returns:
+            Number of pages written
+        """
+        if not self.stages:
+            raise ValueError("The pipeline has no stages")
+
+        with telemetry.operation("pipeline", stages=",".join(name for name, _ in self.stages)):
+            context = PipelineContext()
+            try:
+                for index, (name, params) in enumerate(self.stages):
+                    if progress is not None:
+                        progress(index, len(self.stages), name)
+                    logging.info(f"Pipeline stage {index + 1}/{len(self.stages)}: {name}")
+                    STAGES[name](context, **params)
+
+                page_count = len(context.pdf.pages)
+                if page_count == 0:
+                    raise ValueError("The pipeline produced no pages")
+                telemetry.count("pages", page_count)
+
+                with scratch_file() as result, telemetry.span("write"):
+                    context.pdf.save(result, **context.save_options)
+
+                    # Release the source files before writing, the output may replace one of them
+                    context.close()
+                    gc.collect()
+
+                    copy_scratch_to(result, output_path)
+                telemetry.count("bytes_out", telemetry.file_size(output_path))
+                return page_count
+            finally:
+                context.close()
+
+
+def ignore_interrupts():
+    """
+    Process pool initializer for pipeline workers: Ctrl+C is left to the
+    parent process, which stops the pool itself instead of failing the
+    running jobs.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def load_recipe(path):
+    """
+    Load a pipeline recipe from a .json, .yaml or .yml file.
+
+    Returns:
+        (Pipeline, output path or None)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("YAML recipes need PyYAML (pip install pyyaml); use a JSON recipe instead")
+        recipe = yaml.safe_load(text)
+    else:
+        recipe = json.loads(text)
+
+    return recipe_pipeline(recipe, base_dir=os.path.dirname(os.path.abspath(path)))
+
+
+def recipe_pipeline(recipe, base_dir=None):
+    """
+    Build a Pipeline from a recipe dictionary, resolving relative paths against `base_dir`.
+
+    Returns:
+        (Pipeline, output path or None)
+    """
+    def resolve(path):
+        return os.path.join(base_dir, path) if base_dir else path
+
+    stages = []
+    for entry in recipe.get("stages", []):
+        entry = dict(entry)
+        if "file" in entry:
+            entry["file"] = resolve(entry["file"])
+        for key in ("images", "files"):
+            if key in entry:
+                entry[key] = [resolve(p) for p in entry[key]]
+        stages.append(entry)
+
+    output = recipe.get("output")
+    return Pipeline(stages), resolve(output) if output else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a PDF pipeline recipe")
+    parser.add_argument("recipe", help="JSON or YAML recipe file")
+    parser.add_argument("-o", "--output", help="PDF to write, overrides the recipe's output")
+    args = parser.parse_args(argv)
+
+    pipeline, output = load_recipe(args.recipe)
+    output = args.output or output
+    if not output:
+        parser.error("no output file given in the recipe or with --output")
+
+    pages = pipeline.run(output, progress=lambda i, n, name: print(f"[{i + 1}/{n}] {name}"))
+    print(f"Wrote {pages} pages to {output}")
+
+
+if __name__ == "__main__":
+    main()
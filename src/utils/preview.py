@@ -0,0 +1,186 @@
+import os
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+# Resampling used while the user is navigating or zooming
+FAST_RESAMPLE = Image.Resampling.BILINEAR
+# Resampling used for the final pass once the preview is idle
+QUALITY_RESAMPLE = Image.Resampling.LANCZOS
+
+# Memory budget for decoded previews kept by PreviewCache
+DEFAULT_PREVIEW_CACHE_BYTES = 128 * 1024 * 1024
+
+# Same mapping as the rest of the preview code uses for stored rotations
+_ROTATION_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+
+
+def preview_size(image_size, bounds, zoom=1.0):
+    """
+    Return the size an image is displayed at.
+
+    The image is fitted into `bounds` (never enlarged) and then scaled by
+    the zoom factor.
+    """
+    width, height = image_size
+    bound_width, bound_height = bounds
+    scale = min(bound_width / width, bound_height / height, 1.0) * zoom
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_preview_image(image_path, bounds, rotation=0, zoom=1.0, high_quality=True):
+    """
+    Decode an image at the resolution it is displayed at.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale by 1/2, 1/4 or
+    1/8 while decoding, and other formats are box-reduced by an integer
+    factor before the final resample. A 48 MP photo shown in a 400 px preview
+    therefore never has its full raster resampled.
+
+    Args:
+        image_path: Path to the image file
+        bounds: (width, height) of the preview area
+        rotation: Stored rotation in degrees (0, 90, 180 or 270)
+        zoom: Zoom factor applied on top of fitting the preview area
+        high_quality: Use LANCZOS instead of the cheaper interactive filter
+
+    Returns:
+        PIL Image of the displayed size, rotated
+    """
+    # Size the image in its stored orientation; rotating the small result is cheap
+    if rotation in (90, 270):
+        bounds = (bounds[1], bounds[0])
+
+    with Image.open(image_path) as img:
+        target = preview_size(img.size, bounds, zoom)
+
+        if img.format == "JPEG":
+            img.draft(img.mode, target)
+
+        source = img
+        # Bilevel and palette images can only be resized with NEAREST as they are
+        if img.mode == "1":
+            source = img.convert("L")
+        elif img.mode == "P":
+            source = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        if high_quality:
+            preview = source.resize(target, QUALITY_RESAMPLE, reducing_gap=2.0)
+        else:
+            preview = source.resize(target, FAST_RESAMPLE, reducing_gap=1.0)
+
+    if rotation in _ROTATION_TRANSPOSE:
+        preview = preview.transpose(_ROTATION_TRANSPOSE[rotation])
+    return preview
+
+
+def zoom_bucket(zoom):
+    """Quantize a zoom factor to the 10% steps the viewer zooms in."""
+    return max(1, round(zoom * 10))
+
+
+class PreviewCache:
+    """
+    Thread-safe LRU of decoded previews, bounded by their size in bytes.
+
+    Entries are keyed by (path, mtime, bounds, rotation, zoom bucket, quality),
+    so an image edited on disk or shown differently is decoded again.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_PREVIEW_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_path, bounds, rotation, zoom, high_quality):
+        try:
+            mtime = os.stat(image_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        return (image_path, mtime, tuple(bounds), rotation, zoom_bucket(zoom), high_quality)
+
+    def get(self, key):
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        size = img.width * img.height * len(img.getbands())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old.width * old.height * len(old.getbands())
+            self._entries[key] = img
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= evicted.width * evicted.height * len(evicted.getbands())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+
+def get_preview_image(cache, image_path, bounds, rotation=0, zoom=1.0, high_quality=True):
+    """
+    Return a preview from the cache, decoding and caching it on a miss.
+
+    A cached high quality preview also satisfies a fast request.
+    """
+    quality_key = cache.key(image_path, bounds, rotation, zoom, True)
+    img = cache.get(quality_key)
+    if img is not None:
+        return img
+
+    key = quality_key if high_quality else cache.key(image_path, bounds, rotation, zoom, False)
+    img = cache.get(key)
+    if img is None:
+        img = load_preview_image(image_path, bounds, rotation, zoom_bucket(zoom) / 10, high_quality)
+        cache.put(key, img)
+    return img
+
+
+class PreviewPrefetcher:
+    """
+    Background thread that decodes upcoming previews into a PreviewCache.
+
+    Each request() replaces whatever was still queued, so only the
+    neighbours of the image currently shown are ever fetched.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="preview_prefetch", daemon=True)
+        self._thread.start()
+
+    def request(self, jobs):
+        """Queue (image_path, bounds, rotation, zoom) jobs, dropping older ones."""
+        try:
+            while True:
+                self._jobs.get_nowait()
+        except queue.Empty:
+            pass
+        for job in jobs:
+            self._jobs.put(job)
+
+    def _run(self):
+        while True:
+            image_path, bounds, rotation, zoom = self._jobs.get()
+            try:
+                get_preview_image(self.cache, image_path, bounds, rotation, zoom, True)
+            except Exception as e:
+                logging.warning(f"Could not prefetch preview of {image_path}: {str(e)}")
@@ -0,0 +1,58 @@
+from PyQt6.QtGui import QImage
+
+# PIL modes that map directly onto a QImage format: (raw mode, QImage format, bytes per pixel).
+# Pillow stores RGB pixels in 4 bytes, so exporting them as RGBX is a plain
+# copy of each line instead of a repack to 3 bytes per pixel.
+_QT_FORMATS = {
+    "L": ("L", QImage.Format.Format_Grayscale8, 1),
+    "I;16": ("I;16", QImage.Format.Format_Grayscale16, 2),
+    "RGB": ("RGBX", QImage.Format.Format_RGBX8888, 4),
+    "RGBA": ("RGBA", QImage.Format.Format_RGBA8888, 4),
+    "RGBa": ("RGBa", QImage.Format.Format_RGBA8888_Premultiplied, 4),
+}
+
+
+class _BufferedQImage(QImage):
+    """QImage that keeps the Python buffer it wraps alive for as long as it exists."""
+
+    def __init__(self, buffer, width, height, bytes_per_line, image_format):
+        super().__init__(buffer, width, height, bytes_per_line, image_format)
+        self._buffer = buffer
+
+
+def _displayable(img):
+    """Convert modes without a matching QImage format to the closest one that has one."""
+    if img.mode in _QT_FORMATS:
+        return img
+    if img.mode == "1":
+        return img.convert("L")
+    if img.mode in ("LA", "La", "PA"):
+        return img.convert("RGBA")
+    if img.mode == "P":
+        return img.convert("RGBA" if "transparency" in img.info else "RGB")
+    if img.mode in ("I", "I;16B", "I;16L"):
+        # 16 bit grayscale (e.g. scanner PNGs): keep the high byte
+        return img.convert("I").point(lambda v: v / 256).convert("L")
+    # CMYK, YCbCr, LAB, HSV, ...
+    return img.convert("RGB")
+
+
+def pil_to_qimage(img):
+    """
+    Wrap a PIL image in a QImage without repacking its pixels.
+
+    The pixels are exported once in the layout Qt uses natively and the
+    QImage refers to that buffer directly; the returned image keeps the buffer
+    alive. QImage can be created off the GUI thread, so this is safe to call
+    from background renderers.
+
+    Args:
+        img: PIL Image in any mode; modes Qt cannot show are converted first
+
+    Returns:
+        QImage of the same size
+    """
+    img = _displayable(img)
+    raw_mode, image_format, bytes_per_pixel = _QT_FORMATS[img.mode]
+    buffer = img.tobytes("raw", raw_mode)
+    return _BufferedQImage(buffer, img.width, img.height, img.width * bytes_per_pixel, image_format)
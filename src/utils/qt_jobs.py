@@ -0,0 +1,43 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+from src.utils.orchestrator import OrchestratorThread
+
+
+class JobSignals(QObject):
+    """
+    Run orchestrator jobs (see src.utils.orchestrator) from the GUI and get
+    their events as Qt signals on the GUI thread.
+
+    Signals:
+        queued(job): The job is waiting for a worker
+        started(job): A worker has picked the job up
+        progress(job, stage_index, stage_count, stage_name): A stage is starting
+        finished(job): The job is over; job.state is done, failed, cancelled or expired
+    """
+
+    queued = pyqtSignal(object)
+    started = pyqtSignal(object)
+    progress = pyqtSignal(object, int, int, str)
+    finished = pyqtSignal(object)
+
+    def __init__(self, parent=None, workers=None):
+        super().__init__(parent)
+        self.runner = OrchestratorThread(workers)
+        self.runner.add_listener(self._forward)
+
+    def _forward(self, job, event):
+        # Called on the orchestrator thread; Qt queues the signals to receivers on the GUI thread
+        if event == "progress":
+            self.progress.emit(job, *job.progress)
+        else:
+            getattr(self, event).emit(job)
+
+    def submit(self, job):
+        """Queue an orchestrator Job; returns it"""
+        return self.runner.submit(job)
+
+    def cancel(self, job_id):
+        self.runner.cancel(job_id)
+
+    def shutdown(self):
+        """Cancel the remaining jobs and stop the worker processes"""
+        self.runner.stop()
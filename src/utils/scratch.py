@@ -0,0 +1,124 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+
+# Folder to keep intermediate files in, e.g. a RAM disk; overrides the automatic choice
+SCRATCH_DIR_ENV = "PDF_MANAGER_SCRATCH_DIR"
+
+# Size at which an in-memory scratch file is moved to disk (MB), overrides the default below
+SCRATCH_SPILL_ENV = "PDF_MANAGER_SCRATCH_SPILL_MB"
+
+# Scratch files stay in memory up to this size
+DEFAULT_SPILL_BYTES = 64 * 1024 * 1024
+
+# RAM-backed folders used when they exist and have room
+FAST_SCRATCH_DIRS = ("/dev/shm",)
+
+# A RAM-backed folder is only used while it has at least this much free space,
+# checked when it is chosen and again for every scratch file
+MIN_FAST_SCRATCH_FREE = 512 * 1024 * 1024
+
+_base_dir = None
+_base_lock = threading.Lock()
+
+
+def _usable_dir(path):
+    return os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK)
+
+
+def _choose_base_dir():
+    configured = os.environ.get(SCRATCH_DIR_ENV)
+    if configured:
+        try:
+            os.makedirs(configured, exist_ok=True)
+            if _usable_dir(configured):
+                return os.path.abspath(configured)
+        except OSError as e:
+            logging.warning(f"Cannot use scratch folder {configured}: {str(e)}")
+        logging.warning(f"Scratch folder {configured} is not writable, using the default")
+
+    for path in FAST_SCRATCH_DIRS:
+        try:
+            if _usable_dir(path) and shutil.disk_usage(path).free >= MIN_FAST_SCRATCH_FREE:
+                return path
+        except OSError:
+            continue
+    return tempfile.gettempdir()
+
+
+def scratch_base_dir():
+    """
+    Return the folder scratch files spill to.
+
+    In order of preference: the folder named by PDF_MANAGER_SCRATCH_DIR, a
+    RAM-backed folder such as /dev/shm when it has room, and the system temp
+    folder. The choice is made once per session.
+    """
+    global _base_dir
+    with _base_lock:
+        if _base_dir is None:
+            _base_dir = _choose_base_dir()
+        return _base_dir
+
+
+def spill_threshold():
+    """Return the size in bytes at which scratch files move from memory to disk"""
+    try:
+        return int(float(os.environ[SCRATCH_SPILL_ENV]) * 1024 * 1024)
+    except (KeyError, ValueError):
+        return DEFAULT_SPILL_BYTES
+
+
+def _spill_dir():
+    """
+    Return the folder for the next scratch file spill.
+
+    Spills go to the scratch base while a RAM-backed one still has room;
+    otherwise, and when the base is the system temp folder, they go to the
+    session temp folder on disk.
+    """
+    base = scratch_base_dir()
+    if base in FAST_SCRATCH_DIRS:
+        try:
+            if shutil.disk_usage(base).free >= MIN_FAST_SCRATCH_FREE:
+                return base
+        except OSError:
+            pass
+    elif base != tempfile.gettempdir():
+        return base
+
+    from src.utils.cleanup import session_temp_dir
+    return session_temp_dir()
+
+
+def scratch_file(max_size=None):
+    """
+    Return an anonymous binary scratch file.
+
+    Data is kept in memory until it grows beyond `max_size` bytes
+    (spill_threshold() by default) and then moves to a temporary file (see
+    _spill_dir()), which is deleted when the scratch file is closed.
+    """
+    if max_size is None:
+        max_size = spill_threshold()
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b', dir=_spill_dir())
+
+
+def scratch_dir(prefix="tmp_"):
+    """
+    Create a working folder for the intermediate files of one operation.
+
+    It is made where scratch files spill (see _spill_dir()), so it honours
+    PDF_MANAGER_SCRATCH_DIR and the free space of a RAM-backed folder. The
+    caller removes it.
+    """
+    return tempfile.mkdtemp(prefix=prefix, dir=_spill_dir())
+
+
+def copy_scratch_to(scratch, path):
+    """Write the whole content of a scratch file to `path`"""
+    scratch.seek(0)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(scratch, f, 1024 * 1024)
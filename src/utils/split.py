@@ -2,6 +2,8 @@ import os
 import logging
 from PyQt6.QtWidgets import QFileDialog, QMessageBox, QApplication
 import tempfile
+from collections import namedtuple
+from src.utils import telemetry
 
 def extract_pages(self):
     """Extract pages from the PDF using PyPDF2 with support for complex page ranges"""
@@ -46,6 +48,60 @@ def extract_pages(self):
         QMessageBox.critical(self, "Error", f"Error extracting pages: {str(e)}")
         self.progress_bar.setValue(0)
         
+# Result of parse_pages(): the selected 1-based page numbers in ascending order,
+# warnings about page numbers moved into the document, and the parts that were
+# not page numbers or ranges
+PageSelection = namedtuple("PageSelection", ["pages", "notes", "invalid"])
+
+
+def parse_pages(range_str, max_pages):
+    """
+    Parse a page range string such as "1,3,5-8,10" without any UI.
+
+    Page numbers outside 1..max_pages are moved to the nearest valid page;
+    parts that cannot be read are skipped.
+
+    Args:
+        range_str: String containing page ranges
+        max_pages: Number of pages in the PDF
+
+    Returns:
+        PageSelection
+    """
+    pages = set()
+    notes = []
+    invalid = []
+
+    def clamp(page):
+        if page < 1:
+            notes.append(f"Warning: Page number {page} is less than 1, using 1 instead.")
+            return 1
+        if page > max_pages:
+            notes.append(f"Warning: Page number {page} exceeds maximum of {max_pages}, using {max_pages} instead.")
+            return max_pages
+        return page
+
+    for part in range_str.split(','):
+        part = part.strip()
+
+        # Skip empty parts
+        if not part:
+            continue
+
+        try:
+            # Handle range (e.g., "1-5")
+            if '-' in part:
+                start, end = map(int, part.split('-'))
+                pages.update(range(clamp(start), clamp(end) + 1))
+            # Handle single page
+            else:
+                pages.add(clamp(int(part)))
+        except ValueError:
+            invalid.append(part)
+
+    return PageSelection(sorted(pages), notes, invalid)
+
+
 def parse_page_range(self, range_str, max_pages):
     """
     Parse a page range string into a list of page numbers.
@@ -62,63 +118,17 @@ def parse_page_range(self, range_str, max_pages):
     Returns:
         List of page numbers (1-based indexing)
     """
-    pages = []
-    
-    # Handle empty input
-    if not range_str.strip():
-        return pages
-    
-    # Split by comma
-    parts = range_str.split(',')
-    
-    for part in parts:
-        part = part.strip()
-        
-        # Skip empty parts
-        if not part:
-            continue
-            
-        # Handle range (e.g., "1-5")
+    selection = parse_pages(range_str, max_pages)
+
+    for note in selection.notes:
+        self.status_label.setText(note)
+    for part in selection.invalid:
         if '-' in part:
-            try:
-                start, end = map(int, part.split('-'))
-                
-                # Validate range
-                if start < 1:
-                    self.status_label.setText(f"Warning: Page number {start} is less than 1, using 1 instead.")
-                    start = 1
-                    
-                if end > max_pages:
-                    self.status_label.setText(f"Warning: Page number {end} exceeds maximum of {max_pages}, using {max_pages} instead.")
-                    end = max_pages
-                
-                # Add all pages in the range
-                for page in range(start, end + 1):
-                    if page not in pages:
-                        pages.append(page)
-            except ValueError:
-                QMessageBox.warning(self, "Invalid Range", f"Invalid page range '{part}', skipping.")
-                
-        # Handle single page
+            QMessageBox.warning(self, "Invalid Range", f"Invalid page range '{part}', skipping.")
         else:
-            try:
-                page = int(part)
-                
-                # Validate page number
-                if page < 1:
-                    self.status_label.setText(f"Warning: Page number {page} is less than 1, using 1 instead.")
-                    page = 1
-                    
-                if page > max_pages:
-                    self.status_label.setText(f"Warning: Page number {page} exceeds maximum of {max_pages}, using {max_pages} instead.")
-                    page = max_pages
-                
-                if page not in pages:
-                    pages.append(page)
-            except ValueError:
-                QMessageBox.warning(self, "Invalid Page", f"Invalid page number '{part}', skipping.")
-    
-    return sorted(pages)
+            QMessageBox.warning(self, "Invalid Page", f"Invalid page number '{part}', skipping.")
+
+    return selection.pages
 
 def extract_pages_with_pypdf2(self, input_pdf, output_pdf, page_range):
     """
@@ -136,44 +146,50 @@ def extract_pages_with_pypdf2(self, input_pdf, output_pdf, page_range):
         # Import PyPDF2 here to ensure it's available
         import PyPDF2
         
-        # Open the input PDF
-        with open(input_pdf, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            total_pages = len(pdf_reader.pages)
-            
-            # Parse page range
-            pages_to_extract = self.parse_page_range(page_range, total_pages)
-            
-            if not pages_to_extract:
-                return False, "No valid pages specified for extraction."
-            
-            self.status_label.setText(f"PDF has {total_pages} total pages. Extracting {len(pages_to_extract)} pages...")
-            
-            # Update progress bar
-            self.progress_bar.setValue(20)
-            QApplication.processEvents()  # Keep UI responsive
-            
-            # Create a PDF writer
-            pdf_writer = PyPDF2.PdfWriter()
-            
-            # Add each specified page
-            for i, page_num in enumerate(pages_to_extract):
-                # Convert from 1-based to 0-based indexing
-                pdf_writer.add_page(pdf_reader.pages[page_num - 1])
-                
-                # Update progress (from 20% to 80%)
-                progress = 20 + int(60 * (i + 1) / len(pages_to_extract))
-                self.progress_bar.setValue(progress)
+        with telemetry.operation("split", pages=page_range):
+            telemetry.count("bytes_in", telemetry.file_size(input_pdf))
+
+            # Open the input PDF
+            with open(input_pdf, 'rb') as file:
+                with telemetry.span("open"):
+                    pdf_reader = PyPDF2.PdfReader(file)
+                    total_pages = len(pdf_reader.pages)
+
+                # Parse page range
+                pages_to_extract = self.parse_page_range(page_range, total_pages)
+
+                if not pages_to_extract:
+                    return False, "No valid pages specified for extraction."
+
+                self.status_label.setText(f"PDF has {total_pages} total pages. Extracting {len(pages_to_extract)} pages...")
+
+                # Update progress bar
+                self.progress_bar.setValue(20)
                 QApplication.processEvents()  # Keep UI responsive
-            
-            # Write to the output file
-            with open(output_pdf, 'wb') as output:
-                pdf_writer.write(output)
-            
-            # Final progress update
-            self.progress_bar.setValue(100)
-                
-            return True, f"Successfully extracted {len(pages_to_extract)} pages to {output_pdf}"
+
+                # Create a PDF writer
+                pdf_writer = PyPDF2.PdfWriter()
+
+                # Add each specified page
+                for i, page_num in enumerate(pages_to_extract):
+                    # Convert from 1-based to 0-based indexing
+                    pdf_writer.add_page(pdf_reader.pages[page_num - 1])
+
+                    # Update progress (from 20% to 80%)
+                    progress = 20 + int(60 * (i + 1) / len(pages_to_extract))
+                    self.progress_bar.setValue(progress)
+                    QApplication.processEvents()  # Keep UI responsive
+
+                # Write to the output file
+                telemetry.count("pages", len(pages_to_extract))
+                with telemetry.span("write"), open(output_pdf, 'wb') as output:
+                    pdf_writer.write(output)
+                telemetry.count("bytes_out", telemetry.file_size(output_pdf))
+
+                # Final progress update
+                self.progress_bar.setValue(100)
+
+                return True, f"Successfully extracted {len(pages_to_extract)} pages to {output_pdf}"
                 
     except Exception as e:
         return False, f"Error: {str(e)}"
@@ -218,10 +234,28 @@ def select_pdf_to_split(self):
 
 def count_pages(self, pdf_file):
     """Count the number of pages in a PDF file using multiple methods with fallbacks"""
-    # First try using PyPDF2 as it's the most reliable
+    with telemetry.operation("count_pages"):
+        telemetry.count("bytes_in", telemetry.file_size(pdf_file))
+        page_count = _count_pages(self, pdf_file)
+        telemetry.count("pages", page_count)
+        return page_count
+
+
+def _count_pages(self, pdf_file):
+    # First use the cached page index, which the split preview reuses
+    try:
+        from src.utils.pdf_viewer import page_index
+        with telemetry.span("scan"):
+            page_count = page_index(pdf_file).page_count
+        logging.info(f"Counted {page_count} pages using the page index")
+        return page_count
+    except Exception as index_error:
+        logging.warning(f"Error reading page index: {str(index_error)}")
+
+    # Then try PyPDF2
     try:
         import PyPDF2
-        with open(pdf_file, 'rb') as f:
+        with open(pdf_file, 'rb') as f, telemetry.span("open"):
             pdf_reader = PyPDF2.PdfReader(f)
             page_count = len(pdf_reader.pages)
             logging.info(f"Counted {page_count} pages using PyPDF2")
@@ -231,8 +265,7 @@ def count_pages(self, pdf_file):
         
     # Then try ImageMagick
     try:
-        cmd = f'magick identify -format "%n\n" "{pdf_file}"'
-        result = self.run_imagemagick(cmd)
+        result = self.run_imagemagick(["identify", "-format", "%n\\n", pdf_file])
         
         # Try to parse the output - should be just a number
         if result.stdout.strip():
@@ -244,8 +277,7 @@ def count_pages(self, pdf_file):
                 pass
         
         # If that fails, try counting .pdf[ in the output
-        cmd = f'magick identify "{pdf_file}"'
-        result = self.run_imagemagick(cmd)
+        result = self.run_imagemagick(["identify", pdf_file])
         page_count = result.stdout.count(".pdf[")
         
         # If that also fails, count the number of lines in the output
@@ -295,31 +327,57 @@ def set_page_range(self, range_type):
         logging.error(f"Error setting page range: {str(e)}")
         QMessageBox.warning(self, "Error", f"Could not set page range: {str(e)}")
 
+def add_page_to_range(self, page_number):
+    """Append a page to the page range input unless the range already includes it"""
+    range_text = self.page_range_input.text().strip()
+
+    for part in range_text.split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+                if start <= page_number <= end:
+                    return
+            elif part and int(part) == page_number:
+                return
+        except ValueError:
+            # Leave malformed entries for extract_pages to report
+            continue
+
+    self.page_range_input.setText(f"{range_text},{page_number}" if range_text else str(page_number))
+    self.status_label.setText(f"Added page {page_number} to the page range")
+
 def extract_single_page_with_pypdf2(self, input_pdf, output_pdf, page_number):
     """Extract a single page from a PDF file using PyPDF2"""
     try:
         # Import PyPDF2
         import PyPDF2
         
-        # Open the input PDF
-        with open(input_pdf, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Make sure the page number is valid
-            if page_number < 1 or page_number > len(pdf_reader.pages):
-                return False, f"Page number {page_number} is out of range. The PDF has {len(pdf_reader.pages)} pages."
-            
-            # Create a PDF writer
-            pdf_writer = PyPDF2.PdfWriter()
-            
-            # Add the requested page (convert from 1-based to 0-based indexing)
-            pdf_writer.add_page(pdf_reader.pages[page_number - 1])
-            
-            # Write to the output file
-            with open(output_pdf, 'wb') as output:
-                pdf_writer.write(output)
-                
-            return True, f"Successfully extracted page {page_number}"
+        with telemetry.operation("split", pages=str(page_number)):
+            telemetry.count("bytes_in", telemetry.file_size(input_pdf))
+
+            # Open the input PDF
+            with open(input_pdf, 'rb') as file:
+                with telemetry.span("open"):
+                    pdf_reader = PyPDF2.PdfReader(file)
+
+                # Make sure the page number is valid
+                if page_number < 1 or page_number > len(pdf_reader.pages):
+                    return False, f"Page number {page_number} is out of range. The PDF has {len(pdf_reader.pages)} pages."
+
+                # Create a PDF writer
+                pdf_writer = PyPDF2.PdfWriter()
+
+                # Add the requested page (convert from 1-based to 0-based indexing)
+                pdf_writer.add_page(pdf_reader.pages[page_number - 1])
+
+                # Write to the output file
+                telemetry.count("pages")
+                with telemetry.span("write"), open(output_pdf, 'wb') as output:
+                    pdf_writer.write(output)
+                telemetry.count("bytes_out", telemetry.file_size(output_pdf))
+
+                return True, f"Successfully extracted page {page_number}"
             
     except ImportError:
         return False, "PyPDF2 module is not installed. Please install it using 'pip install PyPDF2'"
@@ -0,0 +1,124 @@
+import time
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QKeySequence, QShortcut
+from PyQt6.QtWidgets import (QDialog, QHBoxLayout, QHeaderView, QLabel, QPushButton,
+                             QTableWidget, QTableWidgetItem, QVBoxLayout)
+from src.utils import telemetry
+
+# Opens the panel; the first time also starts recording operations
+STATS_SHORTCUT = "Ctrl+Shift+I"
+
+_COLUMNS = ["Operation", "Runs", "Errors", "Average", "Last", "Pages", "Images", "Data in", "Data out", "Slowest step"]
+
+
+class StatsPanelSink(QObject):
+    """
+    Telemetry sink that hands reports to the GUI thread.
+
+    Operations may finish on worker threads; the signal is queued to the
+    panel, which lives on the GUI thread.
+    """
+
+    reported = pyqtSignal(dict)
+
+    def record(self, report):
+        self.reported.emit(report)
+
+
+def _format_bytes(size):
+    if size >= 1024 * 1024:
+        return f"{size / 1024 / 1024:.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+class StatsPanel(QDialog):
+    """Table of the operations run in this session, one row per operation"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Statistics")
+        self.resize(820, 260)
+        self.totals = {}  # Operation -> running totals
+
+        layout = QVBoxLayout(self)
+        self.since_label = QLabel(f"Operations since {time.strftime('%H:%M')}")
+        self.since_label.setStyleSheet("color: #757575;")
+        layout.addWidget(self.since_label)
+
+        self.table = QTableWidget(0, len(_COLUMNS))
+        self.table.setHorizontalHeaderLabels(_COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        btn_reset = QPushButton("Reset")
+        btn_reset.clicked.connect(self.reset)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(self.hide)
+        buttons.addStretch()
+        buttons.addWidget(btn_reset)
+        buttons.addWidget(btn_close)
+        layout.addLayout(buttons)
+
+        self.sink = StatsPanelSink(self)
+        self.sink.reported.connect(self.add_report)
+        telemetry.add_sink(self.sink)
+
+    def add_report(self, report):
+        totals = self.totals.setdefault(report["operation"], {
+            "runs": 0, "errors": 0, "seconds": 0.0, "last": 0.0, "spans": {}, "counters": {},
+        })
+        totals["runs"] += 1
+        totals["errors"] += report["status"] != "ok"
+        totals["seconds"] += report["seconds"]
+        totals["last"] = report["seconds"]
+        for name, seconds in report["spans"].items():
+            totals["spans"][name] = totals["spans"].get(name, 0.0) + seconds
+        for name, amount in report["counters"].items():
+            totals["counters"][name] = totals["counters"].get(name, 0) + amount
+        self.refresh()
+
+    def refresh(self):
+        self.table.setRowCount(len(self.totals))
+        for row, (name, totals) in enumerate(sorted(self.totals.items())):
+            counters = totals["counters"]
+            slowest = max(totals["spans"].items(), key=lambda item: item[1], default=None)
+            values = [
+                name,
+                str(totals["runs"]),
+                str(totals["errors"]),
+                f"{totals['seconds'] / totals['runs']:.2f} s",
+                f"{totals['last']:.2f} s",
+                str(counters.get("pages", 0)),
+                str(counters.get("images", 0)),
+                _format_bytes(counters.get("bytes_in", 0)),
+                _format_bytes(counters.get("bytes_out", 0)),
+                f"{slowest[0]} ({slowest[1] / totals['seconds']:.0%})" if slowest and totals["seconds"] else "",
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def reset(self):
+        self.totals.clear()
+        self.since_label.setText(f"Operations since {time.strftime('%H:%M')}")
+        self.refresh()
+
+
+def show_stats_panel(self):
+    """Show the statistics panel, creating it (and so starting to record) on first use"""
+    if getattr(self, 'stats_panel', None) is None:
+        self.stats_panel = StatsPanel(self)
+    self.stats_panel.show()
+    self.stats_panel.raise_()
+
+
+def add_stats_shortcut(self):
+    """Open the statistics panel with STATS_SHORTCUT"""
+    self.stats_shortcut = QShortcut(QKeySequence(STATS_SHORTCUT), self)
+    self.stats_shortcut.activated.connect(lambda: show_stats_panel(self))
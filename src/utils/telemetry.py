@@ -0,0 +1,311 @@
+"""
+Timing and counters for PDF operations, delivered to pluggable sinks.
+
+Each operation (compress, convert, merge, split, ...) is timed as a whole
+and split into named spans - open, scan, decode, encode, write, cleanup -
+with counters such as pages, images, bytes_in and bytes_out:
+
+    with telemetry.operation("compress", level=2):
+        with telemetry.span("open"):
+            pdf = pikepdf.Pdf.open(path)
+        telemetry.count("pages", len(pdf.pages))
+
+Code running inside an operation adds its spans and counters to it without
+being handed anything, including worker threads started with a copy of the
+caller's context (contextvars.copy_context()). A span that runs several
+times, such as encode once per image, is added up. When the operation ends
+its report is passed to every sink: JsonLogSink, PrometheusTextfileSink or
+the in-app panel in src.utils.stats_panel.
+
+With no sink installed - the default - operation() and span() return one
+shared do-nothing context manager, so instrumented code costs a function
+call and a context variable lookup.
+
+Sinks can also be set up from the environment:
+
+    PDF_MANAGER_TELEMETRY=json:/var/log/pdf_manager.jsonl,prometheus:/var/lib/node_exporter/pdf_manager.prom
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+import contextvars
+
+TELEMETRY_ENV = "PDF_MANAGER_TELEMETRY"
+
+_sinks = []
+_current = contextvars.ContextVar("pdf_manager_operation", default=None)
+
+
+class _NullContext:
+    """Stands in for operations and spans while telemetry is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def span(self, name):
+        return self
+
+    def count(self, name, amount=1):
+        pass
+
+
+_NULL = _NullContext()
+
+
+class _Span:
+    __slots__ = ("operation", "name", "started")
+
+    def __init__(self, operation, name):
+        self.operation = operation
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.operation.add_span(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Operation:
+    """
+    One timed run of an operation; use through operation().
+
+    Spans and counters may be added from several threads at once.
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.spans = {}  # Span name -> seconds
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self):
+        self.wall_started = time.time()
+        self.started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        _current.reset(self._token)
+        with self._lock:
+            report = {
+                "operation": self.name,
+                "status": "ok" if exc_type is None else "error",
+                "error": None if exc is None else str(exc),
+                "started": self.wall_started,
+                "seconds": seconds,
+                "spans": dict(self.spans),
+                "counters": dict(self.counters),
+                "attributes": self.attributes,
+            }
+        for sink in list(_sinks):
+            try:
+                sink.record(report)
+            except Exception as e:
+                logging.warning(f"Telemetry sink {type(sink).__name__} failed: {str(e)}")
+        return False
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+def operation(name, **attributes):
+    """Context manager timing one operation; attributes (e.g. level=2) are copied into its report"""
+    if not _sinks:
+        return _NULL
+    return Operation(name, attributes)
+
+
+def span(name):
+    """Context manager timing a part of the current operation"""
+    current = _current.get()
+    return _NULL if current is None else current.span(name)
+
+
+def count(name, amount=1):
+    """Add to a counter of the current operation"""
+    current = _current.get()
+    if current is not None:
+        current.count(name, amount)
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def add_sink(sink):
+    """Install a sink: any object with a record(report) method"""
+    if sink not in _sinks:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def file_size(path):
+    """Size of a file for the bytes counters, 0 if it cannot be read"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+class JsonLogSink:
+    """Append each operation report to a file as one line of JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, report):
+        line = json.dumps(report) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class PrometheusTextfileSink:
+    """
+    Keep running totals and rewrite a Prometheus text file after every
+    operation, for node_exporter's textfile collector.
+
+    Every process writes its own file, with its pid added to the name
+    (pdf_manager.prom -> pdf_manager.1234.prom) and as a pid label: the
+    worker processes of the HTTP service, the watch folder and the
+    orchestrator each inherit the sink, and one shared file would only
+    hold the totals of the last process to write it. Sum over pid to get
+    the totals. Files left by processes that have exited are removed when
+    a sink is created. Each file is replaced atomically, so a scrape never
+    sees half of it.
+    """
+
+    def __init__(self, path):
+        root, ext = os.path.splitext(path)
+        self._root, self._ext = root, ext or ".prom"
+        self._reset()
+        self._remove_stale_files()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker starts its own totals instead of repeating its parent's
+            os.register_at_fork(after_in_child=self._reset)
+
+    @property
+    def path(self):
+        """File written by the current process"""
+        return f"{self._root}.{os.getpid()}{self._ext}"
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._runs = {}  # (operation, status) -> count
+        self._seconds = {}  # operation -> total seconds
+        self._spans = {}  # (operation, span) -> total seconds
+        self._counters = {}  # (counter, operation) -> total
+
+    def _remove_stale_files(self):
+        if os.name != "posix":
+            return
+        folder, prefix = os.path.split(self._root)
+        pattern = re.compile(re.escape(prefix) + r"\.(\d+)" + re.escape(self._ext) + "$")
+        try:
+            names = os.listdir(folder or ".")
+        except OSError:
+            return
+        for name in names:
+            match = pattern.match(name)
+            if match is None or int(match.group(1)) == os.getpid():
+                continue
+            try:
+                os.kill(int(match.group(1)), 0)
+            except ProcessLookupError:
+                try:
+                    os.unlink(os.path.join(folder, name))
+                except OSError:
+                    pass
+            except OSError:
+                pass  # Alive, owned by another user
+
+    def record(self, report):
+        name = report["operation"]
+        with self._lock:
+            key = (name, report["status"])
+            self._runs[key] = self._runs.get(key, 0) + 1
+            self._seconds[name] = self._seconds.get(name, 0.0) + report["seconds"]
+            for span_name, seconds in report["spans"].items():
+                self._spans[(name, span_name)] = self._spans.get((name, span_name), 0.0) + seconds
+            for counter, amount in report["counters"].items():
+                key = (_metric_name(counter), name)
+                self._counters[key] = self._counters.get(key, 0) + amount
+            text = self.render()
+            path = self.path
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+
+    def render(self):
+        pid = f'pid="{os.getpid()}"'
+        lines = ["# TYPE pdf_manager_operations_total counter"]
+        lines += [f'pdf_manager_operations_total{{operation="{name}",status="{status}",{pid}}} {runs}'
+                  for (name, status), runs in sorted(self._runs.items())]
+        lines.append("# TYPE pdf_manager_operation_seconds_total counter")
+        lines += [f'pdf_manager_operation_seconds_total{{operation="{name}",{pid}}} {seconds:.6f}'
+                  for name, seconds in sorted(self._seconds.items())]
+        lines.append("# TYPE pdf_manager_span_seconds_total counter")
+        lines += [f'pdf_manager_span_seconds_total{{operation="{name}",span="{span_name}",{pid}}} {seconds:.6f}'
+                  for (name, span_name), seconds in sorted(self._spans.items())]
+        for counter in sorted({counter for counter, _ in self._counters}):
+            lines.append(f"# TYPE pdf_manager_{counter}_total counter")
+            lines += [f'pdf_manager_{counter}_total{{operation="{name}",{pid}}} {amount}'
+                      for (other, name), amount in sorted(self._counters.items()) if other == counter]
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name).lower()
+
+
+_SINK_TYPES = {"json": JsonLogSink, "prometheus": PrometheusTextfileSink}
+
+
+def configure_from_env(value=None):
+    """
+    Install the sinks listed in PDF_MANAGER_TELEMETRY (or `value`), given
+    as comma separated kind:path entries with kind json or prometheus.
+
+    Returns:
+        List of the sinks installed
+    """
+    value = os.environ.get(TELEMETRY_ENV, "") if value is None else value
+    installed = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        kind, _, path = entry.partition(":")
+        if kind not in _SINK_TYPES or not path:
+            logging.warning(f"Ignoring telemetry sink '{entry}'; expected json:PATH or prometheus:PATH")
+            continue
+        installed.append(add_sink(_SINK_TYPES[kind](path)))
+    return installed
+
+
+configure_from_env()
@@ -0,0 +1,320 @@
+import os
+import hashlib
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from PyQt6.QtCore import QEvent, QObject, QSize, Qt, QThreadPool, QTimer
+from PyQt6.QtGui import QIcon, QPixmap
+from src.utils.background import BackgroundWorker
+from src.utils.qt_image import pil_to_qimage
+
+# Longest side of the thumbnails stored in the disk cache
+THUMBNAIL_SIZE = 96
+
+# Icon size used in list views
+LIST_ICON_SIZE = 48
+
+# Thumbnails kept as icons on list items; rows scrolled far away get their placeholder back
+MAX_LOADED_ICONS = 1000
+
+# Delay used to coalesce scroll/resize/insert events before loading visible thumbnails
+REFRESH_DELAY_MS = 30
+
+# Size of the disk cache; beyond it the least recently used thumbnails are deleted
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# A trim brings the cache down to this fraction of MAX_CACHE_BYTES, so it does not run on every write
+_TRIM_TARGET = 0.8
+
+# Seconds after which a .part file is taken to be left over from an interrupted write
+_STALE_PART_SECONDS = 3600
+
+_trim_lock = threading.Lock()
+_written = {}  # cache_dir -> bytes written since its last trim
+_trimming = set()  # cache_dirs being trimmed
+
+# Item data role holding the path whose thumbnail the item currently shows
+_THUMBNAIL_ROLE = Qt.ItemDataRole.UserRole + 1
+
+
+def default_cache_dir():
+    """Return the persistent thumbnail cache directory (APPDATA/PDF Manager/thumbnails)"""
+    base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    return os.path.join(base, 'PDF Manager', 'thumbnails')
+
+
+def thumbnail_cache_path(cache_dir, source_path, size=THUMBNAIL_SIZE, variant=""):
+    """
+    Return the cache file for a source file's thumbnail.
+
+    The name is derived from the absolute path, modification time and file
+    size, so a changed file gets a new thumbnail; stale entries are never
+    read again and are deleted by trim_cache() once the cache is full.
+    """
+    stat = os.stat(source_path)
+    key = f"{os.path.abspath(source_path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}|{variant}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+
+def trim_cache(cache_dir, max_bytes=None):
+    """
+    Delete the least recently used thumbnails of a cache directory once it
+    holds more than `max_bytes` (default MAX_CACHE_BYTES).
+
+    Thumbnails are touched when they are read, so their modification time
+    tells when they were last used. Leftover .part files of interrupted
+    writes are deleted too.
+
+    Returns:
+        Number of bytes deleted
+    """
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    entries = []
+    total = removed = 0
+    try:
+        with os.scandir(cache_dir) as scan:
+            for entry in scan:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".part"):
+                    if now - stat.st_mtime > _STALE_PART_SECONDS:
+                        entries.append((0, stat.st_size, entry.path))
+                        total += stat.st_size
+                    continue
+                if entry.name.endswith(".png"):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+    except OSError:
+        return 0
+
+    limit = max_bytes if total > max_bytes else None
+    for mtime, size, path in sorted(entries):
+        # Stale .part files sort first and always go
+        if mtime and (limit is None or total - removed <= limit * _TRIM_TARGET):
+            break
+        try:
+            os.unlink(path)
+            removed += size
+        except OSError:
+            pass
+    return removed
+
+
+def _trim_in_background(cache_dir):
+    try:
+        trim_cache(cache_dir)
+    finally:
+        with _trim_lock:
+            _trimming.discard(cache_dir)
+
+
+def _note_written(cache_dir, size):
+    """Start a background trim on the first write to a cache, then after every MAX_CACHE_BYTES / 20 written"""
+    with _trim_lock:
+        written = _written.get(cache_dir)
+        if written is not None and written + size < MAX_CACHE_BYTES // 20:
+            _written[cache_dir] = written + size
+            return
+        _written[cache_dir] = 0
+        if cache_dir in _trimming:
+            return
+        _trimming.add(cache_dir)
+    threading.Thread(target=_trim_in_background, args=(cache_dir,), daemon=True).start()
+
+
+def render_image_thumbnail(image_path, size=THUMBNAIL_SIZE, variant=""):
+    """Decode a small thumbnail of an image file (JPEGs are decoded in draft mode)"""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        if img.format == "JPEG":
+            img.draft(img.mode, (size, size))
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode else "RGB")
+        img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return img.copy()
+
+
+def load_thumbnail(source_path, cache_dir=None, size=THUMBNAIL_SIZE,
+                   render=render_image_thumbnail, variant=""):
+    """
+    Return a thumbnail from the disk cache, rendering and storing it on a miss.
+
+    Args:
+        source_path: File the thumbnail is made from
+        cache_dir: Cache directory, defaults to default_cache_dir()
+        size: Longest side of the thumbnail in pixels
+        render: Callable (source_path, size, variant) -> PIL Image used on a cache miss
+        variant: Extra cache key part passed on to `render`, e.g. the page number of a PDF
+
+    Returns:
+        PIL Image
+    """
+    from PIL import Image
+
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    cache_path = thumbnail_cache_path(cache_dir, source_path, size, variant)
+
+    try:
+        with Image.open(cache_path) as cached:
+            cached.load()
+        try:
+            # Mark the entry as recently used for trim_cache()
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return cached
+    except (OSError, ValueError):
+        pass
+
+    thumbnail = render(source_path, size, variant)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write under a temporary name so a concurrent reader never sees a partial file
+        fd, part_path = tempfile.mkstemp(suffix=".part", dir=cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                thumbnail.save(f, "PNG")
+            size = os.path.getsize(part_path)
+            os.replace(part_path, cache_path)
+        finally:
+            if os.path.exists(part_path):
+                os.unlink(part_path)
+        _note_written(cache_dir, size)
+    except OSError as e:
+        logging.warning(f"Could not cache thumbnail of {source_path}: {str(e)}")
+    return thumbnail
+
+
+def _load_thumbnail_image(source_path, cache_dir, size, render, variant):
+    """Background job: load a thumbnail and wrap it in a QImage"""
+    return pil_to_qimage(load_thumbnail(source_path, cache_dir, size, render, variant))
+
+
+class ThumbnailListLoader(QObject):
+    """
+    Lazily show thumbnails as icons of a QListWidget.
+
+    Only the rows currently visible in the viewport are loaded, on a small
+    dedicated thread pool; queued requests for rows that were scrolled past are
+    dropped. Each row starts with a blank placeholder icon so all rows have the
+    same height and the view can lay out thousands of items without measuring
+    them.
+
+    Args:
+        listbox: QListWidget to decorate
+        path_for_row: Callable row -> source path (or None) for a list row
+        render: Callable (path, size, variant) -> PIL Image used on a cache miss
+        variant_for_row: Optional callable row -> extra cache key part passed to `render`
+        icon_size: Icon size in the list
+        cache_dir: Disk cache directory, defaults to default_cache_dir()
+        max_threads: Threads used to render thumbnails
+    """
+
+    def __init__(self, listbox, path_for_row, render=render_image_thumbnail,
+                 variant_for_row=None, icon_size=LIST_ICON_SIZE, cache_dir=None, max_threads=2):
+        super().__init__(listbox)
+        self.listbox = listbox
+        self.path_for_row = path_for_row
+        self.render = render
+        self.variant_for_row = variant_for_row or (lambda row: "")
+        self.cache_dir = cache_dir or default_cache_dir()
+        self._pending = set()
+        self._loaded = OrderedDict()
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.worker = BackgroundWorker(self, self.pool)
+        self.worker.finished.connect(self._on_thumbnail)
+        self.worker.failed.connect(lambda token, message: self._pending.discard(token))
+
+        placeholder = QPixmap(icon_size, icon_size)
+        placeholder.fill(Qt.GlobalColor.transparent)
+        self._placeholder = QIcon(placeholder)
+
+        listbox.setIconSize(QSize(icon_size, icon_size))
+        listbox.setUniformItemSizes(True)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(REFRESH_DELAY_MS)
+        self._timer.timeout.connect(self.load_visible)
+
+        listbox.viewport().installEventFilter(self)
+        listbox.verticalScrollBar().valueChanged.connect(self.schedule)
+        listbox.model().rowsInserted.connect(self._on_rows_inserted)
+        listbox.model().rowsRemoved.connect(self.schedule)
+        listbox.model().modelReset.connect(self.schedule)
+
+    def schedule(self, *args):
+        """Load the visible thumbnails once the current burst of events is over"""
+        self._timer.start()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Resize:
+            self.schedule()
+        return False
+
+    def _on_rows_inserted(self, parent, first, last):
+        for row in range(first, last + 1):
+            self.listbox.item(row).setIcon(self._placeholder)
+        self.schedule()
+
+    def visible_rows(self):
+        """Return the range of rows currently inside the viewport"""
+        count = self.listbox.count()
+        if count == 0:
+            return range(0)
+        viewport = self.listbox.viewport().rect()
+        first = self.listbox.indexAt(viewport.topLeft()).row()
+        last = self.listbox.indexAt(viewport.bottomLeft()).row()
+        first = max(first, 0)
+        last = count - 1 if last < 0 else last
+        return range(first, last + 1)
+
+    def load_visible(self):
+        """Request thumbnails for visible rows that do not show one yet"""
+        # Anything still queued belongs to rows the user scrolled past
+        self.pool.clear()
+        self._pending.clear()
+
+        for row in self.visible_rows():
+            path = self.path_for_row(row)
+            item = self.listbox.item(row)
+            if path is None or item is None:
+                continue
+            variant = self.variant_for_row(row)
+            if item.data(_THUMBNAIL_ROLE) == (path, variant):
+                continue
+            token = (row, path, variant)
+            if token in self._pending:
+                continue
+            self._pending.add(token)
+            self.worker.submit(token, _load_thumbnail_image, path, self.cache_dir,
+                               THUMBNAIL_SIZE, self.render, variant)
+
+    def _on_thumbnail(self, token, qimage):
+        self._pending.discard(token)
+        row, path, variant = token
+        item = self.listbox.item(row)
+        if item is None or self.path_for_row(row) != path or self.variant_for_row(row) != variant:
+            # The list changed while the thumbnail was loading
+            self.schedule()
+            return
+        item.setIcon(QIcon(QPixmap.fromImage(qimage)))
+        item.setData(_THUMBNAIL_ROLE, (path, variant))
+
+        self._loaded[(path, variant)] = row
+        self._loaded.move_to_end((path, variant))
+        while len(self._loaded) > MAX_LOADED_ICONS:
+            (old_path, old_variant), old_row = self._loaded.popitem(last=False)
+            old_item = self.listbox.item(old_row)
+            if old_item is not None and old_item.data(_THUMBNAIL_ROLE) == (old_path, old_variant):
+                old_item.setIcon(self._placeholder)
+                old_item.setData(_THUMBNAIL_ROLE, None)
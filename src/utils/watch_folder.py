@@ -0,0 +1,475 @@
+"""
+Headless watch-folder mode: convert or compress files dropped into an inbox.
+
+Every PDF put into the inbox is compressed and every image is converted to
+a PDF; the results are written to the outbox. Files still being written are
+left alone until their size and modification time have been stable for a
+while. Work runs on a bounded pool of processes using the pipeline stages
+(src.utils.pipeline), and each result is moved into the outbox in one step,
+so the outbox never holds a partial PDF.
+
+A journal in the outbox records every finished file, so a restarted daemon
+skips work that is already done. When a worker process dies the pool is
+replaced, and the jobs that were in flight run again one at a time, so only
+the file that crashes a worker on its own is recorded as failed. Run it with:
+
+    python -m src.utils.watch_folder INBOX OUTBOX [--recipe recipe.json] [--workers N]
+
+A recipe (see src.utils.pipeline) replaces the default processing; its
+stages run after the dropped file has been opened or converted, e.g.
+[{"stage": "merge", "files": ["cover.pdf"], "position": "start"}].
+"""
+import os
+import sys
+import json
+import time
+import select
+import signal
+import struct
+import logging
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from src.utils.magick import IMAGE_EXTENSIONS
+from src.utils.pipeline import ignore_interrupts
+
+# Seconds a file's size and modification time must stay unchanged before it is processed
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Seconds between inbox scans when inotify is not available
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Journal of processed files, kept in the outbox
+JOURNAL_NAME = ".watch_journal.jsonl"
+
+# Stages run on dropped PDFs when no recipe is given
+DEFAULT_PDF_STAGES = [{"stage": "compress", "level": 2}]
+
+# Names that belong to files still being copied or saved by other programs
+_PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".download", ".partial")
+
+# inotify flags (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Wake up when files in a folder are created, written, closed or moved in (Linux, via ctypes)"""
+
+    def __init__(self, folder):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        mask = _IN_CREATE | _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error), folder)
+
+    def wait(self, timeout):
+        """Block until something changes in the folder or `timeout` seconds pass; returns the changed names"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        names = set()
+        while ready:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if name:
+                    names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PollingWatcher:
+    """Fallback watcher: the inbox is simply rescanned every `interval` seconds"""
+
+    def __init__(self, folder, interval=DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        return set()
+
+    def close(self):
+        pass
+
+
+def make_watcher(folder, polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Return an inotify watcher on Linux, or a polling watcher elsewhere or when inotify fails"""
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify is not available, polling {folder} instead: {str(e)}")
+    return PollingWatcher(folder, poll_interval)
+
+
+class Journal:
+    """
+    Append-only record of processed inbox files.
+
+    Each line is a JSON object with the file's key (name, size and
+    modification time), its status and the output written. A line cut short
+    by a crash is ignored when the journal is read back.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        logging.warning(f"Ignoring damaged journal line in {path}")
+        except FileNotFoundError:
+            pass
+        self._file = open(path, "a", encoding="utf-8")
+
+    def finished(self, key):
+        """Return True when the file was already processed, successfully or not"""
+        return key in self.entries
+
+    def record(self, key, **fields):
+        entry = dict(fields, key=key, time=time.time())
+        self.entries[key] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def file_key(name, stat):
+    """Identify one version of an inbox file; a changed file gets a new key and is processed again"""
+    return f"{name}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def output_name(name, taken=()):
+    """
+    Return the outbox file name for an inbox file.
+
+    Inbox files with the same stem (report.png, report.pdf) would share a
+    name; when the plain name is in `taken` (lower case names) a number is
+    added: "report (2).pdf".
+    """
+    stem = os.path.splitext(name)[0]
+    candidate = stem + ".pdf"
+    number = 2
+    while candidate.lower() in taken:
+        candidate = f"{stem} ({number}).pdf"
+        number += 1
+    return candidate
+
+
+def process_file(source, output, stages):
+    """
+    Worker process job: run the pipeline for one inbox file.
+
+    The result is written next to `output` under a hidden name and renamed
+    into place, so the outbox never shows a half written PDF.
+    """
+    from src.utils.pipeline import Pipeline
+    from src.utils.pdf_stream import open_part_file
+
+    if source.lower().endswith(".pdf"):
+        first = {"stage": "open", "file": source}
+    else:
+        first = {"stage": "convert", "images": [source]}
+
+    # Made with the usual permissions, which the result keeps after the rename
+    f, part = open_part_file(output)
+    f.close()
+    try:
+        pages = Pipeline([first] + list(stages)).run(part)
+        os.replace(part, output)
+    finally:
+        if os.path.exists(part):
+            os.unlink(part)
+    return pages
+
+
+class WatchFolder:
+    """
+    Watch an inbox folder and process the files dropped into it.
+
+    Args:
+        inbox: Folder to watch
+        outbox: Folder the results are written to; it holds the journal too
+        stages: Pipeline stages run after a file is opened or converted;
+            by default PDFs are compressed and images only converted
+        workers: Number of worker processes
+        settle: Seconds a file must stay unchanged before it is processed
+        polling: Scan the inbox periodically instead of using inotify
+    """
+
+    def __init__(self, inbox, outbox, stages=None, workers=None, settle=DEFAULT_SETTLE_SECONDS,
+                 polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.inbox = os.path.abspath(inbox)
+        self.outbox = os.path.abspath(outbox)
+        self.stages = stages
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        # Jobs queued in the pool beyond the running ones; more files wait in the inbox
+        self.max_in_flight = self.workers * 2
+        self.settle = settle
+        self.polling = polling
+        self.poll_interval = poll_interval
+
+        os.makedirs(self.outbox, exist_ok=True)
+        self._remove_partial_results()
+        self.journal = Journal(os.path.join(self.outbox, JOURNAL_NAME))
+        self._seen = {}  # name -> (key, time the key was first seen)
+        self._in_flight = {}  # future -> (name, key, output)
+        # Keys of the jobs in flight when a worker crashed; they are retried one at a time
+        self._suspects = set()
+        # Inbox name -> outbox name it was written to, so a changed file replaces its own result
+        self._outputs = {entry["source"]: entry["output"] for entry in self.journal.entries.values()
+                         if entry.get("output") and entry.get("source")}
+        self._pool = None
+
+    def _remove_partial_results(self):
+        """Delete the hidden .part files a killed daemon left in the outbox"""
+        for name in os.listdir(self.outbox):
+            if name.startswith(".") and name.endswith(".part"):
+                try:
+                    os.unlink(os.path.join(self.outbox, name))
+                    logging.info(f"Removed partial result {name}")
+                except OSError as e:
+                    logging.warning(f"Could not remove partial result {name}: {str(e)}")
+
+    def _stages_for(self, name):
+        if self.stages is not None:
+            return self.stages
+        return DEFAULT_PDF_STAGES if name.lower().endswith(".pdf") else []
+
+    @staticmethod
+    def wanted(name):
+        """Check whether an inbox file name is something the daemon processes"""
+        lower = name.lower()
+        if name.startswith((".", "~")) or lower.endswith(_PARTIAL_SUFFIXES):
+            return False
+        return lower.endswith(".pdf") or lower.endswith(IMAGE_EXTENSIONS)
+
+    def ready_files(self, now=None):
+        """
+        Scan the inbox and return the (name, key) pairs that are ready to process.
+
+        A file is ready once it has kept the same size and modification time
+        for `settle` seconds and has not been processed in that version.
+        """
+        now = time.monotonic() if now is None else now
+        busy = {name for name, _, _ in self._in_flight.values()}
+        ready = []
+        present = set()
+        with os.scandir(self.inbox) as entries:
+            for entry in entries:
+                if not entry.is_file() or not self.wanted(entry.name):
+                    continue
+                present.add(entry.name)
+                try:
+                    key = file_key(entry.name, entry.stat())
+                except FileNotFoundError:
+                    continue
+                if self.journal.finished(key) or entry.name in busy:
+                    continue
+                seen = self._seen.get(entry.name)
+                if seen is None or seen[0] != key:
+                    # New or still changing: start the settle period again
+                    self._seen[entry.name] = (key, now)
+                elif now - seen[1] >= self.settle:
+                    ready.append((entry.name, key))
+
+        # Forget files that were removed from the inbox
+        for name in set(self._seen) - present:
+            del self._seen[name]
+        return sorted(ready)
+
+    def _output_for(self, name):
+        """Pick the outbox name of an inbox file, different from every other file's result"""
+        if name in self._outputs:
+            return self._outputs[name]
+        taken = {entry.lower() for entry in os.listdir(self.outbox)}
+        taken.update(output.lower() for source, output in self._outputs.items() if source != name)
+        taken.update(os.path.basename(output).lower() for _, _, output in self._in_flight.values())
+        return output_name(name, taken)
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+
+    def _submit(self, name, key):
+        output = os.path.join(self.outbox, self._output_for(name))
+        job = (process_file, os.path.join(self.inbox, name), output, self._stages_for(name))
+        try:
+            future = self._pool.submit(*job)
+        except BrokenProcessPool:
+            # A worker died since the last collect
+            self._replace_broken_pool()
+            future = self._pool.submit(*job)
+        self._in_flight[future] = (name, key, output)
+        logging.info(f"Processing {name}")
+
+    def _collect(self, timeout=0):
+        """Record the jobs that finished within `timeout` seconds in the journal"""
+        if not self._in_flight:
+            return
+        done, _ = wait(list(self._in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+            self._replace_broken_pool()
+            return
+        for future in done:
+            self._finish(future)
+
+    def _replace_broken_pool(self):
+        """
+        Start a new pool after a worker process died.
+
+        All the jobs of a broken pool fail, and which one killed the worker
+        is unknown; unless it ran alone, none is journaled and they become
+        suspects, run again one at a time by _fill_pool().
+        """
+        done, _ = wait(list(self._in_flight))
+        crashed = [future for future in done if isinstance(future.exception(), BrokenProcessPool)]
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+        for future in done:
+            self._finish(future, culprit=len(crashed) == 1)
+
+    def _finish(self, future, culprit=True):
+        """Journal a finished job; a job lost with a crashed worker is kept for a retry unless it is the culprit"""
+        name, key, output = self._in_flight.pop(future)
+        try:
+            pages = future.result()
+        except BrokenProcessPool as e:
+            if not culprit:
+                # Still in _seen with the same key, so _fill_pool() submits it again
+                self._suspects.add(key)
+                logging.warning(f"A worker crashed while {name} was in flight, it will be retried")
+                return
+            self._record_failure(name, key, f"The worker process crashed: {str(e)}")
+        except Exception as e:
+            self._record_failure(name, key, str(e))
+        else:
+            self._outputs[name] = os.path.basename(output)
+            self.journal.record(key, source=name, status="done", output=os.path.basename(output), pages=pages)
+            logging.info(f"Wrote {output} ({pages} pages)")
+        self._seen.pop(name, None)
+        self._suspects.discard(key)
+
+    def _record_failure(self, name, key, error):
+        # Recorded so a broken file is not retried until it changes
+        self.journal.record(key, source=name, status="failed", error=error)
+        logging.error(f"Could not process {name}: {error}")
+
+    def _fill_pool(self):
+        ready = self.ready_files()
+        # Suspects whose file changed or disappeared are no longer retried
+        self._suspects.intersection_update(key for key, _ in self._seen.values())
+        for name, key in ready:
+            if self._suspects:
+                # After a crash the suspects run alone until the culprit is found
+                if self._in_flight:
+                    break
+                if key in self._suspects:
+                    self._submit(name, key)
+                continue
+            if len(self._in_flight) >= self.max_in_flight:
+                break
+            self._submit(name, key)
+
+    def run(self, stop=None, once=False):
+        """
+        Process the inbox until `stop` (a threading.Event) is set.
+
+        With once=True the files currently in the inbox are processed
+        (after their settle period) and run() returns.
+        """
+        stop = stop or threading.Event()
+        watcher = make_watcher(self.inbox, self.polling, self.poll_interval)
+        self._pool = self._new_pool()
+        logging.info(f"Watching {self.inbox} with {type(watcher).__name__}, writing to {self.outbox}")
+        try:
+            while not stop.is_set():
+                self._collect()
+                self._fill_pool()
+                if once and not self._in_flight and not self._seen:
+                    break
+                if self._in_flight:
+                    # Wake up for finished jobs as well as for inbox changes
+                    self._collect(timeout=min(self.settle, self.poll_interval) or 0.1)
+                    watcher.wait(0)
+                else:
+                    # While files are settling, look again once their settle period is over
+                    watcher.wait(self.settle if self._seen else 1.0)
+
+            # Jobs that have not started are dropped (they are not in the
+            # journal, so they run after a restart); running ones are finished
+            for future in list(self._in_flight):
+                if future.cancel():
+                    self._in_flight.pop(future)
+            while self._in_flight:
+                self._collect(timeout=None)
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            watcher.close()
+
+    def close(self):
+        self.journal.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert or compress files dropped into a folder")
+    parser.add_argument("inbox", help="Folder to watch")
+    parser.add_argument("outbox", help="Folder to write the results to")
+    parser.add_argument("--recipe", help="JSON or YAML pipeline recipe whose stages are run on every file")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true", help="Scan the inbox periodically instead of using inotify")
+    parser.add_argument("--once", action="store_true", help="Process the files in the inbox, then exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    stages = None
+    if args.recipe:
+        from src.utils.pipeline import load_recipe
+        pipeline, _ = load_recipe(args.recipe)
+        stages = [dict(params, stage=name) for name, params in pipeline.stages]
+
+    daemon = WatchFolder(args.inbox, args.outbox, stages, args.workers, args.settle, args.poll)
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    try:
+        daemon.run(stop, once=args.once)
+    finally:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Image conversion benchmark: Pillow engine against the ImageMagick worker pool.
+
+Converts a batch of synthetic photos with the operations the Convert tab
+uses (rotation, border, paper size, JPEG quality) into one PDF each, and
+reports the time per image and the number of processes started. Run it
+from the repository root:
+
+    python test/benchmark_convert.py [--images N] [--size WxH]
+
+The ImageMagick engine is skipped when ImageMagick is not installed.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+from src.utils import magick  # noqa: E402
+from src.utils.magick import MagickCommand  # noqa: E402
+from src.utils.pillow_ops import render_command  # noqa: E402
+
+_process_starts = 0
+
+
+def _count_processes(event, args):
+    global _process_starts
+    if event in ("subprocess.Popen", "os.system", "os.posix_spawn"):
+        _process_starts += 1
+
+
+def make_images(folder, count, size):
+    """Write `count` noisy JPEG photos of `size` pixels and return their paths"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"photo {i}.jpg")
+        Image.effect_noise(size, 40 + i % 20).convert("RGB").save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def _command(path, i):
+    return (MagickCommand(path).rotate(90 * (i % 4)).border(20)
+            .density(150).page("A4").quality(90))
+
+
+def run_pillow(i, path, out_dir):
+    render_command(_command(path, i), os.path.join(out_dir, f"pillow_{i}.pdf"))
+
+
+def run_magick(i, path, out_dir):
+    magick.run_imagemagick(None, _command(path, i).args(os.path.join(out_dir, f"magick_{i}.pdf")))
+
+
+def measure(engine, paths, out_dir):
+    """Return the seconds spent on each image and the number of processes started"""
+    global _process_starts
+    _process_starts = 0
+    timings = []
+    for i, path in enumerate(paths):
+        started = time.perf_counter()
+        engine(i, path, out_dir)
+        timings.append(time.perf_counter() - started)
+    return timings, _process_starts
+
+
+def magick_available():
+    executable = magick.resolve_magick_executable()
+    return os.path.exists(executable) or shutil.which(executable) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Pillow and ImageMagick conversion engines")
+    parser.add_argument("--images", type=int, default=20, help="Number of images to convert")
+    parser.add_argument("--size", default="2000x1500", help="Size of the synthetic photos")
+    args = parser.parse_args()
+    size = tuple(int(n) for n in args.size.lower().split("x"))
+
+    sys.addaudithook(_count_processes)
+    engines = [("pillow", run_pillow)]
+    if magick_available():
+        engines.append(("magick", run_magick))
+    else:
+        print("ImageMagick not found; only the Pillow engine is measured")
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_images(folder, args.images, size)
+        for name, engine in engines:
+            timings, processes = measure(engine, paths, folder)
+            values = [t * 1000 for t in timings]
+            print(f"{name:>7}: median {statistics.median(values):7.1f} ms/image   "
+                  f"total {sum(values) / 1000:6.2f} s   processes started: {processes}")
+
+
+if __name__ == "__main__":
+    main()
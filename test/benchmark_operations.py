@@ -0,0 +1,582 @@
+"""
+Operations benchmark: merge, split, count_pages, compress and convert on
+generated corpora.
+
+Five corpora are generated from a fixed seed, so every machine measures
+the same documents:
+
+    text_heavy        a few long documents of dense text pages
+    image_heavy       documents of large Flate RGB photos (and the photos as JPEGs)
+    scanned_bilevel   300 dpi Group 4 page scans (and the scans as TIFFs)
+    many_small_files  hundreds of one-page documents
+    one_huge_file     one document with thousands of pages
+
+Each operation, engine and corpus runs in a fresh interpreter, so peak RSS
+and cold imports are measured per engine. The suite reports latency,
+throughput (pages and MB of input per second) and peak RSS, and can save
+them as a baseline and compare later runs with it. Run it from the
+repository root:
+
+    python test/benchmark_operations.py [--operations merge,split] [--scale 0.5]
+    python test/benchmark_operations.py --save-baseline baseline.json
+    python test/benchmark_operations.py --baseline baseline.json [--threshold 0.25]
+
+With --baseline the exit status is 1 when a case got slower, or used more
+memory, by more than the threshold. Differences under 10 ms or 5 MB are
+treated as noise. Baselines are only comparable on the same machine and
+at the same --scale. The ImageMagick convert engine is skipped when
+ImageMagick is not installed.
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Bump when the generated documents change, so old corpora and baselines are not reused
+CORPUS_VERSION = 1
+CORPORA = ("text_heavy", "image_heavy", "scanned_bilevel", "many_small_files", "one_huge_file")
+
+# Differences smaller than these are noise, whatever the threshold
+MIN_SECONDS_DELTA = 0.01
+MIN_RSS_DELTA_MB = 5
+
+_WORDS = ("page", "document", "merge", "split", "compress", "convert", "image", "scan", "report",
+          "invoice", "total", "amount", "section", "figure", "table", "the", "of", "and", "with", "a")
+
+
+def _scaled(count, scale):
+    return max(1, round(count * scale))
+
+
+def _text_page_content(rng, lines=55):
+    """Content stream of one page of dense Helvetica text"""
+    rows = []
+    for _ in range(lines):
+        line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 14)))
+        rows.append(f"({line}) Tj T*")
+    return ("BT /F1 10 Tf 13 TL 50 790 Td\n" + "\n".join(rows) + "\nET").encode("ascii")
+
+
+def write_text_pdf(path, pages, rng):
+    import pikepdf
+
+    pdf = pikepdf.Pdf.new()
+    font = pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Helvetica))
+    for _ in range(pages):
+        pdf.pages.append(pikepdf.Page(pikepdf.Dictionary(
+            Type=pikepdf.Name.Page,
+            MediaBox=[0, 0, 595, 842],
+            Resources=pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font)),
+            Contents=pikepdf.Stream(pdf, _text_page_content(rng)),
+        )))
+    pdf.save(path)
+
+
+def make_photo(size, seed):
+    """A photo-like RGB image: smooth gradients with sensor noise"""
+    from PIL import Image, ImageChops
+
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 25 + seed % 15)
+    red = ImageChops.add(gradient, noise, scale=2)
+    green = gradient.rotate(90 * (seed % 4)).resize(size)
+    blue = ImageChops.add(gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise, scale=2)
+    return Image.merge("RGB", (red, green, blue))
+
+
+def write_image_pdf(path, photos):
+    """A PDF with one page per photo, stored losslessly (Flate) like a scan-to-PDF export"""
+    import pikepdf
+    from PIL import Image
+
+    pdf = pikepdf.Pdf.new()
+    for photo in photos:
+        with Image.open(photo) as img:
+            img = img.convert("RGB")
+            image = pikepdf.Stream(pdf, img.tobytes())
+            image.Type, image.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+            image.Width, image.Height = img.size
+            image.ColorSpace, image.BitsPerComponent = pikepdf.Name.DeviceRGB, 8
+            width, height = img.width * 72 / 150, img.height * 72 / 150
+        pdf.pages.append(pikepdf.Page(pikepdf.Dictionary(
+            Type=pikepdf.Name.Page,
+            MediaBox=[0, 0, width, height],
+            Resources=pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image)),
+            Contents=pikepdf.Stream(pdf, f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q".encode("ascii")),
+        )))
+    pdf.save(path)
+
+
+def write_scan(path, rng):
+    """An A4 page at 300 dpi of black text-like marks, saved as a single-strip Group 4 TIFF like a scanner's"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new("1", (2480, 3508), 1)
+    draw = ImageDraw.Draw(img)
+    y = 250
+    while y < 3250:
+        x = 200
+        while x < 2200:
+            word = rng.randint(40, 220)
+            draw.rectangle([x, y, min(x + word, 2280), y + 28], fill=0)
+            x += word + rng.randint(20, 40)
+        y += rng.randint(55, 75)
+    img.save(path, "TIFF", compression="group4", dpi=(300, 300), strip_size=2 ** 30)
+
+
+def generate_corpora(folder, scale=1.0, seed=1234):
+    """
+    Write the five corpora into `folder` and return their manifest.
+
+    The manifest maps each corpus to its PDFs and source images (paths
+    relative to `folder`), page count and size in bytes. A folder that
+    already holds corpora of the same version, scale and seed is reused.
+    """
+    manifest_path = os.path.join(folder, "manifest.json")
+    settings = {"version": CORPUS_VERSION, "scale": scale, "seed": seed}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings:
+            return manifest
+
+    import pikepdf
+    from src.utils.pipeline import Pipeline
+
+    rng = random.Random(seed)
+    corpora = {}
+
+    def add(name, pdfs, images=()):
+        pdfs, images = list(pdfs), list(images)
+        pages = 0
+        for path in pdfs:
+            with pikepdf.Pdf.open(os.path.join(folder, path)) as pdf:
+                pages += len(pdf.pages)
+        corpora[name] = {
+            "pdfs": pdfs,
+            "images": images,
+            "pages": pages,
+            "bytes": sum(os.path.getsize(os.path.join(folder, p)) for p in pdfs),
+            "image_bytes": sum(os.path.getsize(os.path.join(folder, p)) for p in images),
+        }
+
+    for name in CORPORA:
+        os.makedirs(os.path.join(folder, name), exist_ok=True)
+
+    pdfs = [os.path.join("text_heavy", f"text {i}.pdf") for i in range(_scaled(4, scale))]
+    for path in pdfs:
+        write_text_pdf(os.path.join(folder, path), _scaled(60, scale), rng)
+    add("text_heavy", pdfs)
+
+    photos = []
+    for i in range(_scaled(8, scale)):
+        path = os.path.join("image_heavy", f"photo {i}.jpg")
+        make_photo((1600, 1200), i).save(os.path.join(folder, path), "JPEG", quality=90, dpi=(150, 150))
+        photos.append(path)
+    pdfs = [os.path.join("image_heavy", f"photos {i}.pdf") for i in range(_scaled(3, scale))]
+    for i, path in enumerate(pdfs):
+        # Each document shows the photos in a different order
+        order = photos[i % len(photos):] + photos[:i % len(photos)]
+        write_image_pdf(os.path.join(folder, path), [os.path.join(folder, p) for p in order])
+    add("image_heavy", pdfs, photos)
+
+    scans = []
+    for i in range(_scaled(20, scale)):
+        path = os.path.join("scanned_bilevel", f"scan {i}.tif")
+        write_scan(os.path.join(folder, path), rng)
+        scans.append(path)
+    pdfs = [os.path.join("scanned_bilevel", f"scans {i}.pdf") for i in range(_scaled(2, scale))]
+    for path in pdfs:
+        # Group 4 scans are embedded as they are, like the Convert tab does
+        Pipeline().convert([os.path.join(folder, s) for s in scans]).run(os.path.join(folder, path))
+    add("scanned_bilevel", pdfs, scans)
+
+    pdfs = [os.path.join("many_small_files", f"small {i}.pdf") for i in range(_scaled(200, scale))]
+    for path in pdfs:
+        write_text_pdf(os.path.join(folder, path), 1, rng)
+    add("many_small_files", pdfs)
+
+    pdfs = [os.path.join("one_huge_file", "huge.pdf")]
+    write_text_pdf(os.path.join(folder, pdfs[0]), _scaled(2000, scale), rng)
+    add("one_huge_file", pdfs)
+
+    manifest = {"settings": settings, "corpora": corpora}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Engines: function(paths, out_dir) -> None, run once per measured iteration.
+# Merge and split go through PyPDF2 like the Merge and Split tabs, or through
+# pikepdf like the pipeline, the watch folder and the HTTP service.
+
+def merge_pypdf2(paths, out_dir):
+    import PyPDF2
+
+    # A merge needs two documents; a single one is merged with itself
+    merger = PyPDF2.PdfMerger()
+    for path in paths if len(paths) > 1 else paths * 2:
+        merger.append(path, outline_item=os.path.basename(path))
+    with open(os.path.join(out_dir, "merged.pdf"), "wb") as f:
+        merger.write(f)
+    merger.close()
+
+
+def merge_pikepdf(paths, out_dir):
+    from src.utils.pipeline import Pipeline
+
+    Pipeline().merge(paths if len(paths) > 1 else paths * 2, bookmarks=True).run(
+        os.path.join(out_dir, "merged.pdf"))
+
+
+def _first_half(page_count):
+    return f"1-{max(1, page_count // 2)}"
+
+
+def split_pypdf2(paths, out_dir):
+    import PyPDF2
+    from src.utils.split import parse_pages
+
+    for i, path in enumerate(paths):
+        with open(path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            writer = PyPDF2.PdfWriter()
+            for page in parse_pages(_first_half(len(reader.pages)), len(reader.pages)).pages:
+                writer.add_page(reader.pages[page - 1])
+            with open(os.path.join(out_dir, f"split {i}.pdf"), "wb") as output:
+                writer.write(output)
+
+
+def split_pikepdf(paths, out_dir):
+    import pikepdf
+    from src.utils.pipeline import Pipeline
+
+    for i, path in enumerate(paths):
+        with pikepdf.Pdf.open(path) as pdf:
+            pages = len(pdf.pages)
+        Pipeline().open(path).extract(_first_half(pages)).run(os.path.join(out_dir, f"split {i}.pdf"))
+
+
+def count_page_index(paths, out_dir):
+    from src.utils import pdf_viewer
+
+    # Every iteration reads the page trees again instead of hitting the cache
+    pdf_viewer._page_indexes.clear()
+    for path in paths:
+        pdf_viewer.page_index(path)
+
+
+def count_pypdf2(paths, out_dir):
+    import PyPDF2
+
+    for path in paths:
+        with open(path, "rb") as f:
+            len(PyPDF2.PdfReader(f).pages)
+
+
+def compress_pikepdf(paths, out_dir):
+    from src.utils.compress import direct_compress_pdf
+
+    for i, path in enumerate(paths):
+        direct_compress_pdf(path, os.path.join(out_dir, f"compressed {i}.pdf"), 2)
+
+
+def _convert_command(path):
+    from src.utils.magick import MagickCommand
+
+    return MagickCommand(path).density(150).page("A4").quality(90)
+
+
+def convert_pillow(paths, out_dir):
+    from src.utils.pillow_ops import render_command
+
+    for i, path in enumerate(paths):
+        render_command(_convert_command(path), os.path.join(out_dir, f"converted {i}.pdf"))
+
+
+def convert_magick(paths, out_dir):
+    from src.utils import magick
+
+    for i, path in enumerate(paths):
+        magick.run_imagemagick(None, _convert_command(path).args(os.path.join(out_dir, f"converted {i}.pdf")))
+
+
+def convert_pipeline(paths, out_dir):
+    from src.utils.pipeline import Pipeline
+
+    # One PDF of all images, JPEG and Group 4 sources are embedded without decoding
+    Pipeline().convert(paths).run(os.path.join(out_dir, "converted.pdf"))
+
+
+# Operation -> engine name -> function. Convert reads the corpus images, the others its PDFs.
+ENGINES = {
+    "merge": {"pypdf2": merge_pypdf2, "pikepdf": merge_pikepdf},
+    "split": {"pypdf2": split_pypdf2, "pikepdf": split_pikepdf},
+    "count_pages": {"page_index": count_page_index, "pypdf2": count_pypdf2},
+    "compress": {"pikepdf": compress_pikepdf},
+    "convert": {"pillow": convert_pillow, "magick": convert_magick, "pipeline": convert_pipeline},
+}
+
+
+def magick_available():
+    from src.utils import magick
+
+    executable = magick.resolve_magick_executable()
+    return os.path.exists(executable) or shutil.which(executable) is not None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished child processes, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 / 1024
+        except (ImportError, AttributeError):
+            return None
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, children) / 1024 / 1024
+    # Linux keeps ru_maxrss across fork and exec, so it would include the benchmark parent's
+    # peak; VmHWM is the peak of this process alone
+    try:
+        with open("/proc/self/status", "r") as f:
+            own = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max(own, children) / 1024
+
+
+def run_case(case):
+    """
+    Child process side: run one engine on one corpus and measure it.
+
+    `case` holds the operation, engine, corpus folder, file list and the
+    number of warm-up and measured iterations. Outputs are deleted after
+    every iteration.
+    """
+    from src.utils import telemetry
+
+    class SpanSink:
+        def __init__(self):
+            self.spans = {}
+
+        def record(self, report):
+            for name, seconds in report["spans"].items():
+                self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    engine = ENGINES[case["operation"]][case["engine"]]
+    paths = [os.path.join(case["folder"], p) for p in case["files"]]
+    sink = telemetry.add_sink(SpanSink())
+    timings = []
+    for iteration in range(case["warmup"] + case["repeats"]):
+        out_dir = tempfile.mkdtemp(prefix="pdf-bench-")
+        sink.spans = {}
+        try:
+            started = time.perf_counter()
+            engine(paths, out_dir)
+            elapsed = time.perf_counter() - started
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        if iteration >= case["warmup"]:
+            timings.append(elapsed)
+    return {"seconds": timings, "peak_rss_mb": peak_rss_mb(), "spans": sink.spans}
+
+
+def measure(operation, engine, corpus_name, manifest, folder, repeats=3, warmup=1):
+    """
+    Run one case in a new interpreter and return its result.
+
+    Returns:
+        dict with the median and best latency in seconds, throughput in
+        pages and MB of input per second, peak RSS in MB (None where the
+        platform cannot tell) and the seconds per telemetry span of the
+        last iteration
+    """
+    corpus = manifest["corpora"][corpus_name]
+    files = corpus["images"] if operation == "convert" else corpus["pdfs"]
+    pages = len(files) if operation == "convert" else corpus["pages"]
+    size = corpus["image_bytes"] if operation == "convert" else corpus["bytes"]
+    case = {"operation": operation, "engine": engine, "folder": folder, "files": files,
+            "repeats": repeats, "warmup": warmup}
+
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case)],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{operation}/{engine}/{corpus_name} failed:\n{output.stderr.strip()}")
+    # The operations log some diagnostics of their own; the result is the last line
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+
+    median = statistics.median(result["seconds"])
+    return {
+        "operation": operation,
+        "engine": engine,
+        "corpus": corpus_name,
+        "files": len(files),
+        "pages": pages,
+        "seconds": median,
+        "best_seconds": min(result["seconds"]),
+        "pages_per_second": pages / median if median else None,
+        "mb_per_second": size / 1024 / 1024 / median if median else None,
+        "peak_rss_mb": result["peak_rss_mb"],
+        "spans": result["spans"],
+    }
+
+
+def case_key(result):
+    return f"{result['operation']}/{result['engine']}/{result['corpus']}"
+
+
+def find_regressions(results, baseline, threshold=0.25):
+    """
+    Compare results with a baseline and describe every case that regressed.
+
+    A case regresses when its median latency or its peak RSS grew by more
+    than `threshold` (0.25 = 25%) and by more than MIN_SECONDS_DELTA or
+    MIN_RSS_DELTA_MB. Cases missing from either side are not compared.
+    """
+    previous = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None:
+            continue
+        checks = [("latency", "seconds", MIN_SECONDS_DELTA, "s"),
+                  ("peak RSS", "peak_rss_mb", MIN_RSS_DELTA_MB, " MB")]
+        for label, field, min_delta, unit in checks:
+            old, new = before.get(field), result.get(field)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > min_delta:
+                regressions.append(f"{case_key(result)}: {label} {old:.3f}{unit} -> {new:.3f}{unit} "
+                                   f"(+{(new - old) / old:.0%})")
+    return regressions
+
+
+def environment(scale):
+    """What a baseline was measured with, so comparisons across setups can be refused"""
+    import PIL
+    import pikepdf
+    import PyPDF2
+
+    return {
+        "scale": scale,
+        "corpus_version": CORPUS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "pikepdf": pikepdf.__version__,
+        "PyPDF2": PyPDF2.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def run_suite(folder, operations=None, engines=None, corpora=None, scale=1.0, repeats=3, warmup=1,
+              progress=None):
+    """Generate (or reuse) the corpora in `folder` and measure every selected case"""
+    manifest = generate_corpora(folder, scale)
+    results = []
+    for operation, operation_engines in ENGINES.items():
+        if operations and operation not in operations:
+            continue
+        for engine in operation_engines:
+            if engines and engine not in engines:
+                continue
+            if engine == "magick" and not magick_available():
+                if progress is not None:
+                    progress(f"{operation}/magick skipped: ImageMagick not found")
+                continue
+            for corpus_name in CORPORA:
+                if corpora and corpus_name not in corpora:
+                    continue
+                if operation == "convert" and not manifest["corpora"][corpus_name]["images"]:
+                    continue
+                result = measure(operation, engine, corpus_name, manifest, folder, repeats, warmup)
+                results.append(result)
+                if progress is not None:
+                    progress(format_result(result))
+    return results
+
+
+def format_result(result):
+    rss = f"{result['peak_rss_mb']:7.1f} MB" if result["peak_rss_mb"] is not None else "      n/a"
+    return (f"{result['operation']:>11} {result['engine']:>10} {result['corpus']:>16}: "
+            f"{result['seconds'] * 1000:8.1f} ms  {result['pages_per_second']:8.1f} pages/s  "
+            f"{result['mb_per_second']:7.1f} MB/s  peak {rss}")
+
+
+def _names(value):
+    return [name.strip() for name in value.split(",") if name.strip()] if value else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF operations on generated corpora")
+    parser.add_argument("--operations", help=f"Comma separated subset of: {', '.join(ENGINES)}")
+    parser.add_argument("--engines", help="Comma separated engine names to run, e.g. pikepdf,pillow")
+    parser.add_argument("--corpora", help=f"Comma separated subset of: {', '.join(CORPORA)}")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies the number of files and pages")
+    parser.add_argument("--repeats", type=int, default=3, help="Measured iterations per case")
+    parser.add_argument("--corpus-dir", help="Keep the generated corpora here and reuse them on later runs")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline to this file")
+    parser.add_argument("--baseline", help="Compare with this baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown or memory growth before a case fails (0.25 = 25%%)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["environment"]["scale"] != args.scale:
+            parser.error(f"the baseline was measured at --scale {baseline['environment']['scale']}")
+        if baseline["environment"]["corpus_version"] != CORPUS_VERSION:
+            parser.error("the baseline was measured on an older corpus; save a new one")
+
+    folder = args.corpus_dir or tempfile.mkdtemp(prefix="pdf-bench-corpus-")
+    os.makedirs(folder, exist_ok=True)
+    try:
+        print(f"Generating corpora in {folder}")
+        results = run_suite(folder, _names(args.operations), _names(args.engines), _names(args.corpora),
+                            args.scale, args.repeats, progress=print)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    report = {"environment": environment(args.scale), "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if baseline is None:
+        return 0
+    if baseline["environment"]["platform"] != report["environment"]["platform"]:
+        print("Warning: the baseline was measured on another platform")
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regression(s) past {args.threshold:.0%} against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Startup benchmark: time from interpreter start to the first painted main window.
+
+Each run starts a fresh interpreter, so imports are measured cold (apart from
+the OS file cache). Run it from the repository root:
+
+    python test/benchmark_startup.py [--runs N]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that should only be loaded once a tab or operation needs them
+HEAVY_MODULES = ("pikepdf", "PyPDF2", "PIL", "pymupdf", "fitz", "pdf2image", "PyQt6.QtWebEngineWidgets")
+
+_CHILD = r"""
+import time
+started = time.perf_counter()
+import os, sys, json
+sys.path.insert(0, {root!r})
+from PyQt6.QtWidgets import QApplication, QMessageBox
+
+# Dependency warnings are modal; keep the run unattended
+QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.StandardButton.Ok)
+
+app = QApplication(sys.argv)
+from src.pdf_manage import PdfManager
+imported = time.perf_counter()
+window = PdfManager()
+constructed = time.perf_counter()
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+
+print(json.dumps({{
+    "import": imported - started,
+    "construct": constructed - imported,
+    "show": shown - constructed,
+    "first_window": shown - started,
+    "heavy_modules": sorted(name for name in {heavy!r} if name in sys.modules),
+    "unbuilt_tabs": len(getattr(window, "_tab_setups", ())),
+}}))
+"""
+
+
+def measure_startup(qpa_platform="offscreen"):
+    """
+    Start the application in a new interpreter and return its startup timings.
+
+    Returns:
+        dict with the seconds spent importing, constructing and showing the
+        window, the total time to the first window, the heavy libraries that
+        were loaded and the number of tabs not built yet
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM=qpa_platform)
+    code = _CHILD.format(root=REPO_ROOT, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], env=env, cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    # The application prints some diagnostics of its own; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time-to-first-window")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold starts to measure")
+    parser.add_argument("--platform", default="offscreen", help="QT_QPA_PLATFORM used for the runs")
+    args = parser.parse_args()
+
+    results = [measure_startup(args.platform) for _ in range(args.runs)]
+    for key in ("import", "construct", "show", "first_window"):
+        values = [result[key] * 1000 for result in results]
+        print(f"{key:>13}: median {statistics.median(values):7.1f} ms   "
+              f"min {min(values):7.1f} ms   max {max(values):7.1f} ms")
+    print(f"heavy modules loaded at startup: {', '.join(results[-1]['heavy_modules']) or 'none'}")
+    print(f"tabs deferred until first shown: {results[-1]['unbuilt_tabs']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import pikepdf
+from PIL import Image
+from benchmark_operations import find_regressions, generate_corpora, run_suite
+
+
+def test_corpora_are_generated_once(tmp_path):
+    manifest = generate_corpora(str(tmp_path), scale=0.02)
+    corpora = manifest["corpora"]
+    assert set(corpora) == {"text_heavy", "image_heavy", "scanned_bilevel", "many_small_files", "one_huge_file"}
+    assert corpora["one_huge_file"]["pages"] == 40
+    with Image.open(tmp_path / corpora["scanned_bilevel"]["images"][0]) as scan:
+        assert scan.mode == "1" and scan.info["compression"] == "group4"
+    with pikepdf.Pdf.open(tmp_path / corpora["scanned_bilevel"]["pdfs"][0]) as pdf:
+        assert pdf.pages[0].Resources.XObject.Im0.Filter == pikepdf.Name.CCITTFaxDecode
+
+    # A second run with the same settings reuses the files
+    huge = tmp_path / corpora["one_huge_file"]["pdfs"][0]
+    modified = os.path.getmtime(huge)
+    assert generate_corpora(str(tmp_path), scale=0.02) == manifest
+    assert os.path.getmtime(huge) == modified
+
+
+def test_suite_measures_each_engine(tmp_path):
+    results = run_suite(str(tmp_path), operations=["count_pages", "convert"], engines=["pypdf2", "pipeline"],
+                        corpora=["scanned_bilevel", "many_small_files"], scale=0.02, repeats=1, warmup=0)
+    assert [(r["operation"], r["engine"], r["corpus"]) for r in results] == [
+        ("count_pages", "pypdf2", "scanned_bilevel"),
+        ("count_pages", "pypdf2", "many_small_files"),
+        ("convert", "pipeline", "scanned_bilevel"),
+    ]
+    for result in results:
+        assert result["seconds"] > 0 and result["pages_per_second"] > 0
+        assert result["peak_rss_mb"] is None or result["peak_rss_mb"] > 10
+    # Pipeline runs report their telemetry spans
+    assert "write" in results[2]["spans"]
+
+
+def test_regressions_past_the_threshold_fail():
+    def result(corpus, seconds, rss):
+        return {"operation": "merge", "engine": "pikepdf", "corpus": corpus, "seconds": seconds, "peak_rss_mb": rss}
+
+    baseline = {"results": [result("text_heavy", 1.0, 100), result("one_huge_file", 0.001, 100)]}
+    assert find_regressions([result("text_heavy", 1.2, 120), result("many_small_files", 9.0, 900)], baseline) == []
+
+    regressions = find_regressions([result("text_heavy", 1.5, 200), result("one_huge_file", 0.005, None)], baseline)
+    # The tiny case is noise: it tripled, but by 4 ms
+    assert regressions == ["merge/pikepdf/text_heavy: latency 1.000s -> 1.500s (+50%)",
+                           "merge/pikepdf/text_heavy: peak RSS 100.000 MB -> 200.000 MB (+100%)"]
+    assert len(find_regressions([result("text_heavy", 1.5, 100)], baseline, threshold=0.6)) == 0
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import pytest
+from types import SimpleNamespace
+from src.utils import check_dependencies
+from src.utils.check_dependencies import probe_dependencies
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="uses shell scripts as fake tools")
+
+
+def make_tool(folder, name, output, log):
+    """Create an executable that prints `output` and records every run in `log`"""
+    path = os.path.join(folder, name)
+    with open(path, 'w') as f:
+        f.write(f"#!/bin/sh\necho run >> '{log}'\necho '{output}'\n")
+    os.chmod(path, 0o755)
+    return path
+
+
+def runs(log):
+    if not os.path.exists(log):
+        return 0
+    with open(log) as f:
+        return len(f.readlines())
+
+
+def test_probe_results_are_cached_until_path_or_tools_change(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = str(tmp_path / "runs.log")
+    magick = make_tool(str(bin_dir), "magick", "Version: ImageMagick 7.1.1-21 Q16", log)
+    monkeypatch.setenv("PATH", str(bin_dir))
+    cache = str(tmp_path / "cache" / "dependencies.json")
+    base_dir = str(tmp_path / "app")
+
+    tools = probe_dependencies(base_dir, cache)
+    assert tools["imagemagick"] == {"path": magick, "version": "Version: ImageMagick 7.1.1-21 Q16"}
+    assert tools["poppler"] == {"path": None, "version": None}
+    assert runs(log) == 1
+
+    # A second launch reuses the cached results without running anything
+    assert probe_dependencies(base_dir, cache) == tools
+    assert runs(log) == 1
+
+    # Upgrading the tool changes its mtime
+    os.utime(magick, ns=(0, 0))
+    probe_dependencies(base_dir, cache)
+    assert runs(log) == 2
+
+    # So does changing PATH
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + str(tmp_path))
+    probe_dependencies(base_dir, cache)
+    assert runs(log) == 3
+
+    with open(cache) as f:
+        assert json.load(f)["fingerprint"]["PATH"] == os.environ["PATH"]
+
+
+def test_missing_tools_and_corrupt_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    cache = tmp_path / "dependencies.json"
+    cache.write_text("{not json")
+
+    tools = probe_dependencies(str(tmp_path / "app"), str(cache))
+    assert tools["imagemagick"]["path"] is None
+    assert json.loads(cache.read_text())["tools"] == tools
+
+
+def test_portable_poppler_is_probed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    bin_dir = tmp_path / "app" / "poppler_portable_64" / "library" / "bin"
+    bin_dir.mkdir(parents=True)
+    pdftoppm = make_tool(str(bin_dir), "pdftoppm", "pdftoppm version 24.02.0", str(tmp_path / "runs.log"))
+
+    tools = probe_dependencies(str(tmp_path / "app"), str(tmp_path / "dependencies.json"))
+    assert tools["poppler"] == {"path": pdftoppm, "version": "pdftoppm version 24.02.0"}
+
+
+def test_missing_imagemagick_only_warns_when_it_is_needed(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(check_dependencies.QMessageBox, "warning", lambda *args: warnings.append(args[1]))
+    missing = {"imagemagick": {"path": None, "version": None}}
+
+    window = SimpleNamespace()
+    check_dependencies._on_dependencies_probed(window, missing)
+    assert window.has_imagick is False and warnings == []
+
+    # Choosing the ImageMagick engine warns, once per session
+    window = SimpleNamespace(image_engine=SimpleNamespace(currentText=lambda: "ImageMagick"))
+    check_dependencies._on_dependencies_probed(window, missing)
+    check_dependencies.warn_missing_imagemagick(window)
+    assert warnings == ["ImageMagick Not Found"]
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
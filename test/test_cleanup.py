@@ -0,0 +1,117 @@
+import os
+import sys
+import subprocess
+import pytest
+from src.utils import cleanup
+
+
+@pytest.fixture
+def temp_root(tmp_path, monkeypatch):
+    root = tmp_path / "pdf_manager_test"
+    monkeypatch.setattr(cleanup, "APP_TEMP_ROOT", str(root))
+    monkeypatch.setattr(cleanup, "CLEANUP_REGISTRY_FILE", str(root / "cleanup_registry.txt"))
+    monkeypatch.setattr(cleanup, "LEGACY_CLEANUP_REGISTRY_FILE", str(tmp_path / "legacy.json"))
+    monkeypatch.setattr(cleanup, "_session_dir", None)
+    return root
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_session_temp_dir_is_inside_the_app_root(temp_root):
+    session = cleanup.session_temp_dir()
+    assert os.path.dirname(session) == str(temp_root)
+    assert cleanup.session_temp_dir() == session
+
+    work = cleanup.make_temp_dir(prefix="pdf_convert_")
+    assert os.path.dirname(work) == session
+    assert os.path.basename(work).startswith("pdf_convert_")
+
+
+def test_only_sessions_of_exited_instances_are_removed(temp_root):
+    own = cleanup.session_temp_dir()
+    stale = temp_root / f"session_{dead_pid()}_1700000000"
+    (stale / "pdf_convert_x").mkdir(parents=True)
+    (stale / "pdf_convert_x" / "temp_0.jpg").write_bytes(b"x")
+    unrelated = temp_root / "something_else"
+    unrelated.mkdir()
+
+    assert cleanup.cleanup_stale_sessions() == 1
+    assert not stale.exists()
+    assert os.path.isdir(own) and unrelated.exists()
+
+    cleanup.start_stale_session_cleanup().join(10)
+    assert os.path.isdir(own)
+
+
+def test_exit_cleanup_removes_the_session(temp_root):
+    work = cleanup.make_temp_dir()
+    with open(os.path.join(work, "temp.pdf"), "wb") as f:
+        f.write(b"%PDF")
+    session = os.path.dirname(work)
+
+    assert cleanup.force_cleanup_temp_files() == 1
+    assert not os.path.exists(session)
+    # A later operation in the same run gets a fresh folder
+    assert os.path.isdir(cleanup.session_temp_dir())
+
+
+def test_registry_appends_each_path_once_with_batched_fsync(temp_root, monkeypatch):
+    syncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(cleanup.os, "fsync", lambda fd: (syncs.append(fd), real_fsync(fd)))
+    monkeypatch.setattr(cleanup, "REGISTRY_FSYNC_INTERVAL", 3600)
+
+    paths = [str(temp_root / f"locked_{i}.tmp") for i in range(200)]
+    for path in paths + paths[:50]:
+        cleanup.mark_for_future_cleanup(path)
+
+    with open(cleanup.CLEANUP_REGISTRY_FILE) as f:
+        assert f.read().splitlines() == paths
+    # One fsync per REGISTRY_FSYNC_BATCH new lines, none for duplicates
+    assert len(syncs) == 200 // cleanup.REGISTRY_FSYNC_BATCH
+
+
+def test_deferred_cleanup_compacts_the_registry(temp_root, tmp_path):
+    registry = cleanup.CleanupRegistry(str(tmp_path / "registry.txt"))
+    for name in ("a", "b", "c", "b"):
+        registry.add(str(tmp_path / name))
+
+    assert registry.process(lambda path: not path.endswith("b")) == (2, 1)
+    with open(registry.path) as f:
+        assert f.read().splitlines() == [str(tmp_path / "b")]
+    # Compaction keeps dedup working for the entries still pending
+    assert not registry.add(str(tmp_path / "b"))
+    assert registry.add(str(tmp_path / "d"))
+    registry.close()
+
+
+def test_legacy_json_registry_is_migrated(temp_root, tmp_path):
+    leftover = tmp_path / "pdf_convert_old"
+    leftover.mkdir()
+    (leftover / "temp_0.png").write_bytes(b"x")
+    with open(cleanup.LEGACY_CLEANUP_REGISTRY_FILE, "w") as f:
+        f.write('["%s", "%s"]' % (leftover, tmp_path / "already_gone.pdf"))
+
+    assert cleanup.process_deferred_cleanup() == 2
+    assert not leftover.exists()
+    assert not os.path.exists(cleanup.LEGACY_CLEANUP_REGISTRY_FILE)
+    with open(cleanup.CLEANUP_REGISTRY_FILE) as f:
+        assert f.read() == ""
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
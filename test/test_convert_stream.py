@@ -0,0 +1,89 @@
+import os
+import sys
+import subprocess
+import pytest
+import PyPDF2
+from PIL import Image
+from src.utils.convert_pipeline import PixelBudget, iter_encoded_pages
+from src.utils.pdf_stream import encode_image_file
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Converts the same image `count` times in a fresh interpreter and prints its peak RSS
+MEASURE_SCRIPT = """
+import sys, resource
+from src.utils.convert_pipeline import iter_encoded_pages
+from src.utils.pdf_stream import StreamingPdfWriter, encode_image_file
+
+image_path, output_pdf, count = sys.argv[1], sys.argv[2], int(sys.argv[3])
+with StreamingPdfWriter(output_pdf) as writer:
+    pages = iter_encoded_pages([image_path] * count, lambda i, path: encode_image_file(path))
+    for i, path, page, error in pages:
+        if error is not None:
+            raise error
+        writer.add_encoded(page)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def make_scan(path, size=(2000, 2000)):
+    """Create a large PNG that still compresses well"""
+    gradient = Image.linear_gradient("L").resize(size)
+    Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_90), gradient)).save(path)
+
+
+def peak_rss_kb(image_path, output_pdf, count):
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT, image_path, output_pdf, str(count)],
+        cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
+    )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs the resource module")
+def test_rss_stays_flat_as_batch_grows(tmp_path):
+    image_path = os.path.join(str(tmp_path), "scan.png")
+    make_scan(image_path)
+
+    small = peak_rss_kb(image_path, os.path.join(str(tmp_path), "small.pdf"), 4)
+    large = peak_rss_kb(image_path, os.path.join(str(tmp_path), "large.pdf"), 40)
+
+    assert len(PyPDF2.PdfReader(os.path.join(str(tmp_path), "large.pdf")).pages) == 40
+
+    # Each decoded page is 12 MB; holding the batch would add hundreds of MB
+    assert large - small < 24 * 1024, f"peak RSS grew from {small} KB to {large} KB"
+
+
+def test_pages_come_back_in_order_with_errors(tmp_path):
+    good = os.path.join(str(tmp_path), "good.png")
+    Image.new("RGB", (20, 10)).save(good)
+    missing = os.path.join(str(tmp_path), "missing.png")
+
+    results = list(iter_encoded_pages([good, missing, good],
+                                      lambda i, path: encode_image_file(path), window=3))
+
+    assert [r[0] for r in results] == [0, 1, 2]
+    assert results[0][2].width == 20
+    assert results[1][2] is None and results[1][3] is not None
+    assert results[2][3] is None
+
+
+def test_pixel_budget_clamps_oversized_requests():
+    budget = PixelBudget(100)
+    held = budget.acquire(500)
+    assert held == 100 and budget.in_use == 100
+    budget.release(held)
+    assert budget.in_use == 0
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,184 @@
+import io
+import os
+import json
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+import pikepdf
+import pytest
+from PIL import Image
+from src.utils import http_service
+
+
+def crashing_job(stages, output):
+    """Job that kills its worker process"""
+    os._exit(1)
+
+
+def pdf_bytes(pages):
+    pdf = pikepdf.Pdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+def page_count(data):
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+@pytest.fixture(scope="module")
+def server():
+    service = http_service.make_server("127.0.0.1", 0, workers=1, max_queued=1, max_upload=4 * 1024 * 1024)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    yield service
+    service.shutdown()
+    service.server_close()
+
+
+def request(server, method, path, body=None, headers=None, chunked=False):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=60)
+    connection.request(method, path, body=body, headers=headers or {}, encode_chunked=chunked)
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response, data
+
+
+def multipart(files):
+    boundary = "pdfmanagerboundary"
+    body = b""
+    for name, data in files:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                 f"Content-Type: application/pdf\r\n\r\n").encode() + data + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def test_compress_and_split_stream_the_result_back(server):
+    response, data = request(server, "POST", "/compress?level=3", pdf_bytes(3))
+    assert response.status == 200
+    assert response.getheader("X-Page-Count") == "3"
+    assert page_count(data) == 3
+
+    # A chunked upload, as sent by clients that do not know the size in advance
+    document = pdf_bytes(5)
+    chunks = iter([document[:100], document[100:]])
+    response, data = request(server, "POST", "/split?pages=2-3,5", chunks,
+                             {"Transfer-Encoding": "chunked"}, chunked=True)
+    assert response.status == 200
+    assert page_count(data) == 3
+
+
+def test_merge_and_convert_take_multipart_uploads(server):
+    body, headers = multipart([("a.pdf", pdf_bytes(2)), ("b.pdf", pdf_bytes(1))])
+    response, data = request(server, "POST", "/merge?bookmarks=1", body, headers)
+    assert response.status == 200
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf, pdf.open_outline() as outline:
+        assert len(pdf.pages) == 3
+        assert len(outline.root) == 2
+
+    image = io.BytesIO()
+    Image.new("RGB", (200, 100), (255, 0, 0)).save(image, "PNG")
+    response, data = request(server, "POST", "/convert?paper=A4&dpi=72", image.getvalue())
+    assert response.status == 200
+    with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
+        assert [round(float(v)) for v in pdf.pages[0].MediaBox] == [0, 0, 595, 842]
+
+
+def test_bad_requests_get_client_errors(server):
+    assert request(server, "POST", "/split?pages=1-x", pdf_bytes(2))[0].status == 400
+    assert request(server, "POST", "/compress", b"this is not a PDF")[0].status == 400
+    assert request(server, "POST", "/merge", pdf_bytes(1))[0].status == 400
+    assert request(server, "POST", "/shred", pdf_bytes(1))[0].status == 404
+    assert request(server, "POST", "/compress", b"x", {"Content-Length": str(64 * 1024 * 1024)})[0].status == 413
+
+
+def test_full_queue_is_refused(server):
+    # Occupy the running and the queued slot
+    assert server.admit() and server.admit()
+    try:
+        response, _ = request(server, "POST", "/compress", pdf_bytes(1))
+        assert response.status == 503
+        assert response.getheader("Retry-After")
+    finally:
+        server.release()
+        server.release()
+    assert request(server, "POST", "/compress", pdf_bytes(1))[0].status == 200
+
+
+def test_health_and_metrics(server):
+    response, data = request(server, "GET", "/health")
+    assert response.status == 200
+    assert json.loads(data)["status"] == "ok"
+
+    response, data = request(server, "GET", "/metrics")
+    text = data.decode()
+    assert 'pdf_manager_http_requests_total{endpoint="compress",status="200"}' in text
+    assert "pdf_manager_http_jobs_running 0" in text
+
+
+def test_a_crashed_worker_gets_503_and_a_new_pool(server, monkeypatch):
+    broken = server.pool
+    monkeypatch.setattr(http_service, "run_job", crashing_job)
+    response, data = request(server, "POST", "/compress", pdf_bytes(1))
+    assert response.status == 503 and "crashed" in json.loads(data)["error"]
+    assert server.pool is not broken
+
+    monkeypatch.undo()
+    assert request(server, "POST", "/compress", pdf_bytes(2))[0].status == 200
+    response, data = request(server, "GET", "/health")
+    assert json.loads(data)["pool_restarts"] == 1
+    assert b"pdf_manager_http_pool_restarts_total 1" in request(server, "GET", "/metrics")[1]
+
+
+def test_timed_out_jobs_hold_their_slot_and_folder_until_they_end(monkeypatch):
+    finish = threading.Event()
+    folders = []
+
+    def slow_job(stages, output):
+        folders.append(os.path.dirname(output))
+        finish.wait(30)
+        assert os.path.isdir(folders[0])
+        return 1
+
+    monkeypatch.setattr(http_service, "run_job", slow_job)
+    monkeypatch.setattr(http_service, "JOB_TIMEOUT", 0.2)
+    service = http_service.make_server("127.0.0.1", 0, workers=1, max_queued=0)
+    # A thread pool runs the patched job; a worker process would not see it
+    service.pool.shutdown()
+    service.pool = ThreadPoolExecutor(max_workers=1)
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert request(service, "POST", "/compress", pdf_bytes(1))[0].status == 504
+        # The job still runs: its slot stays taken and its folder stays in place
+        assert service.metrics.active_jobs == 1
+        assert request(service, "POST", "/compress", pdf_bytes(1))[0].status == 503
+        assert os.path.isdir(folders[0])
+
+        finish.set()
+        service.pool.shutdown(wait=True)
+        assert service.metrics.active_jobs == 0
+        assert not os.path.exists(folders[0])
+    finally:
+        finish.set()
+        service.shutdown()
+        service.server_close()
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
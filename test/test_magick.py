@@ -0,0 +1,210 @@
+import sys
+import json
+import shutil
+import threading
+import pytest
+from src.utils import magick
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason="uses a Python script as a fake magick executable")
+
+# Understands just enough of ImageMagick's script syntax to exercise the worker
+# protocol: "(", ")", options with one or two arguments, image reads, -write
+# and -print. stdout is block buffered when piped, like ImageMagick's.
+# 'magick identify ...' prints its arguments as JSON.
+FAKE_MAGICK = r'''#!{python}
+import os, sys, json, shutil
+with open(os.environ["FAKE_MAGICK_LOG"], "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\n")
+if sys.argv[1] == "identify":
+    print(json.dumps(sys.argv[2:]))
+    sys.exit(0)
+assert sys.argv[1:] == ["-script", "-"]
+
+ONE_ARGUMENT = {{"-write", "-delete", "-print", "-rotate", "-quality", "-density", "-border", "-bordercolor",
+                "-units", "-page", "-compress"}}
+TWO_ARGUMENTS = {{"-limit"}}
+
+def tokens(line):
+    token, quoted, escaped = None, False, False
+    for c in line:
+        if escaped:
+            token += c
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == '"':
+            quoted = not quoted
+            token = token or ""
+        elif c.isspace() and not quoted:
+            if token is not None:
+                yield token
+            token = None
+        else:
+            token = (token or "") + c
+    if token is not None:
+        yield token
+
+for line in sys.stdin:
+    images = []
+    args = list(tokens(line))
+    while args:
+        token = args.pop(0)
+        if token in TWO_ARGUMENTS:
+            del args[:2]
+        elif token in ONE_ARGUMENT:
+            value = args.pop(0)
+            if token == "-write" and images:
+                shutil.copyfile(images[-1], value)
+            elif token == "-print":
+                sys.stdout.write(value.replace("\\n", "\n"))
+        elif token == "crash":
+            sys.exit(1)
+        elif not token.startswith("-") and token not in "()":
+            if os.path.exists(token):
+                images.append(token)
+            else:
+                sys.stderr.write(f"magick: unable to open image '{{token}}'\n")
+                sys.stderr.flush()
+'''
+
+
+@pytest.fixture
+def fake_magick(tmp_path, monkeypatch):
+    exe = tmp_path / "magick"
+    exe.write_text(FAKE_MAGICK.format(python=sys.executable))
+    exe.chmod(0o755)
+    log = tmp_path / "starts.log"
+    monkeypatch.setenv("FAKE_MAGICK_LOG", str(log))
+    monkeypatch.setattr(magick, "_executable", str(exe))
+    monkeypatch.setattr(magick, "_pool", None)
+    yield log
+    if magick._pool is not None:
+        magick._pool.close()
+
+
+def starts(log):
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+def test_worker_runs_batches_in_one_process(fake_magick, tmp_path):
+    source = tmp_path / "in put.jpg"
+    source.write_bytes(b"image")
+    worker = magick.MagickWorker(magick.resolve_magick_executable())
+
+    jobs = [[str(source), "-rotate", "90", str(tmp_path / f"out {i}.png")] for i in range(20)]
+    assert worker.run_many(jobs, timeout=10) == [None] * 20
+    assert worker.run([str(source), '-quality', '95', str(tmp_path / 'odd "name".png')], timeout=10) is None
+    assert (tmp_path / 'odd "name".png').read_bytes() == b"image"
+    assert starts(fake_magick) == 1
+    worker.close()
+
+
+def test_worker_reports_errors_and_restarts_after_a_crash(fake_magick, tmp_path):
+    source = tmp_path / "in.jpg"
+    source.write_bytes(b"image")
+    worker = magick.MagickWorker(magick.resolve_magick_executable())
+
+    error = worker.run([str(tmp_path / "missing.jpg"), str(tmp_path / "out.png")], timeout=10)
+    assert "unable to open image" in error
+
+    results = worker.run_many([["crash", str(tmp_path / "a.png")], [str(source), str(tmp_path / "b.png")]],
+                              timeout=10)
+    assert results[0] is not None and results[1].startswith("Not run")
+    assert worker.run([str(source), str(tmp_path / "c.png")], timeout=10) is None
+    assert starts(fake_magick) == 2
+    worker.close()
+
+
+def test_stale_outputs_and_late_errors_are_not_mixed_up(fake_magick, tmp_path):
+    source = tmp_path / "in.jpg"
+    source.write_bytes(b"image")
+    stale = tmp_path / "stale.png"
+    stale.write_bytes(b"from an earlier run")
+    worker = magick.MagickWorker(magick.resolve_magick_executable())
+
+    results = worker.run_many([[str(tmp_path / "missing.jpg"), str(stale)],
+                               [str(source), str(tmp_path / "ok.png")]], timeout=10)
+    assert "unable to open image" in results[0] and not stale.exists()
+    assert results[1] is None
+    worker.close()
+
+
+@pytest.mark.skipif(not shutil.which("magick"), reason="needs ImageMagick 7")
+def test_real_imagemagick_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(magick, "_executable", shutil.which("magick"))
+    stale = tmp_path / "stale.png"
+    stale.write_bytes(b"from an earlier run")
+    worker = magick.MagickWorker(magick.resolve_magick_executable())
+
+    results = worker.run_many([["-size", "20x10", "xc:red", str(tmp_path / "red.png")],
+                               [str(tmp_path / "missing.jpg"), str(stale)],
+                               ["-size", "10x10", "xc:blue", "-rotate", "90", str(tmp_path / "blue.pdf")]], timeout=60)
+    assert results[0] is None and results[2] is None
+    assert results[1] and "missing.jpg" in results[1]
+    assert not stale.exists() and (tmp_path / "blue.pdf").read_bytes().startswith(b"%PDF")
+    worker.close()
+
+
+def test_run_imagemagick_uses_the_shared_pool(fake_magick, tmp_path):
+    source = tmp_path / "in.jpg"
+    source.write_bytes(b"image")
+    for i in range(5):
+        magick.run_imagemagick(None, f'magick "{source}" -rotate 90 -quality 95 "{tmp_path / f"out_{i}.pdf"}"')
+    assert starts(fake_magick) == 1
+
+    with pytest.raises(RuntimeError, match="unable to open image"):
+        magick.run_imagemagick(None, f'magick "{tmp_path / "missing.jpg"}" "{tmp_path / "x.pdf"}"')
+
+
+def test_magick_command_builds_argument_lists():
+    args = (magick.MagickCommand('C:/My Scans/it\'s "1".jpg')
+            .rotate(90).border(20).density(300).page("A4").quality(90).compress("LZW")
+            .args("out.pdf"))
+    assert args == ['C:/My Scans/it\'s "1".jpg', "-rotate", "90", "-bordercolor", "white", "-border", "20",
+                    "-units", "PixelsPerInch", "-density", "300", "-page", "2479x3508",
+                    "-quality", "90", "-compress", "LZW", "out.pdf"]
+
+    # Unset options are left out; frames are selected with ImageMagick's [n] suffix
+    assert magick.MagickCommand("scan.tif", frame=2).rotate(None).border(0).args("p.png") == ["scan.tif[2]", "p.png"]
+    assert magick.MagickCommand("a.jpg").page("A4").args("a.pdf") == ["a.jpg", "-page", "A4", "a.pdf"]
+
+
+def test_thread_budget_is_shared_between_jobs():
+    budget = magick.ThreadBudget(total=4, share=3)
+    with budget.reserve() as first:
+        with budget.reserve() as second:
+            assert (first, second) == (3, 1)
+            released = threading.Event()
+
+            def third_job():
+                with budget.reserve(8) as third:
+                    results.append(third)
+                released.set()
+
+            results = []
+            threading.Thread(target=third_job).start()
+            # No thread is free, so the third job waits
+            assert not released.wait(0.2)
+        assert released.wait(5) and results == [1]
+    with budget.reserve(8) as granted:
+        assert granted == 4
+
+
+def test_run_imagemagick_passes_limits_without_a_shell(fake_magick, tmp_path):
+    pdf = tmp_path / "a; echo $HOME.pdf"
+    result = magick.run_imagemagick(None, ["identify", "-format", "%n\\n", str(pdf)], threads=1)
+    assert json.loads(result.stdout) == magick.limit_args(1) + ["-format", "%n\\n", str(pdf)]
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,163 @@
+import os
+import time
+import asyncio
+import pikepdf
+from PIL import Image
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication
+from src.utils import orchestrator
+from src.utils.orchestrator import Job, JobQueue, Orchestrator, INTERACTIVE, NORMAL, BATCH
+
+_run_job = orchestrator._run_job
+
+
+def crash_on_poison(job_id, slot, stages, output):
+    """Worker side of a job that kills its worker process for outputs named *poison*"""
+    if "poison" in os.path.basename(output):
+        os._exit(1)
+    return _run_job(job_id, slot, stages, output)
+
+
+def make_pdf(path, pages=3):
+    pdf = pikepdf.Pdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    pdf.save(path)
+    return str(path)
+
+
+def split_job(tmp_path, name, **options):
+    source = make_pdf(tmp_path / f"{name}_in.pdf")
+    return Job([{"stage": "open", "file": source}, {"stage": "extract", "pages": "1-2"}],
+               str(tmp_path / f"{name}.pdf"), name=name, **options)
+
+
+def queued(job, submitted=0.0):
+    job.submitted = submitted
+    return job
+
+
+def test_queue_orders_by_priority_and_lets_owners_take_turns():
+    queue = JobQueue(aging=None)
+    for i in range(2):
+        queue.push(queued(Job([], f"batch{i}.pdf", BATCH, owner="nightly")))
+    for i in range(3):
+        queue.push(queued(Job([], f"a{i}.pdf", NORMAL, owner="alice")))
+    queue.push(queued(Job([], "b0.pdf", NORMAL, owner="bob")))
+    queue.push(queued(Job([], "urgent.pdf", INTERACTIVE, owner="alice")))
+
+    order = [queue.pop(now=0).name for _ in range(len(queue))]
+    assert order == ["urgent.pdf", "b0.pdf", "a0.pdf", "a1.pdf", "a2.pdf", "batch0.pdf", "batch1.pdf"]
+    assert queue.pop(now=0) is None
+
+
+def test_waiting_jobs_age_into_higher_priorities():
+    queue = JobQueue(aging=10)
+    queue.push(queued(Job([], "old_batch.pdf", BATCH, owner="nightly"), submitted=0))
+    queue.push(queued(Job([], "new.pdf", NORMAL, owner="alice"), submitted=25))
+    # After 25 seconds the batch job has aged two levels, past the fresh normal job
+    assert queue.pop(now=25).name == "old_batch.pdf"
+
+
+def test_interactive_jobs_overtake_a_queued_batch(tmp_path):
+    started = []
+
+    async def scenario():
+        async with Orchestrator(workers=1, aging=None) as jobs:
+            jobs.listeners.append(lambda job, event: event == "started" and started.append(job.name))
+            batch = [jobs.submit(split_job(tmp_path, f"batch{i}", priority=BATCH, owner="nightly"))
+                     for i in range(3)]
+            urgent = jobs.submit(split_job(tmp_path, "urgent", priority=INTERACTIVE, owner="user"))
+            await jobs.wait(urgent)
+        return batch + [urgent]
+
+    finished = asyncio.run(scenario())
+    assert started == ["batch0", "urgent", "batch1", "batch2"]
+    assert all(job.state == orchestrator.DONE and job.pages == 2 for job in finished)
+    with pikepdf.Pdf.open(tmp_path / "urgent.pdf") as pdf:
+        assert len(pdf.pages) == 2
+
+
+def test_cancelled_and_expired_jobs_do_not_run(tmp_path):
+    async def scenario():
+        async with Orchestrator(workers=1) as jobs:
+            first = jobs.submit(split_job(tmp_path, "first"))
+            cancelled = jobs.submit(split_job(tmp_path, "cancelled"))
+            expired = jobs.submit(split_job(tmp_path, "expired", deadline=0))
+            assert jobs.cancel(cancelled.id)
+            assert not jobs.cancel(cancelled.id)
+        return first, cancelled, expired
+
+    first, cancelled, expired = asyncio.run(scenario())
+    assert (first.state, cancelled.state, expired.state) == ("done", "cancelled", "expired")
+    assert not os.path.exists(cancelled.output) and not os.path.exists(expired.output)
+
+
+def test_running_job_stops_at_the_next_stage(tmp_path):
+    scan = tmp_path / "scan.png"
+    Image.effect_noise((800, 800), 64).convert("RGB").save(scan)
+    stages = [{"stage": "convert", "images": [str(scan)]}] * 40
+    job = Job(stages, str(tmp_path / "out.pdf"))
+    progress = []
+
+    async def scenario():
+        async with Orchestrator(workers=1) as jobs:
+            def listener(event_job, event):
+                if event == "progress":
+                    progress.append(event_job.progress[0])
+                    jobs.cancel(event_job.id)
+            jobs.listeners.append(listener)
+            jobs.submit(job)
+
+    asyncio.run(scenario())
+    assert job.state == orchestrator.CANCELLED
+    assert len(progress) < len(stages)
+    assert not os.path.exists(job.output)
+
+
+def test_a_crashing_job_fails_alone_and_the_others_run_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "_run_job", crash_on_poison)
+
+    async def scenario():
+        async with Orchestrator(workers=2, aging=None) as jobs:
+            submitted = [jobs.submit(split_job(tmp_path, name)) for name in ("poison", "a", "b")]
+        return submitted
+
+    poison, a, b = asyncio.run(scenario())
+    assert poison.state == orchestrator.FAILED and "crashed" in poison.error
+    assert (a.state, a.pages, b.state, b.pages) == (orchestrator.DONE, 2, orchestrator.DONE, 2)
+
+
+def test_qt_signals_report_progress_on_the_gui_thread(tmp_path):
+    from src.utils.qt_jobs import JobSignals
+
+    app = QApplication.instance() or QApplication([])
+    signals = JobSignals(workers=1)
+    events = []
+    signals.started.connect(lambda job: events.append("started"))
+    signals.progress.connect(lambda job, index, count, name: events.append(name))
+    signals.finished.connect(lambda job: events.append(job.state))
+
+    signals.submit(split_job(tmp_path, "gui"))
+    deadline = time.time() + 30
+    while "done" not in events and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    signals.shutdown()
+
+    assert events == ["started", "open", "extract", "done"]
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,122 @@
+import os
+import sys
+import PyPDF2
+import pikepdf
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from src.utils.pdf_stream import StreamingPdfWriter, encode_ccitt_frame
+from src.utils.convert_pipeline import iter_image_frames
+
+
+def make_images(folder):
+    """Create one JPEG, one PNG and one transparent PNG to convert"""
+    jpeg = os.path.join(folder, "photo.jpg")
+    Image.new("RGB", (200, 100), (200, 30, 30)).save(jpeg, dpi=(144, 144))
+
+    png = os.path.join(folder, "scan.png")
+    Image.new("L", (72, 144), 128).save(png)
+
+    rgba = os.path.join(folder, "logo.png")
+    Image.new("RGBA", (50, 50), (0, 0, 255, 128)).save(rgba)
+    return [jpeg, png, rgba]
+
+
+def test_streaming_writer_creates_one_page_per_image(tmp_path):
+    images = make_images(str(tmp_path))
+    output_pdf = os.path.join(str(tmp_path), "out.pdf")
+
+    with StreamingPdfWriter(output_pdf) as writer:
+        for image in images:
+            writer.add_image_file(image)
+
+    reader = PyPDF2.PdfReader(output_pdf)
+    assert len(reader.pages) == 3
+
+    # Page size follows the image resolution (200px at 144 DPI = 100pt)
+    box = reader.pages[0].mediabox
+    assert round(float(box.width)) == 100
+    assert round(float(box.height)) == 50
+
+    # No partial files are left next to the output
+    assert sorted(os.listdir(str(tmp_path))) == sorted(["out.pdf"] + [os.path.basename(i) for i in images])
+
+
+def test_streaming_writer_abort_leaves_nothing(tmp_path):
+    output_pdf = os.path.join(str(tmp_path), "out.pdf")
+
+    try:
+        with StreamingPdfWriter(output_pdf) as writer:
+            writer.add_image(Image.new("RGB", (10, 10)))
+            raise ValueError("conversion failed")
+    except ValueError:
+        pass
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permission bits")
+def test_streaming_writer_output_gets_the_usual_permissions(tmp_path):
+    output_pdf = os.path.join(str(tmp_path), "out.pdf")
+    umask = os.umask(0o027)
+    try:
+        with StreamingPdfWriter(output_pdf) as writer:
+            writer.add_image(Image.new("RGB", (10, 10)))
+    finally:
+        os.umask(umask)
+    assert os.stat(output_pdf).st_mode & 0o777 == 0o640
+
+
+def make_fax(path, strip_size=2 ** 30):
+    """Create a two page CCITT Group 4 TIFF"""
+    page = Image.new("1", (1728, 2200), 1)
+    ImageDraw.Draw(page).rectangle((100, 100, 800, 400), fill=0)
+    page.save(path, compression="group4", save_all=True,
+              append_images=[page.rotate(90, expand=True)], strip_size=strip_size)
+    return page
+
+
+def test_group4_frames_are_embedded_without_decoding(tmp_path):
+    fax = os.path.join(str(tmp_path), "fax.tif")
+    first_page = make_fax(fax)
+    output_pdf = os.path.join(str(tmp_path), "fax.pdf")
+
+    frames = list(iter_image_frames([fax]))
+    assert [f.frame for f in frames] == [0, 1]
+    assert all(f.passthrough for f in frames)
+
+    with StreamingPdfWriter(output_pdf) as writer:
+        for frame in frames:
+            writer.add_encoded(encode_ccitt_frame(frame.path, frame.frame), rotate=90, margin=10)
+
+    with pikepdf.open(output_pdf) as pdf:
+        assert len(pdf.pages) == 2
+        assert pdf.pages[0].Rotate == 90
+        image = pdf.pages[0].Resources.XObject.Im0
+        assert image.Filter == pikepdf.Name.CCITTFaxDecode
+
+        # The embedded stream decodes back to the original page
+        decoded = pikepdf.PdfImage(image).as_pil_image().convert("L")
+        assert ImageChops.difference(decoded, first_page.convert("L")).getbbox() is None
+
+
+def test_multi_strip_group4_frames_fall_back_to_decoding(tmp_path):
+    fax = os.path.join(str(tmp_path), "fax.tif")
+    make_fax(fax, strip_size=65536)
+
+    frames = list(iter_image_frames([fax]))
+    assert not any(f.passthrough for f in frames)
+    assert encode_ccitt_frame(fax, 1).filter_name == "/FlateDecode"
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import pikepdf
+from PIL import Image
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication
+from functools import partial
+from src.utils import pdf_viewer
+from src.utils.check_dependencies import find_pdftoppm
+from src.utils.pdf_viewer import (PageIndex, PdfPageView, Pdf2ImageRenderer, PyMuPdfRenderer, TileCache,
+                                  default_renderer, page_index, read_page_sizes, render_page_thumbnail)
+from src.utils.thumbnails import load_thumbnail
+
+app = QApplication.instance() or QApplication([])
+
+
+class FakeRenderer:
+    """Renders every page as a flat colour and records what was asked for"""
+
+    def __init__(self):
+        self.calls = []
+
+    def render_page(self, pdf_path, page_number, dpi):
+        self.calls.append((page_number, dpi))
+        width, height = read_page_sizes(pdf_path)[page_number - 1]
+        return Image.new("RGB", (round(width * dpi / 72), round(height * dpi / 72)), (255, 0, 0))
+
+
+def make_pdf(path, pages=20):
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page(page_size=(612, 792))
+    pdf.pages[1].Rotate = 90
+    pdf.save(path)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def test_page_sizes_follow_rotation(tmp_path):
+    pdf_path = os.path.join(str(tmp_path), "doc.pdf")
+    make_pdf(pdf_path, pages=2)
+
+    assert read_page_sizes(pdf_path) == [(612, 792), (792, 612)]
+
+
+def test_only_visible_pages_are_rendered(tmp_path):
+    pdf_path = os.path.join(str(tmp_path), "doc.pdf")
+    make_pdf(pdf_path)
+    renderer = FakeRenderer()
+    view = PdfPageView(renderer=renderer)
+    view.resize(600, 400)
+    view.show()
+
+    view.load(pdf_path)
+    assert view.page_count() == 20 and view.current_page() == 1
+
+    view.viewport().repaint()
+    wait_for(lambda: view.tile_cache.size_bytes > 0)
+    assert [page for page, dpi in renderer.calls] == [1]
+
+    # Navigation is real and bounded by the document
+    view.go_to_page(50)
+    assert view.current_page() == 20
+    view.go_to_page(5)
+    view.viewport().repaint()
+    wait_for(lambda: len(renderer.calls) > 1)
+    assert renderer.calls[-1][0] == 5
+
+
+def test_page_index_is_cached_per_document_version(tmp_path):
+    pdf_path = os.path.join(str(tmp_path), "doc.pdf")
+    make_pdf(pdf_path, pages=3)
+
+    index = page_index(pdf_path)
+    assert page_index(pdf_path) is index
+    assert index.page_count == 3
+
+    # Offsets accumulate page heights plus the gaps between pages
+    layout = index.layout(72)
+    assert layout.sizes[:2] == [(612, 792), (792, 612)]
+    assert layout.tops == [12, 12 + 792 + 12, 12 + 792 + 12 + 612 + 12]
+    assert index.layout(72) is layout
+    assert PageIndex.page_at(layout, 820) == 1
+
+    make_pdf(pdf_path, pages=5)
+    os.utime(pdf_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert page_index(pdf_path).page_count == 5
+
+
+def test_page_thumbnails_render_at_low_dpi_and_are_cached(tmp_path):
+    pdf_path = os.path.join(str(tmp_path), "doc.pdf")
+    make_pdf(pdf_path, pages=3)
+    cache_dir = os.path.join(str(tmp_path), "thumbnails")
+    renderer = FakeRenderer()
+    render = partial(render_page_thumbnail, renderer)
+
+    thumbnail = load_thumbnail(pdf_path, cache_dir, 96, render, "2")
+    assert thumbnail.size == (96, 74)
+    assert renderer.calls == [(2, 96 * 72 / 792)]
+
+    load_thumbnail(pdf_path, cache_dir, 96, render, "2")
+    assert len(renderer.calls) == 1
+
+
+def test_tile_cache_is_bounded_in_bytes():
+    from PyQt6.QtGui import QImage
+    tile = QImage(256, 256, QImage.Format.Format_RGBX8888)
+    cache = TileCache(max_bytes=3 * tile.sizeInBytes())
+    for key in range(5):
+        cache.put(key, tile)
+
+    assert cache.size_bytes == 3 * tile.sizeInBytes()
+    assert cache.get(0) is None and cache.get(4) is not None
+
+
+def test_portable_poppler_is_used_when_pdftoppm_is_not_on_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    app_dir = tmp_path / "app"
+    bin_dir = app_dir / "poppler_portable_64" / "library" / "bin"
+    bin_dir.mkdir(parents=True)
+    assert find_pdftoppm(str(app_dir)) is None
+
+    pdftoppm = bin_dir / ("pdftoppm.exe" if sys.platform == "win32" else "pdftoppm")
+    pdftoppm.write_bytes(b"")
+    renderer = default_renderer(find_pdftoppm(str(app_dir)))
+    assert isinstance(renderer, Pdf2ImageRenderer) and renderer.poppler_path == str(bin_dir)
+
+    # PyMuPDF only takes over when poppler really is missing
+    monkeypatch.setattr(pdf_viewer, "HAS_PYMUPDF", True)
+    assert isinstance(default_renderer(None), PyMuPdfRenderer)
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,94 @@
+import re
+import sys
+import pytest
+from PIL import Image
+from src.utils import pillow_ops
+from src.utils.magick import MagickCommand
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (300, 200), (200, 30, 30)).save(path, "JPEG", dpi=(100, 100))
+    return str(path)
+
+
+def test_rotation_and_border_match_imagemagick(photo):
+    img = pillow_ops.apply_command(MagickCommand(photo).rotate(90).border(10))
+    assert img.size == (220, 320)
+    assert img.getpixel((0, 0)) == (255, 255, 255)
+
+    # Other angles expand the canvas and fill the corners with white
+    tilted = pillow_ops.rotate_image(Image.new("1", (100, 100), 0), 45)
+    assert tilted.mode == "L" and tilted.width > 100 and tilted.getpixel((0, 0)) == 255
+
+
+def test_fit_to_paper_centers_and_shrinks(photo):
+    page = pillow_ops.fit_to_paper(Image.new("RGB", (3000, 1000), (0, 0, 0)), "A4", 72)
+    assert page.size == (595, 842)
+    assert page.getpixel((297, 421)) == (0, 0, 0)
+    assert page.getpixel((297, 10)) == (255, 255, 255)
+
+    small = Image.new("L", (10, 10), 0)
+    assert pillow_ops.fit_to_paper(small, "Tabloid", 150) is small
+
+
+def test_render_command_writes_a_page_of_the_paper_size(photo, tmp_path):
+    output = tmp_path / "out.pdf"
+    pillow_ops.render_command(MagickCommand(photo).rotate(90).density(150).page("Letter").quality(90),
+                              str(output))
+    media_box = re.search(rb"/MediaBox \[0 0 ([\d.]+) ([\d.]+)\]", output.read_bytes())
+    assert (round(float(media_box.group(1))), round(float(media_box.group(2)))) == (612, 792)
+    assert b"/DCTDecode" in output.read_bytes()
+
+    lossless = tmp_path / "lossless.pdf"
+    pillow_ops.render_command(MagickCommand(photo).density(150).page("A4").compress("LZW"), str(lossless))
+    assert b"/FlateDecode" in lossless.read_bytes()
+
+
+def test_unchanged_jpeg_is_embedded_as_is(photo):
+    with open(photo, "rb") as f:
+        data = f.read()
+    page = pillow_ops.encode_command(MagickCommand(photo).quality(95))
+    assert page.data == data and page.dpi == (100, 100)
+
+
+def test_engine_selection(tmp_path, monkeypatch, photo):
+    unknown = tmp_path / "drawing.svg"
+    unknown.write_text("<svg/>")
+    monkeypatch.delenv(pillow_ops.IMAGE_ENGINE_ENV, raising=False)
+    assert pillow_ops.image_engine() == "auto"
+    assert pillow_ops.use_pillow("auto", photo)
+    assert not pillow_ops.use_pillow("auto", str(unknown))
+    assert not pillow_ops.use_pillow("magick", photo)
+
+    monkeypatch.setenv(pillow_ops.IMAGE_ENGINE_ENV, "Pillow")
+    assert pillow_ops.image_engine() == "pillow"
+
+
+def test_pillow_conversions_start_no_processes(photo, tmp_path):
+    started = []
+
+    def audit(event, args):
+        if event in ("subprocess.Popen", "os.system", "os.posix_spawn"):
+            started.append(args)
+
+    sys.addaudithook(audit)
+    pillow_ops.render_command(MagickCommand(photo).rotate(180).border(5).density(72).page("A4"),
+                              str(tmp_path / "a.pdf"))
+    pillow_ops.render_command(MagickCommand(photo).rotate(30), str(tmp_path / "a.png"))
+    assert started == []
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,107 @@
+import os
+import json
+import pikepdf
+import pytest
+from PIL import Image
+from src.utils import pipeline
+from src.utils.split import parse_pages
+
+
+def make_pdf(path, pages, width=200):
+    pdf = pikepdf.Pdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page(page_size=(width, 300))
+    pdf.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def scans(tmp_path):
+    paths = []
+    for i, (mode, name) in enumerate([("RGB", "photo.jpg"), ("1", "fax.tif")]):
+        path = tmp_path / name
+        img = Image.new(mode, (400, 300), (90, 120, 200) if mode == "RGB" else 1)
+        if mode == "1":
+            img.save(path, compression="group4", dpi=(200, 200))
+        else:
+            img.save(path, dpi=(100, 100))
+        paths.append(str(path))
+    return paths
+
+
+def test_parse_pages_is_pure():
+    selection = parse_pages("5-3, 2, x, 0, 9-12, 2", 10)
+    assert selection.pages == [1, 2, 9, 10]
+    assert selection.invalid == ["x"]
+    assert len(selection.notes) == 2
+
+
+def test_convert_compress_merge_extract_write_once(tmp_path, scans):
+    cover = make_pdf(tmp_path / "cover.pdf", 2, width=100)
+    output = tmp_path / "out.pdf"
+
+    pages = (pipeline.Pipeline()
+             .convert(scans)
+             .compress(2)
+             .merge([cover], position="start", bookmarks=True)
+             .extract("2-4")
+             .run(str(output)))
+
+    assert pages == 3
+    with pikepdf.Pdf.open(output) as pdf:
+        widths = [float(page.MediaBox[2]) for page in pdf.pages]
+        assert widths == [100, pytest.approx(288), pytest.approx(144)]
+        # The fax page was copied without being decoded
+        image = pdf.pages[2].Resources.XObject.Im0
+        assert image.Filter == "/CCITTFaxDecode"
+        with pdf.open_outline() as outline:
+            assert [item.title for item in outline.root] == ["cover.pdf"]
+
+
+def test_recipe_paths_are_relative_to_the_recipe(tmp_path, scans):
+    os.makedirs(tmp_path / "recipes")
+    make_pdf(tmp_path / "recipes" / "base.pdf", 3)
+    recipe = tmp_path / "recipes" / "job.json"
+    recipe.write_text(json.dumps({
+        "output": "result.pdf",
+        "stages": [
+            {"stage": "open", "file": "base.pdf"},
+            {"stage": "convert", "images": [scans[0]], "paper": "A4", "dpi": 72},
+            {"stage": "extract", "pages": "1,4"},
+        ],
+    }))
+
+    job, output = pipeline.load_recipe(str(recipe))
+    assert output == str(tmp_path / "recipes" / "result.pdf")
+    assert job.run(output) == 2
+    with pikepdf.Pdf.open(output) as pdf:
+        assert [round(float(page.MediaBox[3])) for page in pdf.pages] == [300, 842]
+
+
+def test_output_may_replace_an_input(tmp_path):
+    path = make_pdf(tmp_path / "doc.pdf", 4)
+    assert pipeline.Pipeline().open(path).extract("1-2").run(path) == 2
+    with pikepdf.Pdf.open(path) as pdf:
+        assert len(pdf.pages) == 2
+
+
+def test_bad_recipes_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unknown pipeline stage"):
+        pipeline.Pipeline([{"stage": "shred"}])
+    with pytest.raises(ValueError, match="Invalid page range"):
+        pipeline.Pipeline().open(make_pdf(tmp_path / "a.pdf", 2)).extract("1-x").run(str(tmp_path / "b.pdf"))
+    assert not (tmp_path / "b.pdf").exists()
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
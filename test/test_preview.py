@@ -0,0 +1,82 @@
+import os
+import time
+from PIL import Image
+from src.utils.preview import (preview_size, load_preview_image, PreviewCache,
+                               PreviewPrefetcher, get_preview_image)
+
+
+def test_preview_size_fits_without_enlarging():
+    assert preview_size((4000, 3000), (400, 400)) == (400, 300)
+    assert preview_size((200, 100), (400, 400)) == (200, 100)
+    assert preview_size((4000, 3000), (400, 400), zoom=2.0) == (800, 600)
+
+
+def test_large_jpeg_is_decoded_at_display_size(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.jpg")
+    Image.new("RGB", (4000, 3000), (10, 120, 200)).save(photo, quality=90)
+
+    fast = load_preview_image(photo, (400, 300), high_quality=False)
+    assert fast.size == (400, 300)
+
+    # Rotated previews are fitted in their displayed orientation
+    rotated = load_preview_image(photo, (400, 300), rotation=90)
+    assert rotated.size == (225, 300)
+
+
+def test_palette_images_are_resampled_in_colour(tmp_path):
+    gif = os.path.join(str(tmp_path), "logo.gif")
+    Image.new("RGB", (100, 100), (255, 0, 0)).convert("P").save(gif)
+
+    assert load_preview_image(gif, (50, 50)).mode == "RGB"
+
+
+def test_preview_cache_is_bounded_in_bytes():
+    cache = PreviewCache(max_bytes=3 * 100 * 100 * 3)
+    for name in "abcd":
+        cache.put((name,), Image.new("RGB", (100, 100)))
+
+    # The least recently used entry was evicted to stay within budget
+    assert cache.get(("a",)) is None
+    assert cache.get(("d",)) is not None
+    assert cache.size_bytes == 3 * 100 * 100 * 3
+
+
+def test_cached_preview_is_reused_until_the_file_changes(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.png")
+    Image.new("RGB", (800, 600), (255, 0, 0)).save(photo)
+    cache = PreviewCache()
+
+    first = get_preview_image(cache, photo, (400, 300), zoom=1.0000000002, high_quality=False)
+    assert get_preview_image(cache, photo, (400, 300), zoom=1.0, high_quality=False) is first
+
+    Image.new("RGB", (800, 600), (0, 0, 255)).save(photo)
+    os.utime(photo, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert get_preview_image(cache, photo, (400, 300), high_quality=False).getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_prefetcher_fills_the_cache(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.png")
+    Image.new("RGB", (800, 600)).save(photo)
+    cache = PreviewCache()
+
+    PreviewPrefetcher(cache).request([(photo, (400, 300), 90, 1.0)])
+    key = cache.key(photo, (400, 300), 90, 1.0, True)
+    deadline = time.time() + 5
+    while cache.get(key) is None and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert cache.get(key).size == (225, 300)
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
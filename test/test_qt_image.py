@@ -0,0 +1,51 @@
+import pytest
+from PIL import Image
+from PyQt6.QtGui import QColor
+from src.utils.qt_image import pil_to_qimage
+
+
+@pytest.mark.parametrize("mode, color, expected", [
+    ("RGB", (200, 30, 30), (200, 30, 30, 255)),
+    ("RGBA", (0, 0, 255, 128), (0, 0, 255, 128)),
+    ("L", 128, (128, 128, 128, 255)),
+    ("1", 1, (255, 255, 255, 255)),
+    ("LA", (50, 255), (50, 50, 50, 255)),
+    ("CMYK", (0, 255, 255, 0), (255, 0, 0, 255)),
+    ("I;16", 65535, (255, 255, 255, 255)),
+    ("I", 32768, (128, 128, 128, 255)),
+])
+def test_common_modes_are_displayed_with_their_colours(mode, color, expected):
+    # Odd width so lines are not 4 byte aligned for the 1 byte formats
+    qimage = pil_to_qimage(Image.new(mode, (7, 3), color))
+
+    assert (qimage.width(), qimage.height()) == (7, 3)
+    assert QColor(qimage.pixelColor(6, 2)).getRgb() == expected
+
+
+def test_palette_transparency_is_kept():
+    img = Image.new("P", (4, 4), 1)
+    img.putpalette([0, 0, 0, 255, 0, 0])
+    img.info["transparency"] = 1
+
+    assert pil_to_qimage(img).hasAlphaChannel()
+
+
+def test_qimage_outlives_the_source_image():
+    img = Image.new("RGB", (5, 5), (1, 2, 3))
+    qimage = pil_to_qimage(img)
+    del img
+
+    assert QColor(qimage.pixelColor(0, 0)).getRgb() == (1, 2, 3, 255)
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
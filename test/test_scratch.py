@@ -0,0 +1,137 @@
+import io
+import os
+import zlib
+import tempfile
+from types import SimpleNamespace
+import shutil
+import pikepdf
+import pytest
+from PIL import Image
+from src.utils import cleanup, convert, scratch
+from src.utils.compress import direct_compress_pdf
+
+
+@pytest.fixture
+def session_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleanup, "APP_TEMP_ROOT", str(tmp_path / "pdf_manager_test"))
+    monkeypatch.setattr(cleanup, "_session_dir", None)
+    return tmp_path
+
+
+def test_scratch_file_spills_to_disk_past_the_threshold(session_root):
+    with scratch.scratch_file(max_size=1024) as f:
+        f.write(b"x" * 1000)
+        assert not f._rolled
+        f.write(b"x" * 1000)
+        assert f._rolled
+        f.seek(0)
+        assert len(f.read()) == 2000
+
+
+def test_spill_threshold_and_scratch_dir_are_configurable(tmp_path, monkeypatch):
+    monkeypatch.setenv(scratch.SCRATCH_SPILL_ENV, "0.5")
+    assert scratch.spill_threshold() == 512 * 1024
+
+    configured = tmp_path / "fast"
+    monkeypatch.setenv(scratch.SCRATCH_DIR_ENV, str(configured))
+    monkeypatch.setattr(scratch, "_base_dir", None)
+    assert scratch.scratch_base_dir() == str(configured)
+    assert configured.is_dir()
+
+
+def test_only_spills_use_the_ram_folder_while_it_has_room(session_root, monkeypatch):
+    fast = session_root / "shm"
+    fast.mkdir()
+    monkeypatch.setattr(scratch, "FAST_SCRATCH_DIRS", (str(fast),))
+    monkeypatch.setattr(scratch, "_base_dir", str(fast))
+    # Temp folders, uploads and the cleanup registry stay on disk
+    assert cleanup._app_temp_root().startswith(tempfile.gettempdir())
+
+    free = {"bytes": scratch.MIN_FAST_SCRATCH_FREE}
+    monkeypatch.setattr(scratch.shutil, "disk_usage", lambda path: SimpleNamespace(free=free["bytes"]))
+    assert scratch._spill_dir() == str(fast)
+
+    # The free space is checked again for every scratch file
+    free["bytes"] -= 1
+    assert scratch._spill_dir() == cleanup.session_temp_dir()
+
+
+def make_image_pdf(path):
+    """One page holding a large Flate-encoded RGB image"""
+    pdf = pikepdf.new()
+    width, height = 1600, 1200
+    # Noise barely deflates, so the JPEG version is always smaller
+    image = pikepdf.Stream(pdf, zlib.compress(os.urandom(width * height * 3), 1))
+    image.Type = pikepdf.Name.XObject
+    image.Subtype = pikepdf.Name.Image
+    image.Width, image.Height = width, height
+    image.ColorSpace = pikepdf.Name.DeviceRGB
+    image.BitsPerComponent = 8
+    image.Filter = pikepdf.Name.FlateDecode
+    pdf.add_blank_page(page_size=(612, 792))
+    pdf.pages[0].Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+    pdf.pages[0].Contents = pikepdf.Stream(pdf, b"q 612 0 0 792 0 0 cm /Im0 Do Q")
+    pdf.save(path)
+
+
+def test_compress_writes_to_scratch_and_to_paths(session_root):
+    source = str(session_root / "images.pdf")
+    make_image_pdf(source)
+
+    with scratch.scratch_file() as compressed:
+        direct_compress_pdf(source, compressed, 2)
+        compressed.seek(0)
+        with pikepdf.open(io.BytesIO(compressed.read())) as pdf:
+            assert pdf.pages[0].Resources.XObject.Im0.Filter == pikepdf.Name.DCTDecode
+
+    # A path may even be the input file itself
+    direct_compress_pdf(source, source, 2)
+    with pikepdf.open(source) as pdf:
+        assert len(pdf.pages) == 1
+    # No intermediate files are left behind
+    assert not os.path.exists(cleanup.APP_TEMP_ROOT) or all(
+        not files for _, _, files in os.walk(cleanup.APP_TEMP_ROOT))
+
+
+def test_convert_intermediates_go_to_the_configured_scratch_folder(session_root, monkeypatch):
+    configured = session_root / "scratch"
+    monkeypatch.setenv(scratch.SCRATCH_DIR_ENV, str(configured))
+    monkeypatch.setattr(scratch, "_base_dir", None)
+    image = session_root / "page.png"
+    Image.new("RGB", (60, 40), (0, 0, 255)).save(image)
+    out_dir = session_root / "out"
+    out_dir.mkdir()
+
+    monkeypatch.setattr(convert.QFileDialog, "getExistingDirectory", lambda *args: str(out_dir))
+    monkeypatch.setattr(convert.QMessageBox, "information", lambda *args: None)
+    copied = []
+    copy2 = shutil.copy2
+    monkeypatch.setattr(convert.shutil, "copy2", lambda src, dst: copied.append(src) or copy2(src, dst))
+
+    def widget(**methods):
+        return SimpleNamespace(**{name: (lambda *args, value=value: value) for name, value in methods.items()})
+
+    window = SimpleNamespace(
+        selected_files=[str(image)], rotations={}, num_margin=widget(value=0),
+        combo_orient=widget(currentText="Portrait"), paper_size=widget(currentText="A4"),
+        chk_separate=widget(isChecked=True), progress_bar=widget(setValue=None), status_label=widget(setText=None))
+    convert.convert_to_pdf(window)
+
+    assert (out_dir / "page.pdf").is_file()
+    assert os.path.dirname(os.path.dirname(copied[0])) == str(configured)
+    # The working folder is removed afterwards
+    assert os.listdir(configured) == []
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,59 @@
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication, QMessageBox
+from benchmark_startup import measure_startup
+
+app = QApplication.instance() or QApplication([])
+
+
+def test_startup_defers_tabs_and_heavy_libraries(monkeypatch, tmp_path):
+    # The started application writes its error log and dependency cache under APPDATA
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    result = measure_startup()
+    assert result["heavy_modules"] == []
+    assert result["unbuilt_tabs"] == 5
+    assert result["first_window"] > 0
+
+
+def test_tabs_are_built_on_first_show(monkeypatch, tmp_path):
+    # The window writes its error log and dependency cache under APPDATA
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    monkeypatch.setattr(QMessageBox, "warning", staticmethod(lambda *args, **kwargs: None))
+    from src.pdf_manage import PdfManager
+
+    window = PdfManager()
+    assert not hasattr(window, "pdf_listbox")
+
+    window.tab_widget.setCurrentWidget(window.merge_tab)
+    assert window.pdf_listbox.count() == 0
+    assert window.merge_tab not in window._tab_setups
+
+    # Building twice would add a second set of widgets to the tab
+    children = len(window.merge_tab.children())
+    window.tab_widget.setCurrentIndex(0)
+    window.tab_widget.setCurrentWidget(window.merge_tab)
+    assert len(window.merge_tab.children()) == children
+
+    # Let the background dependency probe report while its warning is still silenced
+    deadline = time.monotonic() + 10
+    while window.has_imagick is None and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert window.has_imagick is not None
+    window.close()
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
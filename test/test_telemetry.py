@@ -0,0 +1,166 @@
+import os
+import json
+import pikepdf
+import pytest
+from PIL import Image
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PyQt6.QtWidgets import QApplication
+from src.utils import telemetry
+from src.utils.compress import direct_compress_pdf
+from src.utils.convert_pipeline import iter_encoded_pages
+
+
+class ListSink:
+    def __init__(self):
+        self.reports = []
+
+    def record(self, report):
+        self.reports.append(report)
+
+
+@pytest.fixture
+def sink():
+    sink = telemetry.add_sink(ListSink())
+    yield sink
+    telemetry.remove_sink(sink)
+
+
+def make_image_pdf(path):
+    """A PDF whose one page shows a large Flate RGB image, which compression turns into JPEG"""
+    pdf = pikepdf.Pdf.new()
+    pdf.add_blank_page()
+    img = Image.effect_noise((600, 400), 40).convert("RGB")
+    image = pikepdf.Stream(pdf, img.tobytes())
+    image.Type, image.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    image.Width, image.Height = img.size
+    image.ColorSpace, image.BitsPerComponent = pikepdf.Name.DeviceRGB, 8
+    pdf.pages[0].Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+    pdf.pages[0].Contents = pikepdf.Stream(pdf, b"q 600 0 0 400 0 0 cm /Im0 Do Q")
+    pdf.save(path)
+
+
+def test_nothing_is_recorded_without_sinks():
+    assert not telemetry.enabled()
+    with telemetry.operation("compress") as operation:
+        with telemetry.span("open") as span:
+            telemetry.count("pages", 3)
+    # One shared do-nothing object stands in for every operation and span
+    assert operation is span is telemetry.operation("merge")
+
+
+def test_compress_reports_spans_and_counters(tmp_path, sink):
+    source, output = tmp_path / "in.pdf", tmp_path / "out.pdf"
+    make_image_pdf(source)
+    direct_compress_pdf(str(source), str(output), 2)
+
+    report, = sink.reports
+    assert report["operation"] == "compress" and report["status"] == "ok"
+    assert report["attributes"] == {"level": 2}
+    assert set(report["spans"]) == {"open", "scan", "decode", "encode", "write", "cleanup"}
+    assert report["counters"] == {"bytes_in": os.path.getsize(source), "pages": 1, "images": 1,
+                                  "bytes_out": os.path.getsize(output)}
+    assert sum(report["spans"].values()) <= report["seconds"]
+
+
+def test_failures_and_worker_threads_are_recorded(sink):
+    def encode(index, image):
+        with telemetry.span("encode"):
+            telemetry.count("images")
+        return image
+
+    with pytest.raises(RuntimeError):
+        with telemetry.operation("convert"):
+            assert len(list(iter_encoded_pages(range(5), encode))) == 5
+            raise RuntimeError("disk full")
+
+    report, = sink.reports
+    assert report["status"] == "error" and report["error"] == "disk full"
+    assert report["counters"] == {"images": 5}
+    assert "encode" in report["spans"]
+
+
+def test_file_sinks(tmp_path):
+    log, prom = tmp_path / "ops.jsonl", tmp_path / "pdf_manager.prom"
+    sinks = telemetry.configure_from_env(f"json:{log}, prometheus:{prom}, bogus")
+    try:
+        for pages in (2, 3):
+            with telemetry.operation("split"):
+                with telemetry.span("write"):
+                    telemetry.count("pages", pages)
+    finally:
+        for installed in sinks:
+            telemetry.remove_sink(installed)
+
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [line["counters"]["pages"] for line in lines] == [2, 3]
+    pid = os.getpid()
+    text = (tmp_path / f"pdf_manager.{pid}.prom").read_text()
+    assert f'pdf_manager_operations_total{{operation="split",status="ok",pid="{pid}"}} 2' in text
+    assert f'pdf_manager_pages_total{{operation="split",pid="{pid}"}} 5' in text
+    assert f'pdf_manager_span_seconds_total{{operation="split",span="write",pid="{pid}"}}' in text
+    # The text file is replaced atomically, no temporary file is left behind
+    assert sorted(os.listdir(tmp_path)) == ["ops.jsonl", f"pdf_manager.{pid}.prom"]
+
+
+def _split_in_child(pages):
+    with telemetry.operation("split"):
+        telemetry.count("pages", pages)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="worker pools fork on POSIX only")
+def test_prometheus_files_are_kept_per_process(tmp_path):
+    import multiprocessing
+
+    prom = tmp_path / "pdf_manager.prom"
+    (tmp_path / "pdf_manager.999999999.prom").write_text("left by a process that exited\n")
+    sink = telemetry.add_sink(telemetry.PrometheusTextfileSink(str(prom)))
+    try:
+        _split_in_child(2)
+        # A forked worker, like those of the HTTP service and watch folder pools
+        child = multiprocessing.get_context("fork").Process(target=_split_in_child, args=(3,))
+        child.start()
+        child.join(30)
+        assert child.exitcode == 0
+        _split_in_child(4)
+    finally:
+        telemetry.remove_sink(sink)
+
+    files = {int(name.split(".")[1]): (tmp_path / name).read_text() for name in os.listdir(tmp_path)}
+    assert set(files) == {os.getpid(), child.pid}
+    parent, worker = files[os.getpid()], files[child.pid]
+    assert f'pdf_manager_pages_total{{operation="split",pid="{os.getpid()}"}} 6' in parent
+    # The worker counts only its own work, not the totals it inherited
+    assert f'pdf_manager_pages_total{{operation="split",pid="{child.pid}"}} 3' in worker
+
+
+def test_stats_panel_shows_operations():
+    from src.utils.stats_panel import StatsPanel
+
+    app = QApplication.instance() or QApplication([])
+    panel = StatsPanel()
+    try:
+        with telemetry.operation("merge"):
+            with telemetry.span("write"):
+                telemetry.count("pages", 7)
+        app.processEvents()
+        assert panel.table.rowCount() == 1
+        assert panel.table.item(0, 0).text() == "merge"
+        assert panel.table.item(0, 5).text() == "7"
+        assert panel.table.item(0, 9).text().startswith("write")
+    finally:
+        telemetry.remove_sink(panel.sink)
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,81 @@
+import os
+import time
+from PIL import Image
+from src.utils.thumbnails import load_thumbnail, thumbnail_cache_path, trim_cache
+
+
+def test_thumbnails_are_cached_on_disk(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.jpg")
+    Image.new("RGB", (3000, 2000), (10, 120, 200)).save(photo)
+    cache_dir = os.path.join(str(tmp_path), "thumbnails")
+    calls = []
+
+    def render(path, size, variant):
+        calls.append(path)
+        with Image.open(path) as img:
+            img.thumbnail((size, size))
+            return img.copy()
+
+    first = load_thumbnail(photo, cache_dir, 96, render)
+    second = load_thumbnail(photo, cache_dir, 96, render)
+
+    assert first.size == second.size == (96, 64)
+    assert len(calls) == 1
+    assert os.listdir(cache_dir) == [os.path.basename(thumbnail_cache_path(cache_dir, photo, 96))]
+
+
+def test_changed_file_gets_a_new_thumbnail(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.png")
+    cache_dir = os.path.join(str(tmp_path), "thumbnails")
+    Image.new("RGB", (200, 200), (255, 0, 0)).save(photo)
+    assert load_thumbnail(photo, cache_dir).getpixel((0, 0)) == (255, 0, 0)
+
+    Image.new("RGB", (200, 100), (0, 0, 255)).save(photo)
+    os.utime(photo, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert load_thumbnail(photo, cache_dir).getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_cache_keeps_the_most_recently_used_thumbnails(tmp_path):
+    cache_dir = tmp_path / "thumbnails"
+    cache_dir.mkdir()
+    now = time.time()
+    for i in range(10):
+        path = cache_dir / f"{i}.png"
+        path.write_bytes(b"x" * 1000)
+        os.utime(path, (now - 100 + i, now - 100 + i))
+    (cache_dir / "old.part").write_bytes(b"x" * 500)
+    os.utime(cache_dir / "old.part", (now - 7200, now - 7200))
+    (cache_dir / "new.part").write_bytes(b"x" * 500)
+
+    assert trim_cache(str(cache_dir), max_bytes=20000) == 500
+    assert trim_cache(str(cache_dir), max_bytes=5000) == 6000
+    # Trimmed to 80% of the limit, keeping the newest entries and the part still being written
+    assert sorted(os.listdir(cache_dir)) == ["6.png", "7.png", "8.png", "9.png", "new.part"]
+
+
+def test_failed_cache_write_leaves_no_part_file(tmp_path):
+    photo = os.path.join(str(tmp_path), "photo.png")
+    Image.new("RGB", (200, 200), (255, 0, 0)).save(photo)
+    cache_dir = os.path.join(str(tmp_path), "thumbnails")
+
+    class Unsaveable:
+        def save(self, f, format):
+            f.write(b"partial")
+            raise OSError("disk full")
+
+    assert isinstance(load_thumbnail(photo, cache_dir, render=lambda *args: Unsaveable()), Unsaveable)
+    assert os.listdir(cache_dir) == []
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import threading
+import pikepdf
+import pytest
+from PIL import Image
+from src.utils import watch_folder
+from src.utils.watch_folder import WatchFolder, Journal
+
+_process_file = watch_folder.process_file
+
+
+def crash_on_poison(source, output, stages):
+    """Worker job that kills its worker process for files named *poison*"""
+    if "poison" in os.path.basename(source):
+        os._exit(1)
+    return _process_file(source, output, stages)
+
+
+def make_pdf(path, pages=2):
+    pdf = pikepdf.Pdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    pdf.save(path)
+
+
+@pytest.fixture
+def folders(tmp_path):
+    inbox, outbox = tmp_path / "inbox", tmp_path / "outbox"
+    inbox.mkdir()
+    return inbox, outbox
+
+
+def journal_lines(outbox):
+    return (outbox / watch_folder.JOURNAL_NAME).read_text().splitlines()
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_processes_inbox_and_resumes_from_the_journal(folders, polling):
+    inbox, outbox = folders
+    Image.new("RGB", (120, 80), (0, 128, 255)).save(inbox / "scan.jpg")
+    make_pdf(inbox / "report.pdf", pages=3)
+    (inbox / "notes.txt").write_text("not a document")
+    (inbox / "upload.pdf.part").write_bytes(b"%PDF-")
+
+    daemon = WatchFolder(str(inbox), str(outbox), workers=2, settle=0.2, polling=polling, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+
+    assert sorted(os.listdir(outbox)) == [watch_folder.JOURNAL_NAME, "report.pdf", "scan.pdf"]
+    with pikepdf.Pdf.open(outbox / "report.pdf") as pdf:
+        assert len(pdf.pages) == 3
+    statuses = {json.loads(line)["source"]: json.loads(line)["status"] for line in journal_lines(outbox)}
+    assert statuses == {"report.pdf": "done", "scan.jpg": "done"}
+
+    # A restart skips finished work; only a changed file is processed again
+    written = os.stat(outbox / "scan.pdf").st_mtime_ns
+    make_pdf(inbox / "report.pdf", pages=1)
+    daemon = WatchFolder(str(inbox), str(outbox), workers=1, settle=0.2, polling=polling, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+    assert len(journal_lines(outbox)) == 3
+    assert os.stat(outbox / "scan.pdf").st_mtime_ns == written
+    with pikepdf.Pdf.open(outbox / "report.pdf") as pdf:
+        assert len(pdf.pages) == 1
+
+
+def test_files_are_processed_only_once_they_stop_changing(folders):
+    inbox, outbox = folders
+    daemon = WatchFolder(str(inbox), str(outbox), settle=2.0)
+    growing = inbox / "big.pdf"
+    growing.write_bytes(b"%PDF-1.4\n")
+
+    assert daemon.ready_files(now=100.0) == []
+    assert daemon.ready_files(now=101.0) == []
+    with open(growing, "ab") as f:
+        f.write(b"more data")
+    # The write restarts the settle period
+    assert daemon.ready_files(now=102.5) == []
+    assert daemon.ready_files(now=104.0) == []
+    assert [name for name, _ in daemon.ready_files(now=104.6)] == ["big.pdf"]
+    daemon.close()
+
+
+def test_failures_are_journaled_and_the_outbox_has_no_partial_files(folders):
+    inbox, outbox = folders
+    (inbox / "broken.pdf").write_bytes(b"this is not a PDF")
+    daemon = WatchFolder(str(inbox), str(outbox), workers=1, settle=0.1, polling=True, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+
+    entry = json.loads(journal_lines(outbox)[0])
+    assert entry["status"] == "failed" and entry["error"]
+    assert os.listdir(outbox) == [watch_folder.JOURNAL_NAME]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permission bits")
+def test_results_get_the_usual_permissions_and_leftovers_are_removed(folders):
+    inbox, outbox = folders
+    outbox.mkdir()
+    (outbox / ".report.pdf.1a2b3c4d.part").write_bytes(b"%PDF-")
+    make_pdf(inbox / "report.pdf")
+    umask = os.umask(0o022)
+    try:
+        daemon = WatchFolder(str(inbox), str(outbox), workers=1, settle=0.1, polling=True, poll_interval=0.05)
+        daemon.run(once=True)
+        daemon.close()
+    finally:
+        os.umask(umask)
+
+    assert sorted(os.listdir(outbox)) == [watch_folder.JOURNAL_NAME, "report.pdf"]
+    assert os.stat(outbox / "report.pdf").st_mode & 0o777 == 0o644
+
+
+def test_files_with_the_same_stem_get_their_own_results(folders):
+    inbox, outbox = folders
+    make_pdf(inbox / "report.pdf", pages=3)
+    Image.new("RGB", (120, 80), (255, 0, 0)).save(inbox / "report.png")
+    daemon = WatchFolder(str(inbox), str(outbox), workers=2, settle=0.1, polling=True, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+
+    outputs = {json.loads(line)["source"]: json.loads(line)["output"] for line in journal_lines(outbox)}
+    assert outputs == {"report.pdf": "report.pdf", "report.png": "report (2).pdf"}
+    for name, pages in (("report.pdf", 3), ("report (2).pdf", 1)):
+        with pikepdf.Pdf.open(outbox / name) as pdf:
+            assert len(pdf.pages) == pages
+
+    # A changed image replaces its own result, not the PDF's
+    Image.new("RGB", (80, 120), (0, 255, 0)).save(inbox / "report.png")
+    daemon = WatchFolder(str(inbox), str(outbox), workers=1, settle=0.1, polling=True, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+    assert sorted(os.listdir(outbox)) == [watch_folder.JOURNAL_NAME, "report (2).pdf", "report.pdf"]
+    with pikepdf.Pdf.open(outbox / "report.pdf") as pdf:
+        assert len(pdf.pages) == 3
+
+
+def test_a_crashing_worker_only_fails_its_own_file(folders, monkeypatch):
+    inbox, outbox = folders
+    for name in ("a_poison.pdf", "b.pdf", "c.pdf"):
+        make_pdf(inbox / name)
+    monkeypatch.setattr(watch_folder, "process_file", crash_on_poison)
+    daemon = WatchFolder(str(inbox), str(outbox), workers=1, settle=0.1, polling=True, poll_interval=0.05)
+    daemon.run(once=True)
+    daemon.close()
+
+    entries = [json.loads(line) for line in journal_lines(outbox)]
+    assert {entry["source"]: entry["status"] for entry in entries} == {
+        "a_poison.pdf": "failed", "b.pdf": "done", "c.pdf": "done"}
+    assert len(entries) == 3
+    assert sorted(os.listdir(outbox)) == [watch_folder.JOURNAL_NAME, "b.pdf", "c.pdf"]
+
+
+def test_journal_ignores_a_line_cut_short(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(json.dumps({"key": "a|1|2", "status": "done"}) + "\n" + '{"key": "b|')
+    journal = Journal(str(path))
+    assert journal.finished("a|1|2") and not journal.finished("b|1|2")
+    journal.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_inotify_watcher_wakes_up_on_new_files(tmp_path):
+    watcher = watch_folder.InotifyWatcher(str(tmp_path))
+    assert watcher.wait(0) == set()
+    threading.Timer(0.1, lambda: (tmp_path / "dropped.pdf").write_bytes(b"x")).start()
+    assert "dropped.pdf" in watcher.wait(5)
+    watcher.close()
+
+
+def run_pytest():
+    """Run pytest and capture errors."""
+    import pytest
+    result = pytest.main(["--maxfail=1", "--disable-warnings", "-q"])
+    if result != 0:
+        import logging
+        logging.error("Pytest encountered errors.")
+    return result
+
+
+if __name__ == "__main__":
+    run_pytest()